@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import User
+from .models import QueuedEmail, User
 
 # Register your models here.
 
-admin.site.register(User)
\ No newline at end of file
+admin.site.register(User)
+admin.site.register(QueuedEmail)
@@ -0,0 +1,98 @@
+import json
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.hashers import make_password
+from django.http import JsonResponse
+from django.utils.decorators import classonlymethod
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, AuthenticationFailed, ParseError, ValidationError
+from rest_framework_simplejwt.tokens import RefreshToken
+from Server.executors import run_cpu_bound
+from .models import User
+from .serializers import UserRegisterSerializer, LoginSerializer
+from .utils import asend_code_to_user
+
+# ASGI-native variants of the auth endpoints. Database access uses the async ORM,
+# password hashing runs on the bounded CPU pool and SMTP is awaited off the loop,
+# so one worker keeps serving requests while those are in flight.
+
+
+class AsyncAPIView(View):
+    """ JSON in, JSON out; DRF exceptions are rendered the way DRF's APIView renders them. """
+
+    @classonlymethod
+    def as_view(cls, **initkwargs):
+        return csrf_exempt(super().as_view(**initkwargs))
+
+    async def dispatch(self, request, *args, **kwargs):
+        try:
+            try:
+                self.data = json.loads(request.body or b'{}')
+            except ValueError:
+                raise ParseError()
+            return await super().dispatch(request, *args, **kwargs)
+        except ValidationError as exc:
+            return JsonResponse(exc.detail, status=exc.status_code, safe=False)
+        except APIException as exc:
+            return JsonResponse({'detail': exc.detail}, status=exc.status_code)
+
+
+async def tokens_for(user):
+    # Creating a refresh token writes an OutstandingToken row, which is sync ORM.
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
+    return str(refresh), str(refresh.access_token)
+
+
+class AsyncRegisterUserView(AsyncAPIView):
+    async def post(self, request):
+        serializer = UserRegisterSerializer(data=self.data)
+        await sync_to_async(serializer.is_valid)(raise_exception=True)
+        validated_data = serializer.validated_data
+
+        user = await User.objects.acreate_user(
+            email=validated_data['email'],
+            first_name=validated_data.get('first_name'),
+            last_name=validated_data.get('last_name'),
+            password=validated_data.get('password'),
+            role=validated_data.get('role')
+        )
+        refresh_token, access_token = await tokens_for(user)
+        await asend_code_to_user(user)
+
+        return JsonResponse({
+            'user': {
+                'email': user.email,
+                'first_name': user.first_name,
+                'last_name': user.last_name,
+                'role': user.role,
+            },
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+            'message': 'Hey, thanks for signing up! A passcode has been sent to your email.'
+        }, status=status.HTTP_201_CREATED)
+
+
+class AsyncLoginUserView(AsyncAPIView):
+    async def post(self, request):
+        attrs = LoginSerializer().to_internal_value(self.data)
+        email, password = attrs['email'], attrs['password']
+
+        user = await User.objects.filter(email=email).afirst()
+        if user is None:
+            # Hash anyway so unknown emails take as long as wrong passwords.
+            await run_cpu_bound(make_password, password)
+            raise AuthenticationFailed("Invalide credentials try again")
+        if not await run_cpu_bound(user.check_password, password) or not user.is_active:
+            raise AuthenticationFailed("Invalide credentials try again")
+        if not user.is_verified:
+            raise AuthenticationFailed("Email is not verified")
+
+        refresh_token, access_token = await tokens_for(user)
+        return JsonResponse({
+            'email': user.email,
+            'full_name': user.get_full_name,
+            'access_token': access_token,
+            'refresh_token': refresh_token,
+        }, status=status.HTTP_200_OK)
@@ -0,0 +1,34 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from Auth.provisioning import ProvisioningError, provision_users
+
+
+class Command(BaseCommand):
+    help = (
+        "Create users from a CSV with the columns email, first_name, last_name, workspace (id or name) and "
+        "optionally role, password and team. Users without a password get an invitation email in the outbox."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv', help="Path of the CSV file.")
+        parser.add_argument('--base-url', default=settings.INVITE_BASE_URL, help="Prefix of the invitation links.")
+        parser.add_argument('--workers', type=int, help="Password hashing processes (default: one per core).")
+        parser.add_argument('--dry-run', action='store_true', help="Only check the file.")
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['csv'], encoding='utf-8-sig', newline='') as fh:
+                text = fh.read()
+        except OSError as exc:
+            raise CommandError(exc)
+        try:
+            result = provision_users(text, options['base_url'], options['dry_run'], options['workers'])
+        except ProvisioningError as exc:
+            for error in exc.errors:
+                self.stderr.write(f"line {error['line']}: {error['email']}: {error['error']}")
+            raise CommandError(str(exc))
+        verb = "Would create" if result.dry_run else "Created"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {result.created} users ({result.invited} invited, {result.workers} added to teams)."
+        ))
@@ -0,0 +1,15 @@
+from django.core.management.base import BaseCommand
+
+from Auth.utils import send_queued_emails
+
+
+class Command(BaseCommand):
+    help = "Send the emails waiting in the outbox (invitations, notification digests), oldest first."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, help="Send at most this many.")
+        parser.add_argument('--batch-size', type=int, help="Emails per SMTP connection.")
+
+    def handle(self, *args, **options):
+        sent, failed = send_queued_emails(options['limit'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} emails; {failed} failed and will be retried."))
@@ -1,7 +1,9 @@
+from django.contrib.auth.hashers import make_password
 from django.contrib.auth.models import BaseUserManager
 from django.core.exceptions import ValidationError
 from django.core.validators import validate_email
 from django.utils.translation import gettext_lazy as _
+from Server.executors import run_cpu_bound
 
 
 class UserManager(BaseUserManager):
@@ -11,7 +13,7 @@ class UserManager(BaseUserManager):
         except ValidationError:
             raise ValueError(_("Oops! That doesn't look like a valid email address. Please check and try again."))
         
-    def create_user(self, email, first_name, last_name, password, **extra_fields):
+    def build_user(self, email, first_name, last_name, **extra_fields):
         if email:
             email = self.normalize_email(email)
             self.email_validator(email)
@@ -22,10 +24,20 @@ class UserManager(BaseUserManager):
             raise ValueError(_("We need your First Name to proceed. Please enter a valid First Name."))
         if not last_name:
             raise ValueError(_("We need your Last Name to proceed. Please enter a valid Last Name."))
-        user = self.model(email = email, first_name = first_name, last_name = last_name, **extra_fields)
+        return self.model(email = email, first_name = first_name, last_name = last_name, **extra_fields)
+
+    def create_user(self, email, first_name, last_name, password, **extra_fields):
+        user = self.build_user(email, first_name, last_name, **extra_fields)
         user.set_password(password)
         user.save(using = self._db)
         return user
+
+    async def acreate_user(self, email, first_name, last_name, password, **extra_fields):
+        """ Async create_user: hashes on the bounded CPU pool, then saves with the async ORM. """
+        user = self.build_user(email, first_name, last_name, **extra_fields)
+        user.password = await run_cpu_bound(make_password, password)
+        await user.asave(using = self._db)
+        return user
     
     def create_superuser(self, email, first_name, last_name, password, **extra_fields):
         extra_fields.setdefault("is_staff", True)
@@ -53,4 +53,17 @@ class OneTimePassword(models.Model):
     code = models.CharField(max_length=6, unique=True)
 
     def __str__(self):
-        return f"{self.user.first_name}--passcode"
\ No newline at end of file
+        return f"{self.user.first_name}--passcode"
+
+class QueuedEmail(models.Model):
+    """ An email waiting to be sent by `manage.py send_queued_emails`. """
+    to_email = models.EmailField(max_length=225)
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f"{self.subject} -> {self.to_email}"
@@ -0,0 +1,199 @@
+import csv
+import io
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import django
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import transaction
+from django.urls import reverse
+from django.utils.encoding import smart_bytes
+from django.utils.http import urlsafe_base64_encode
+
+from Core.models import Team, Worker, Workspace
+from Core.sharding import shard_for
+from Server.executors import cpu_workers
+from .models import QueuedEmail, User
+from .utils import queue_email
+
+# --------------------------- Bulk user provisioning --------------------------- #
+# create_user() hashes each password (PBKDF2 with hundreds of thousands of
+# iterations) and inserts its row, one user at a time. Provisioning checks the
+# whole CSV first, with one query for existing emails, one for workspaces and
+# one per workspace for teams, then hashes the given passwords on a process
+# pool across all cores and inserts the users (and a Worker for rows naming a
+# team) with bulk_create in PROVISION_BATCH_SIZE batches, in one transaction.
+# Rows without a password get an unusable one and an invitation: a set-password
+# link of the password reset flow, queued in the email outbox in bulk.
+
+COLUMNS = ('email', 'first_name', 'last_name', 'workspace', 'role', 'password', 'team')
+REQUIRED = ('email', 'first_name', 'last_name', 'workspace')
+ROLES = {value for value, _ in User.ROLE_CHOICES}
+
+
+class ProvisioningError(Exception):
+    """ The CSV cannot be provisioned as a whole; `errors` are {'line', 'email', 'error'} dicts. """
+
+    def __init__(self, errors):
+        super().__init__(f"{len(errors)} problem(s) in the CSV.")
+        self.errors = errors
+
+
+@dataclass
+class ProvisionResult:
+    created: int
+    invited: int
+    workers: int
+    dry_run: bool = False
+
+
+def read_csv(text):
+    """ [(line number, {column: value})] of a CSV with a header row naming COLUMNS. """
+    reader = csv.DictReader(io.StringIO(text))
+    missing = [column for column in REQUIRED if column not in (reader.fieldnames or ())]
+    if missing:
+        raise ProvisioningError([{'line': 1, 'email': '', 'error': f"Missing columns: {', '.join(missing)}."}])
+    rows = [
+        (reader.line_num, {column: (row.get(column) or '').strip() for column in COLUMNS})
+        for row in reader
+    ]
+    if len(rows) > settings.PROVISION_MAX_ROWS:
+        raise ProvisioningError([{
+            'line': 1, 'email': '', 'error': f"At most {settings.PROVISION_MAX_ROWS} users per file.",
+        }])
+    return rows
+
+
+def _workspaces(rows):
+    """ {CSV value: workspace id}; a workspace is given by id or by name. """
+    values = {row['workspace'] for _, row in rows if row['workspace']}
+    ids = {int(value) for value in values if value.isdigit()}
+    found = {}
+    for pk in Workspace.objects.filter(pk__in=ids).values_list('pk', flat=True):
+        found[str(pk)] = pk
+    for pk, name in Workspace.objects.filter(name__in=values - found.keys()).values_list('pk', 'name'):
+        found[name] = pk
+    return found
+
+
+def _teams(rows, workspaces):
+    """ {(workspace id, team name): team id}, read from each workspace's shard. """
+    names = {}
+    for _, row in rows:
+        if row['team'] and row['workspace'] in workspaces:
+            names.setdefault(workspaces[row['workspace']], set()).add(row['team'])
+    found = {}
+    for workspace_id, team_names in names.items():
+        teams = Team.objects.using(shard_for(workspace_id)).filter(workspace_id=workspace_id, name__in=team_names)
+        for pk, name in teams.order_by('-pk').values_list('pk', 'name'):
+            found[workspace_id, name] = pk  # The oldest team wins when names repeat.
+    return found
+
+
+def check_rows(rows):
+    """ Validate every row at once; returns [(row, workspace id, team id)] or raises ProvisioningError. """
+    errors = []
+
+    def error(line, row, message):
+        errors.append({'line': line, 'email': row['email'], 'error': message})
+
+    workspaces = _workspaces(rows)
+    teams = _teams(rows, workspaces)
+    emails = {}
+    for line, row in rows:
+        row['email'] = User.objects.normalize_email(row['email'])
+        emails.setdefault(row['email'].lower(), []).append(line)
+    taken = set(User.objects.filter(email__in=[row['email'] for _, row in rows]).values_list('email', flat=True))
+
+    checked = []
+    for line, row in rows:
+        for column in REQUIRED:
+            if not row[column]:
+                error(line, row, f"{column} is required.")
+        if row['email']:
+            try:
+                validate_email(row['email'])
+            except ValidationError:
+                error(line, row, "Invalid email address.")
+            if row['email'] in taken:
+                error(line, row, "A user with this email already exists.")
+            elif len(emails[row['email'].lower()]) > 1:
+                error(line, row, f"Email repeated on lines {', '.join(map(str, emails[row['email'].lower()]))}.")
+        if row['role'] and row['role'] not in ROLES:
+            error(line, row, f"Unknown role {row['role']!r}; use one of {', '.join(sorted(ROLES))}.")
+        if row['password'] and len(row['password']) < 6:
+            error(line, row, "Passwords need at least 6 characters.")
+        workspace_id = workspaces.get(row['workspace'])
+        if row['workspace'] and workspace_id is None:
+            error(line, row, f"Unknown workspace {row['workspace']!r}.")
+        team_id = teams.get((workspace_id, row['team'])) if row['team'] else None
+        if row['team'] and workspace_id is not None and team_id is None:
+            error(line, row, f"Unknown team {row['team']!r} in workspace {row['workspace']!r}.")
+        checked.append((row, workspace_id, team_id))
+    if errors:
+        raise ProvisioningError(errors)
+    return checked
+
+
+def hash_passwords(passwords, workers=None):
+    """ make_password() of each password, on a process pool when there are enough of them. """
+    workers = workers or cpu_workers()
+    if workers <= 1 or len(passwords) < 2 * workers:
+        return [make_password(password) for password in passwords]
+    chunksize = max(1, len(passwords) // (workers * 4))
+    with ProcessPoolExecutor(max_workers=workers, initializer=django.setup) as pool:
+        return list(pool.map(make_password, passwords, chunksize=chunksize))
+
+
+def invitation(user, base_url):
+    """ A queued email with a link to set the password, valid for PASSWORD_RESET_TIMEOUT. """
+    uidb64 = urlsafe_base64_encode(smart_bytes(user.pk))
+    token = PasswordResetTokenGenerator().make_token(user)
+    link = base_url.rstrip('/') + reverse('password-reset-confirm', kwargs={'uidb64': uidb64, 'token': token})
+    return queue_email(
+        user.email, "You have been invited to the bug tracker",
+        f"Hey {user.first_name}, an account has been created for you. Use the link below to choose a password \n {link}",
+    )
+
+
+def provision_users(text, base_url, dry_run=False, workers=None):
+    """ Create the users of a CSV (see COLUMNS) as verified accounts; raises ProvisioningError.
+
+    `base_url` prefixes the invitation links, e.g. 'https://bugs.example.com'.
+    """
+    checked = check_rows(read_csv(text))
+    invited = sum(1 for row, _, _ in checked if not row['password'])
+    workers_count = sum(1 for _, _, team_id in checked if team_id is not None)
+    if dry_run:
+        return ProvisionResult(len(checked), invited, workers_count, dry_run=True)
+
+    hashes = iter(hash_passwords([row['password'] for row, _, _ in checked if row['password']], workers))
+    users = []
+    for row, workspace_id, _ in checked:
+        user = User.objects.build_user(
+            row['email'], row['first_name'], row['last_name'],
+            role=row['role'] or None, workspace_id=workspace_id, is_verified=True,
+        )
+        user.password = next(hashes) if row['password'] else make_password(None)
+        users.append(user)
+
+    batch_size = settings.PROVISION_BATCH_SIZE
+    with transaction.atomic():
+        User.objects.bulk_create(users, batch_size=batch_size)
+        QueuedEmail.objects.bulk_create(
+            [invitation(user, base_url) for user, (row, _, _) in zip(users, checked) if not row['password']],
+            batch_size=batch_size,
+        )
+        by_shard = {}
+        for user, (row, workspace_id, team_id) in zip(users, checked):
+            if team_id is not None:
+                by_shard.setdefault(shard_for(workspace_id), []).append(
+                    Worker(user=user, team_id=team_id, role=row['role'] or 'developer')
+                )
+        for alias, shard_workers in by_shard.items():
+            Worker.objects.using(alias).bulk_create(shard_workers, batch_size=batch_size)
+    return ProvisionResult(len(users), invited, workers_count)
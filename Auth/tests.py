@@ -1,3 +1,124 @@
-from django.test import TestCase
+import io
+from unittest import mock
 
-# Create your tests here.
+from django.core import mail
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APIClient
+
+from Core.models import Team, Worker, Workspace
+from Server import executors
+from .models import OneTimePassword, QueuedEmail, User
+from .provisioning import ProvisioningError, provision_users
+from .utils import send_queued_emails
+
+
+def make_user(email, **extra_fields):
+    return User.objects.create_user(email, "Test", "User", "password", is_verified=True, **extra_fields)
+
+
+# --------------------------- Async auth endpoints --------------------------- #
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class AsyncAuthViewTests(TestCase):
+    async def test_register_creates_the_user_and_sends_a_passcode(self):
+        response = await self.async_client.post('/api/v1/auth/async/register/', {
+            'email': 'new@example.com', 'first_name': 'New', 'last_name': 'User',
+            'password': 'secret123', 'password_confirm': 'secret123',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 201)
+        user = await User.objects.aget(email='new@example.com')
+        self.assertTrue(user.check_password('secret123'))
+        self.assertTrue(await OneTimePassword.objects.filter(user=user).aexists())
+        self.assertEqual(mail.outbox[0].to, ['new@example.com'])
+
+    async def test_login_checks_the_password(self):
+        await User.objects.acreate_user('dev@example.com', "Test", "User", 'secret123', is_verified=True)
+        response = await self.async_client.post('/api/v1/auth/async/login/', {
+            'email': 'dev@example.com', 'password': 'secret123',
+        }, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('access_token', response.json())
+        for email, password in (('dev@example.com', 'wrong'), ('nobody@example.com', 'secret123')):
+            response = await self.async_client.post('/api/v1/auth/async/login/', {
+                'email': email, 'password': password,
+            }, content_type='application/json')
+            self.assertEqual(response.status_code, 401)
+
+
+class ExecutorTests(SimpleTestCase):
+    async def test_pool_threads_close_old_connections_around_each_call(self):
+        with mock.patch.object(executors, 'close_old_connections') as close:
+            self.assertEqual(await executors.run_cpu_bound(sum, [1, 2]), 3)
+            self.assertEqual(close.call_count, 2)
+            self.assertEqual(await executors.run_blocking_io(max, 1, 2), 2)
+            self.assertEqual(close.call_count, 4)
+
+
+# --------------------------- Bulk provisioning --------------------------- #
+
+CSV = """email,first_name,last_name,workspace,role,password,team
+ana@example.com,Ana,Lee,Acme,,secret123,QA
+ben@example.com,Ben,Ito,{workspace_id},,,
+"""
+
+
+@override_settings(
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'], INVITE_BASE_URL='https://bugs.example.com',
+)
+class ProvisioningTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.workspace = Workspace.objects.create(name="Acme")
+        cls.team = Team.objects.create(workspace=cls.workspace, name="QA")
+        cls.csv = CSV.format(workspace_id=cls.workspace.pk)
+
+    def test_users_are_created_with_workers_and_invitations(self):
+        result = provision_users(self.csv, 'https://bugs.example.com', workers=1)
+        self.assertEqual((result.created, result.invited, result.workers), (2, 1, 1))
+        ana, ben = User.objects.get(email='ana@example.com'), User.objects.get(email='ben@example.com')
+        self.assertTrue(ana.check_password('secret123'))
+        self.assertFalse(ben.has_usable_password())
+        self.assertEqual(Worker.objects.get(user=ana).team, self.team)
+        [invitation] = QueuedEmail.objects.all()
+        self.assertEqual(invitation.to_email, 'ben@example.com')
+        self.assertIn('https://bugs.example.com/api/v1/auth/', invitation.body)
+
+    def test_the_whole_file_is_checked_before_anything_is_written(self):
+        make_user('ana@example.com')
+        text = self.csv + "bad-email,Cy,Do,Nowhere,chief,123,\n"
+        with self.assertRaises(ProvisioningError) as raised:
+            provision_users(text, 'https://bugs.example.com', workers=1)
+        errors = [(error['line'], error['error']) for error in raised.exception.errors]
+        self.assertIn((2, "A user with this email already exists."), errors)
+        self.assertEqual({line for line, _ in errors}, {2, 4})
+        self.assertEqual(User.objects.count(), 1)
+
+    def test_endpoint_links_use_the_configured_base_url_not_the_host_header(self):
+        client = APIClient()
+        client.force_authenticate(make_user('admin@example.com', is_staff=True))
+        upload = SimpleUploadedFile('users.csv', self.csv.encode())
+        response = client.post('/api/v1/auth/provision/', {'file': upload}, HTTP_HOST='evil.example.net')
+        self.assertEqual(response.status_code, 201)
+        body = QueuedEmail.objects.get().body
+        self.assertIn('https://bugs.example.com/', body)
+        self.assertNotIn('evil.example.net', body)
+
+    def test_dry_run_and_non_staff(self):
+        client = APIClient()
+        client.force_authenticate(make_user('dev@example.com'))
+        upload = SimpleUploadedFile('users.csv', self.csv.encode())
+        self.assertEqual(client.post('/api/v1/auth/provision/', {'file': upload}).status_code, 403)
+        client.force_authenticate(make_user('admin@example.com', is_staff=True))
+        upload = SimpleUploadedFile('users.csv', self.csv.encode())
+        response = client.post('/api/v1/auth/provision/', {'file': upload, 'dry_run': True})
+        self.assertEqual((response.status_code, response.json()['created']), (200, 2))
+        self.assertFalse(User.objects.filter(email='ana@example.com').exists())
+
+    def test_queued_emails_are_sent_by_the_command(self):
+        provision_users(self.csv, 'https://bugs.example.com', workers=1)
+        call_command('send_queued_emails', stdout=io.StringIO())
+        self.assertEqual([message.to for message in mail.outbox], [['ben@example.com']])
+        self.assertIsNotNone(QueuedEmail.objects.get().sent_at)
+        self.assertEqual(send_queued_emails(), (0, 0))
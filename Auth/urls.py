@@ -1,6 +1,7 @@
 from django.urls import path
-from .views import RegisterUserView, VerifyUserEmail, LoginUserView, TestAuthenticationView,PasswordResetConfirm, PasswordResetRequestView, SetNewPassword, LogoutUserView
+from .views import RegisterUserView, VerifyUserEmail, LoginUserView, TestAuthenticationView,PasswordResetConfirm, PasswordResetRequestView, SetNewPassword, LogoutUserView, ProvisionUsersView
 from rest_framework_simplejwt.views import TokenRefreshView
+from .async_views import AsyncRegisterUserView, AsyncLoginUserView
 
 
 urlpatterns=[
@@ -13,4 +14,7 @@ urlpatterns=[
     path('set-new-password/', SetNewPassword.as_view(), name='set-new-password'),
     path('logout/', LogoutUserView.as_view(), name='logout'),
     path('profile/', TestAuthenticationView.as_view(), name='granted'),
+    path('async/register/', AsyncRegisterUserView.as_view(), name='async-register'),
+    path('async/login/', AsyncLoginUserView.as_view(), name='async-login'),
+    path('provision/', ProvisionUsersView.as_view(), name='provision-users'),
 ]
\ No newline at end of file
@@ -1,7 +1,10 @@
 import random
-from django.core.mail import EmailMessage
-from .models import User, OneTimePassword
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F
+from django.utils import timezone
+from .models import User, OneTimePassword, QueuedEmail
 from django.conf import settings
+from Server.executors import run_blocking_io
 
 def generateOtp():
     otp=""
@@ -24,6 +27,19 @@ def send_code_to_user(email):
     d_email.send(fail_silently=True)
 
 
+async def asend_code_to_user(user):
+    Subject="One Time passcode for Email verfication"
+    otp_code = generateOtp()
+    current_site = "devxnet.com"
+    email_boby=f"Hey {user.first_name} thanks for signing up on {current_site} please verify your email with the \n one time passcode {otp_code}"
+    from_email = settings.DEFAULT_FROM_EMAIL
+
+    await OneTimePassword.objects.acreate(user=user, code=otp_code)
+
+    d_email = EmailMessage(subject=Subject, body=email_boby, from_email=from_email, to=[user.email])
+    await run_blocking_io(d_email.send, fail_silently=True)
+
+
 def send_normal_email(data):
     email = EmailMessage(
         subject = data['email_subject'],
@@ -33,4 +49,60 @@ def send_normal_email(data):
     )
     email.send()
 
-    
\ No newline at end of file
+    
+
+# --------------------------- Email outbox --------------------------- #
+# Mail for many users at once (invitations) is written to QueuedEmail in bulk
+# instead of being sent inline; `manage.py send_queued_emails` sends it over one
+# SMTP connection per batch and retries failures up to EMAIL_QUEUE_MAX_ATTEMPTS
+# times. Run one sender at a time.
+
+def queue_email(to_email, subject, body):
+    """ An unsaved QueuedEmail; save many with QueuedEmail.objects.bulk_create(). """
+    return QueuedEmail(to_email=to_email, subject=subject, body=body)
+
+
+def send_queued_emails(limit=None, batch_size=None):
+    """ Send pending emails, oldest first; returns (sent, failed). """
+    batch_size = batch_size or settings.EMAIL_QUEUE_BATCH_SIZE
+    pending = QueuedEmail.objects.filter(sent_at__isnull=True, attempts__lt=settings.EMAIL_QUEUE_MAX_ATTEMPTS)
+    sent = failed = 0
+    last_pk = 0
+    while limit is None or sent + failed < limit:
+        size = batch_size if limit is None else min(batch_size, limit - sent - failed)
+        batch = list(pending.filter(pk__gt=last_pk).order_by('pk')[:size])
+        if not batch:
+            break
+        last_pk = batch[-1].pk
+        delivered, errors = _send_batch(batch)
+        QueuedEmail.objects.filter(pk__in=delivered).update(sent_at=timezone.now(), attempts=F('attempts') + 1)
+        for error, pks in errors.items():
+            QueuedEmail.objects.filter(pk__in=pks).update(attempts=F('attempts') + 1, last_error=error)
+        sent += len(delivered)
+        failed += sum(len(pks) for pks in errors.values())
+    return sent, failed
+
+
+def _send_batch(batch):
+    """ ([delivered pks], {error: [pks]}) """
+    delivered, errors = [], {}
+    connection = get_connection()
+    try:
+        connection.open()
+    except Exception as exc:
+        return [], {str(exc): [email.pk for email in batch]}
+    try:
+        for email in batch:
+            message = EmailMessage(
+                subject=email.subject, body=email.body, from_email=settings.DEFAULT_FROM_EMAIL,
+                to=[email.to_email], connection=connection,
+            )
+            try:
+                message.send()
+            except Exception as exc:
+                errors.setdefault(str(exc), []).append(email.pk)
+            else:
+                delivered.append(email.pk)
+    finally:
+        connection.close()
+    return delivered, errors
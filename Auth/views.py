@@ -1,16 +1,20 @@
 from django.shortcuts import render
 from rest_framework.generics import GenericAPIView
 from rest_framework.views import APIView
-from .serializers import UserRegisterSerializer, LoginSerializer,PasswordResetRequestSerializer, SetNewPasswordSerializer, LogoutUserSerializer
+from .serializers import UserRegisterSerializer, LoginSerializer,PasswordResetRequestSerializer, SetNewPasswordSerializer, LogoutUserSerializer, UserProvisionSerializer
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
+from rest_framework.parsers import MultiPartParser
 from rest_framework import status
 from .utils import send_code_to_user
 from .models import OneTimePassword, User
 from django.utils.http import urlsafe_base64_decode
 from django.utils.encoding import smart_str, DjangoUnicodeDecodeError
 from django.contrib.auth.tokens import PasswordResetTokenGenerator
+from django.conf import settings
 from rest_framework_simplejwt.tokens import RefreshToken
+from dataclasses import asdict
+from .provisioning import ProvisioningError, provision_users
 
 class RegisterUserView(GenericAPIView):
     serializer_class = UserRegisterSerializer
@@ -115,3 +119,24 @@ class LogoutUserView(GenericAPIView):
         serializer.is_valid(raise_exception=True)
         serializer.save()
         return Response(status=status.HTTP_200_OK)
+
+
+class ProvisionUsersView(GenericAPIView):
+    """ Staff only: create users in bulk from an uploaded CSV (see Auth.provisioning). """
+    serializer_class = UserProvisionSerializer
+    permission_classes = [IsAdminUser]
+    parser_classes = [MultiPartParser]
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        try:
+            text = serializer.validated_data['file'].read().decode('utf-8-sig')
+        except UnicodeDecodeError:
+            return Response({'message': 'The CSV must be UTF-8 encoded.'}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            # Not the request's Host header, which the client controls.
+            result = provision_users(text, settings.INVITE_BASE_URL, serializer.validated_data['dry_run'])
+        except ProvisioningError as exc:
+            return Response({'message': str(exc), 'errors': exc.errors}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(asdict(result), status=status.HTTP_200_OK if result.dry_run else status.HTTP_201_CREATED)
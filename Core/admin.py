@@ -1,12 +1,47 @@
+from django import forms
 from django.contrib import admin
+from .admin_performance import AutocompleteFilter, PerformanceModelAdmin
+from .cache import related
 from .models import (
     Workspace, Team, Worker, Project, Sprint, Tag, 
     Bug, BugAttachment, ActivityLog, Notification, TimeTracking
 )
 
+
+def cached_fk(field_name):
+    """ list_display column that resolves a foreign key through the lookup cache. """
+    def display(obj):
+        return related(obj, field_name)
+    display.__name__ = field_name
+    return admin.display(description=field_name.replace('_', ' '), ordering=field_name)(display)
+
+
+class VersionedForm(forms.ModelForm):
+    """ Sends back the version the page was loaded at, so saving over someone else's change is refused. """
+    version = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if self.instance.pk is not None:
+            self.fields['version'].initial = self.instance.version
+
+    def clean(self):
+        cleaned_data = super().clean()
+        version = cleaned_data.get('version')
+        if self.instance.pk is not None and version is not None:
+            # The save itself is conditional on this version too (see Core.versioning).
+            self.instance.version = version
+            current = type(self.instance)._base_manager.filter(pk=self.instance.pk).values_list('version', flat=True)
+            if current.first() != version:
+                raise forms.ValidationError(
+                    "Someone else saved this object since you opened it. Reload the page to see their changes."
+                )
+        return cleaned_data
+
+
 # -------------------- Workspace Admin -------------------- #
 @admin.register(Workspace)
-class WorkspaceAdmin(admin.ModelAdmin):
+class WorkspaceAdmin(PerformanceModelAdmin):
     list_display = ('name', 'created_at')
     search_fields = ('name',)
     ordering = ('-created_at',)
@@ -14,83 +49,104 @@ class WorkspaceAdmin(admin.ModelAdmin):
 
 # -------------------- Team Admin -------------------- #
 @admin.register(Team)
-class TeamAdmin(admin.ModelAdmin):
-    list_display = ('name', 'workspace', 'created_at')
+class TeamAdmin(PerformanceModelAdmin):
+    list_display = ('name', cached_fk('workspace'), 'created_at')
     search_fields = ('name', 'workspace__name')
     ordering = ('-created_at',)
 
 
 # -------------------- Worker Admin -------------------- #
 @admin.register(Worker)
-class WorkerAdmin(admin.ModelAdmin):
-    list_display = ('user', 'team', 'role', 'joined_at')
-    list_filter = ('role', 'team')
-    search_fields = ('user__username', 'team__name')
+class WorkerAdmin(PerformanceModelAdmin):
+    list_display = ('user', cached_fk('team'), 'role', 'joined_at')
+    list_select_related = ('user',)
+    list_filter = ('role', ('team', AutocompleteFilter))
+    autocomplete_fields = ('team',)
+    raw_id_fields = ('user',)
+    search_fields = ('user__email', 'team__name')
 
 
 # -------------------- Project Admin -------------------- #
 @admin.register(Project)
-class ProjectAdmin(admin.ModelAdmin):
-    list_display = ('name', 'workspace', 'assigned_team', 'created_at')
-    list_filter = ('workspace', 'assigned_team')
+class ProjectAdmin(PerformanceModelAdmin):
+    form = VersionedForm
+    list_display = ('name', cached_fk('workspace'), cached_fk('assigned_team'), 'created_at')
+    list_filter = (('workspace', AutocompleteFilter), ('assigned_team', AutocompleteFilter))
+    autocomplete_fields = ('workspace', 'assigned_team')
     search_fields = ('name', 'workspace__name', 'assigned_team__name')
     ordering = ('-created_at',)
 
 
 # -------------------- Sprint Admin -------------------- #
 @admin.register(Sprint)
-class SprintAdmin(admin.ModelAdmin):
-    list_display = ('name', 'project', 'start_date', 'end_date', 'is_active')
-    list_filter = ('is_active', 'project')
+class SprintAdmin(PerformanceModelAdmin):
+    form = VersionedForm
+    list_display = ('name', cached_fk('project'), 'start_date', 'end_date', 'is_active')
+    list_filter = ('is_active', ('project', AutocompleteFilter))
+    autocomplete_fields = ('project',)
     search_fields = ('name', 'project__name')
 
 
 # -------------------- Tag Admin -------------------- #
 @admin.register(Tag)
-class TagAdmin(admin.ModelAdmin):
+class TagAdmin(PerformanceModelAdmin):
     list_display = ('name',)
     search_fields = ('name',)
 
 
 # -------------------- Bug Admin -------------------- #
 @admin.register(Bug)
-class BugAdmin(admin.ModelAdmin):
+class BugAdmin(PerformanceModelAdmin):
+    form = VersionedForm
     list_display = ('title', 'project', 'status', 'severity', 'priority', 'assigned_team', 'assigned_worker', 'created_at')
-    list_filter = ('status', 'severity', 'priority', 'project', 'assigned_team')
-    search_fields = ('title', 'description', 'project__name', 'assigned_worker__user__username')
+    list_select_related = ('project', 'assigned_team', 'assigned_worker__user')
+    list_filter = ('status', 'severity', 'priority', ('project', AutocompleteFilter), ('assigned_team', AutocompleteFilter))
+    autocomplete_fields = ('project', 'assigned_team', 'assigned_worker', 'sprint', 'tags', 'dependencies')
+    raw_id_fields = ('reported_by',)
+    search_fields = ('title', 'description', 'project__name', 'assigned_worker__user__email')
     ordering = ('-created_at',)
 
 
 # -------------------- BugAttachment Admin -------------------- #
 @admin.register(BugAttachment)
-class BugAttachmentAdmin(admin.ModelAdmin):
-    list_display = ('bug', 'file', 'uploaded_at')
-    search_fields = ('bug__title',)
+class BugAttachmentAdmin(PerformanceModelAdmin):
+    list_display = ('name', 'bug', 'size', 'mime_type', 'uploaded_at')
+    list_select_related = ('bug',)
+    list_filter = ('mime_type',)
+    autocomplete_fields = ('bug',)
+    readonly_fields = ('blob', 'size', 'mime_type')
+    search_fields = ('name', 'bug__title')
     ordering = ('-uploaded_at',)
 
 
 # -------------------- Activity Log Admin -------------------- #
 @admin.register(ActivityLog)
-class ActivityLogAdmin(admin.ModelAdmin):
-    list_display = ('message', 'project', 'bug', 'worker', 'created_at')
-    list_filter = ('project', 'bug', 'worker')
-    search_fields = ('message', 'project__name', 'bug__title', 'worker__user__username')
+class ActivityLogAdmin(PerformanceModelAdmin):
+    list_display = ('message', cached_fk('project'), 'bug', cached_fk('worker'), 'created_at')
+    list_select_related = ('bug',)
+    list_filter = (('project', AutocompleteFilter), ('bug', AutocompleteFilter), ('worker', AutocompleteFilter))
+    autocomplete_fields = ('project', 'bug', 'worker')
+    search_fields = ('message', 'project__name', 'bug__title', 'worker__user__email')
     ordering = ('-created_at',)
 
 
 # -------------------- Notification Admin -------------------- #
 @admin.register(Notification)
-class NotificationAdmin(admin.ModelAdmin):
-    list_display = ('user', 'message', 'is_read', 'created_at')
+class NotificationAdmin(PerformanceModelAdmin):
+    list_display = ('user', 'message', 'event_count', 'is_read', 'created_at')
+    list_select_related = ('user',)
+    raw_id_fields = ('user', 'bug')
     list_filter = ('is_read',)
-    search_fields = ('user__username', 'message')
+    search_fields = ('user__email', 'message')
     ordering = ('-created_at',)
 
 
 # -------------------- Time Tracking Admin -------------------- #
 @admin.register(TimeTracking)
-class TimeTrackingAdmin(admin.ModelAdmin):
-    list_display = ('worker', 'bug', 'time_spent')
-    list_filter = ('worker', 'bug')
-    search_fields = ('worker__user__username', 'bug__title')
+class TimeTrackingAdmin(PerformanceModelAdmin):
+    list_display = (cached_fk('worker'), 'bug', 'time_spent')
+    list_select_related = ('bug',)
+    list_filter = (('worker', AutocompleteFilter), ('bug', AutocompleteFilter))
+    autocomplete_fields = ('worker', 'bug')
+    search_fields = ('worker__user__email', 'bug__title')
 
@@ -0,0 +1,167 @@
+from django.contrib import admin
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+# --------------------------- Admin changelist performance layer --------------------------- #
+# Shared by every Core ModelAdmin: estimated counts instead of COUNT(*) over the
+# whole table, autocomplete foreign key filters instead of sidebars listing every
+# related row, and keyset ("cursor") navigation that never needs a large OFFSET.
+# The cursor is the pk of the last row shown; the next page continues from that
+# row's values in the changelist's own ordering (admin `ordering` or ?o=), which
+# ChangeList always ends with a pk tiebreaker, so no row is skipped or repeated.
+
+CURSOR_VAR = 'cursor'
+
+
+def estimate_row_count(model, using):
+    """ Cheap estimate of a table's row count from planner statistics, or None if unavailable. """
+    connection = connections[using]
+    table = model._meta.db_table
+    with connection.cursor() as cursor:
+        if connection.vendor == 'postgresql':
+            cursor.execute("SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass", [table])
+            row = cursor.fetchone()
+            return row[0] if row and row[0] >= 0 else None
+        if connection.vendor == 'sqlite':
+            # Upper bound: rowids are only reused after deletes, so gaps make this overestimate.
+            cursor.execute(f"SELECT MAX(rowid) FROM {connection.ops.quote_name(table)}")
+            row = cursor.fetchone()
+            return row[0] or 0
+    return None
+
+
+class EstimatedCountPaginator(Paginator):
+    """ Paginator that avoids COUNT(*) over large tables.
+
+    Unfiltered querysets use the database's row estimate once it is above
+    `exact_count_threshold`; filtered ones are counted up to `filtered_count_cap` rows.
+    """
+
+    exact_count_threshold = 10000
+    filtered_count_cap = 10000
+
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        if not hasattr(queryset, 'query'):
+            return len(queryset)
+        if not queryset.query.has_filters():
+            estimate = estimate_row_count(queryset.model, queryset.db)
+            if estimate is not None and estimate > self.exact_count_threshold:
+                return estimate
+        return queryset.order_by()[:self.filtered_count_cap].count()
+
+
+class AutocompleteFilter(admin.RelatedFieldListFilter):
+    """ Foreign key list filter backed by the admin autocomplete view instead of a full choice list. """
+
+    template = 'admin/core/autocomplete_filter.html'
+
+    def field_choices(self, field, request, model_admin):
+        if not self.lookup_val:
+            return []
+        related = field.related_model._default_manager.filter(pk__in=self.lookup_val)
+        return [(obj.pk, str(obj)) for obj in related]
+
+    def has_output(self):
+        return True
+
+    @property
+    def app_label(self):
+        return self.field.model._meta.app_label
+
+    @property
+    def model_name(self):
+        return self.field.model._meta.model_name
+
+
+class CursorChangeList(ChangeList):
+    """ ChangeList that can page from the row ?cursor=<pk> in its current ordering instead of OFFSET. """
+
+    def __init__(self, request, *args, **kwargs):
+        try:
+            self.cursor = int(request.GET[CURSOR_VAR])
+        except (KeyError, ValueError):
+            self.cursor = None
+        super().__init__(request, *args, **kwargs)
+        self.params.pop(CURSOR_VAR, None)
+        self.filter_params.pop(CURSOR_VAR, None)
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        lookup_params.pop(CURSOR_VAR, None)
+        return lookup_params
+
+    def get_queryset(self, request, exclude_parameters=None):
+        queryset = super().get_queryset(request, exclude_parameters)
+        prefetch = getattr(self.model_admin, 'list_prefetch_related', ())
+        if prefetch:
+            queryset = queryset.prefetch_related(*prefetch)
+        self.keyset_ordering = self.get_keyset_ordering(request, queryset)
+        if self.cursor is not None:
+            keyset = self.keyset_filter(queryset) if self.keyset_ordering else None
+            if keyset is None:
+                self.cursor = None
+            else:
+                queryset = queryset.filter(keyset)
+        return queryset
+
+    def get_keyset_ordering(self, request, queryset):
+        """ (field, descending) pairs of the effective ordering, or None when a cursor cannot follow it. """
+        ordering = []
+        for field in self.get_ordering(request, queryset):
+            if not isinstance(field, str) or field == '?':
+                return None
+            ordering.append((field.lstrip('-'), field.startswith('-')))
+        return ordering
+
+    def keyset_filter(self, queryset):
+        """ Rows after the cursor row: later in the first column, or tied on it and later in the next. """
+        names = [name for name, _ in self.keyset_ordering]
+        anchor = queryset.model._base_manager.using(queryset.db).filter(pk=self.cursor).values(*names).first()
+        if anchor is None or any(value is None for value in anchor.values()):
+            return None
+        keyset, tied = Q(), Q()
+        for name, descending in self.keyset_ordering:
+            keyset |= tied & Q(**{f"{name}__{'lt' if descending else 'gt'}": anchor[name]})
+            tied &= Q(**{name: anchor[name]})
+        return keyset
+
+    @cached_property
+    def next_cursor(self):
+        if not self.multi_page or not self.keyset_ordering:
+            return None
+        results = list(self.result_list)
+        if len(results) < self.list_per_page:
+            return None
+        return results[-1].pk
+
+    def next_cursor_url(self):
+        return self.get_query_string({CURSOR_VAR: self.next_cursor}, remove=[PAGE_VAR])
+
+    def first_page_url(self):
+        return self.get_query_string(remove=[CURSOR_VAR, PAGE_VAR])
+
+
+class PerformanceModelAdmin(admin.ModelAdmin):
+    """ Base ModelAdmin for large Core tables. """
+
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    list_prefetch_related = ()
+
+    def get_changelist(self, request, **kwargs):
+        return CursorChangeList
+
+    @property
+    def media(self):
+        media = super().media
+        for list_filter in self.list_filter:
+            if isinstance(list_filter, (list, tuple)) and issubclass(list_filter[1], AutocompleteFilter):
+                field = self.model._meta.get_field(list_filter[0])
+                return media + AutocompleteSelect(field, self.admin_site).media
+        return media
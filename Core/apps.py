@@ -4,3 +4,22 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'Core'
+
+    def ready(self):
+        from Auth.models import User
+        from . import (  # noqa: F401 (signal receivers)
+            archive, attachments, cache, changelog, dedup, logindex, notifications, saved_filters, sharding, tag_index,
+            triage,
+        )
+
+        cache.register(self.get_model('Workspace'))
+        cache.register(self.get_model('WorkspaceShard'))
+        cache.register(self.get_model('Team'))
+        cache.register(self.get_model('Project'))
+        cache.register(self.get_model('Tag'))
+        cache.register(self.get_model('SavedFilter'))
+        # A cached worker carries its user, whose email is its name and whose workspace the
+        # permission cache depends on; other user saves (last_login on every login) are not news.
+        cache.register(
+            self.get_model('Worker'), select_related=('user',), invalidated_by=((User, ('email', 'workspace')),),
+        )
@@ -0,0 +1,239 @@
+import datetime
+import json
+import zlib
+from collections import Counter
+from decimal import Decimal
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.utils.duration import duration_string
+
+from Auth.models import User
+from .models import (
+    ActivityLog, ArchivedBug, AttachmentBlob, Bug, BugAttachment, Sprint, Tag, Team, TimeTracking, Worker,
+)
+
+# --------------------------- Archival of closed bugs --------------------------- #
+# Bugs closed (by their last update) more than BUG_ARCHIVE_AFTER_DAYS ago move to
+# ArchivedBug: one row per bug with a few indexed columns and a zlib-compressed
+# JSON blob holding the bug row, its tag and dependency links, and its activity
+# log, time tracking and attachment rows. Archiving runs in transactions of
+# BUG_ARCHIVE_BATCH_SIZE bugs and deletes the originals the usual way, so the tag
+# index, duplicate signatures and the change log (which reports them deleted)
+# stay consistent.
+#
+# The archive keeps the references of its attachments on their blobs, so the
+# files survive garbage collection; deleting an ArchivedBug releases them and
+# restoring one hands them back to the recreated attachment rows. A restored bug
+# keeps its id; links to tags, bugs, sprints, teams or workers that no longer
+# exist are dropped (time entries of a deleted worker are dropped with them).
+
+VERSION = 1
+CHILDREN = {
+    'activity_logs': ActivityLog,
+    'time_tracking': TimeTracking,
+    'attachments': BugAttachment,
+}
+
+
+def _default(value):
+    if isinstance(value, (datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return duration_string(value)
+    if isinstance(value, Decimal):
+        return str(value)
+    raise TypeError(f"Cannot archive {type(value).__name__} values.")
+
+
+def pack(data):
+    return zlib.compress(json.dumps(data, default=_default, separators=(',', ':')).encode(), 6)
+
+
+def unpack(archived):
+    return json.loads(zlib.decompress(bytes(archived.data)))
+
+
+def _decode(model, row):
+    """ Field values of a stored row, parsed back into Python types. """
+    return {
+        field.attname: field.to_python(row[field.attname])
+        for field in model._meta.concrete_fields if field.attname in row
+    }
+
+
+def _grouped(pairs):
+    groups = {}
+    for key, value in pairs:
+        groups.setdefault(key, []).append(value)
+    return groups
+
+
+def _existing(model, ids):
+    ids = {pk for pk in ids if pk is not None}
+    return set(model._base_manager.filter(pk__in=ids).values_list('pk', flat=True)) if ids else set()
+
+
+def blob_references(archived):
+    """ {sha256: count} of the attachments held in `archived` rows. """
+    references = Counter()
+    for row in archived:
+        for attachment in unpack(row)['attachments']:
+            if attachment['blob_id']:
+                references[attachment['blob_id']] += 1
+    return references
+
+
+# --------------------------- Archiving --------------------------- #
+
+def candidates(older_than):
+    return Bug.objects.filter(status='closed', updated_at__lt=older_than)
+
+
+def archive_closed_bugs(older_than, batch_size=None, limit=None):
+    """ Archive bugs closed before `older_than`, oldest id first; returns how many were archived. """
+    batch_size = batch_size or settings.BUG_ARCHIVE_BATCH_SIZE
+    archived = 0
+    while limit is None or archived < limit:
+        size = batch_size if limit is None else min(batch_size, limit - archived)
+        ids = list(candidates(older_than).order_by('pk').values_list('pk', flat=True)[:size])
+        if not ids:
+            break
+        with transaction.atomic(using=router.db_for_write(Bug)):
+            # Re-checked inside the transaction: a bug reopened meanwhile stays.
+            archived += archive_bugs(candidates(older_than).filter(pk__in=ids))
+    return archived
+
+
+def archive_bugs(bugs):
+    """ Move `bugs` with their children into ArchivedBug; run inside a transaction. Returns the count. """
+    rows = list(bugs.order_by('pk').values())
+    ids = [row['id'] for row in rows]
+    if not ids:
+        return 0
+    through = Bug.dependencies.through.objects
+    tags = _grouped(Bug.tags.through.objects.filter(bug_id__in=ids).values_list('bug_id', 'tag_id'))
+    dependencies = _grouped(through.filter(from_bug_id__in=ids).values_list('from_bug_id', 'to_bug_id'))
+    blocked_by = _grouped(through.filter(to_bug_id__in=ids).values_list('to_bug_id', 'from_bug_id'))
+    children = {
+        name: _grouped((row['bug_id'], row) for row in model.objects.filter(bug_id__in=ids).order_by('pk').values())
+        for name, model in CHILDREN.items()
+    }
+    ArchivedBug.objects.bulk_create([
+        ArchivedBug(
+            bug_id=row['id'], project_id=row['project_id'], title=row['title'], closed_at=row['updated_at'],
+            data=pack({
+                'version': VERSION,
+                'bug': row,
+                'tags': tags.get(row['id'], []),
+                'dependencies': dependencies.get(row['id'], []),
+                'blocked_by': blocked_by.get(row['id'], []),
+                **{name: groups.get(row['id'], []) for name, groups in children.items()},
+            }),
+        )
+        for row in rows
+    ], batch_size=len(rows))
+    # The archive takes its own references before deleting the attachments releases theirs, so a
+    # count never drops to zero in between (where the release would be clamped, or GC could strike).
+    references = Counter(
+        attachment['blob_id'] for groups in children['attachments'].values() for attachment in groups
+        if attachment['blob_id']
+    )
+    for sha256, count in references.items():
+        AttachmentBlob.objects.filter(pk=sha256).update(ref_count=F('ref_count') + count)
+    Bug.objects.filter(pk__in=ids).delete()
+    return len(ids)
+
+
+# --------------------------- Reading and restoring --------------------------- #
+
+def archived_bug(archived, data=None):
+    """ An unsaved Bug as it was archived, with links to objects that are gone cleared; tags are prefetched. """
+    data = data or unpack(archived)
+    bug = Bug(**_decode(Bug, data['bug']))
+    bug.project_id = archived.project_id
+    for field, model in (
+        ('sprint_id', Sprint), ('assigned_team_id', Team), ('assigned_worker_id', Worker), ('reported_by_id', User),
+    ):
+        value = getattr(bug, field)
+        if value is not None and value not in _existing(model, [value]):
+            setattr(bug, field, None)
+    bug._prefetched_objects_cache = {'tags': Tag.objects.filter(pk__in=data['tags'])}
+    return bug
+
+
+def restore_bug(archived):
+    """ Recreate an archived bug with its links and children, and drop the archive row. Returns the bug. """
+    data = unpack(archived)
+    with transaction.atomic(using=router.db_for_write(Bug)):
+        bug = archived_bug(archived, data)
+        del bug._prefetched_objects_cache
+        bug.save(force_insert=True)
+        bug.tags.set(_existing(Tag, data['tags']))
+        bug.dependencies.set(_existing(Bug, data['dependencies']))
+        bug.blocked_by.add(*_existing(Bug, data['blocked_by']))
+
+        workers = _existing(Worker, [row['worker_id'] for name in ('activity_logs', 'time_tracking') for row in data[name]])
+        blobs = _existing(AttachmentBlob, [row['blob_id'] for row in data['attachments']])
+        for name, model in CHILDREN.items():
+            objects = []
+            for row in data[name]:
+                values = _decode(model, row)
+                values.pop('id')
+                values['bug_id'] = bug.pk
+                if name == 'activity_logs':
+                    values['project_id'] = bug.project_id
+                    values['worker_id'] = values['worker_id'] if values['worker_id'] in workers else None
+                elif name == 'time_tracking' and values['worker_id'] not in workers:
+                    continue
+                elif name == 'attachments' and values['blob_id'] is not None and values['blob_id'] not in blobs:
+                    continue
+                objects.append(model(**values))
+            _restore(model, objects)
+        # The new attachment rows take over the references the archive held, which its deletion releases.
+        references = Counter(row['blob_id'] for row in data['attachments'] if row['blob_id'] in blobs)
+        for sha256, count in references.items():
+            AttachmentBlob.objects.filter(pk=sha256).update(ref_count=F('ref_count') + count)
+        archived.delete()
+    return bug
+
+
+def _restore(model, objects):
+    """ bulk_create `objects`, then put back the timestamps that auto_now_add overwrote. """
+    if not objects:
+        return
+    stamps = [field for field in model._meta.concrete_fields if getattr(field, 'auto_now_add', False)]
+    originals = [[getattr(obj, field.attname) for field in stamps] for obj in objects]
+    model.objects.bulk_create(objects, batch_size=settings.BUG_ARCHIVE_BATCH_SIZE)
+    if stamps:
+        for obj, values in zip(objects, originals):
+            for field, value in zip(stamps, values):
+                setattr(obj, field.attname, value)
+        model.objects.bulk_update(objects, [field.name for field in stamps], batch_size=settings.BUG_ARCHIVE_BATCH_SIZE)
+
+
+def remap(data, ids):
+    """ `data` with ids rewritten through `ids` ({model: {old: new}}, as a workspace move builds it). """
+    bug = data['bug']
+    for field, model in (('sprint_id', Sprint), ('assigned_team_id', Team), ('assigned_worker_id', Worker)):
+        if bug[field] is not None:
+            bug[field] = ids.get(model, {}).get(bug[field])
+    for name, model in (('tags', Tag), ('dependencies', Bug), ('blocked_by', Bug)):
+        data[name] = [ids[model][pk] for pk in data[name] if pk in ids.get(model, {})]
+    for name in ('activity_logs', 'time_tracking'):
+        for row in data[name]:
+            row['worker_id'] = ids.get(Worker, {}).get(row['worker_id'])
+    return data
+
+
+# --------------------------- Signal receivers --------------------------- #
+
+def release_blobs(sender, instance, **kwargs):
+    """ Drop the deleted archive row's references to its attachment blobs. """
+    for sha256, count in blob_references([instance]).items():
+        AttachmentBlob.objects.filter(pk=sha256, ref_count__gte=count).update(ref_count=F('ref_count') - count)
+
+
+post_delete.connect(release_blobs, sender=ArchivedBug, dispatch_uid='core-archive-release-blobs')
@@ -0,0 +1,292 @@
+import hashlib
+import mimetypes
+import os
+import re
+import tempfile
+import time
+
+from django.conf import settings
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile
+from django.db import router, transaction
+from django.db.models import F
+from django.db.models.signals import post_delete
+from django.http import FileResponse, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.utils.http import content_disposition_header
+
+from . import sharding
+from .models import AttachmentBlob, BugAttachment
+
+# --------------------------- Content-addressed attachment store --------------------------- #
+# Uploads are hashed while they stream to a temporary file next to the blob
+# directory, then renamed to blobs/<aa>/<bb>/<sha256>. Identical content is
+# stored once; AttachmentBlob.ref_count tracks how many attachments use it and
+# gc_attachment_blobs removes blobs nothing refers to any more.
+
+CHUNK_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def blob_name(sha256):
+    return f"blobs/{sha256[:2]}/{sha256[2:4]}/{sha256}"
+
+
+def blob_path(sha256):
+    return os.path.join(settings.MEDIA_ROOT, blob_name(sha256))
+
+
+def temp_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'blobs', 'tmp')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def guess_mime_type(name, content_type=None):
+    if content_type and content_type != 'application/octet-stream':
+        return content_type
+    return mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+
+class HashedUploadedFile(UploadedFile):
+    """ Uploaded file already written to the blob temp directory, with its SHA-256. """
+
+    def __init__(self, file, name, content_type, size, charset, sha256, content_type_extra=None):
+        super().__init__(file, name, content_type, size, charset, content_type_extra)
+        self.sha256 = sha256
+
+    def temporary_file_path(self):
+        return self.file.name
+
+    def close(self):
+        try:
+            return self.file.close()
+        except FileNotFoundError:
+            pass
+
+
+class HashingUploadHandler(FileUploadHandler):
+    """ Streams each uploaded file to disk chunk by chunk, hashing as it goes. """
+
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.file = tempfile.NamedTemporaryFile(dir=temp_dir(), suffix='.upload', delete=False)
+        self.hasher = hashlib.sha256()
+        self.received = 0
+
+    def receive_data_chunk(self, raw_data, start):
+        self.received += len(raw_data)
+        if self.received > settings.ATTACHMENT_MAX_SIZE:
+            self.file.close()
+            os.unlink(self.file.name)
+            raise SkipFile()
+        self.hasher.update(raw_data)
+        self.file.write(raw_data)
+
+    def file_complete(self, file_size):
+        self.file.flush()
+        self.file.seek(0)
+        return HashedUploadedFile(
+            self.file, self.file_name, self.content_type, file_size, self.charset,
+            self.hasher.hexdigest(), self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        if hasattr(self, 'file'):
+            self.file.close()
+            try:
+                os.unlink(self.file.name)
+            except FileNotFoundError:
+                pass
+
+
+def _spool(uploaded):
+    """ Copy an upload that did not go through HashingUploadHandler into the temp dir, hashing it. """
+    hasher = hashlib.sha256()
+    with tempfile.NamedTemporaryFile(dir=temp_dir(), suffix='.upload', delete=False) as fh:
+        for chunk in uploaded.chunks(CHUNK_SIZE):
+            hasher.update(chunk)
+            fh.write(chunk)
+    return fh.name, hasher.hexdigest()
+
+
+def store_blob(uploaded):
+    """ Store the upload's content (once) and return its AttachmentBlob with one more reference. """
+    if isinstance(uploaded, HashedUploadedFile):
+        uploaded.file.close()
+        temp_path, sha256 = uploaded.temporary_file_path(), uploaded.sha256
+    else:
+        temp_path, sha256 = _spool(uploaded)
+
+    final_path = blob_path(sha256)
+    try:
+        while True:
+            with transaction.atomic(using=router.db_for_write(AttachmentBlob)):
+                blob, created = AttachmentBlob.objects.get_or_create(sha256=sha256, defaults={
+                    'size': uploaded.size,
+                    'mime_type': guess_mime_type(uploaded.name, uploaded.content_type),
+                })
+                # The row may have been garbage-collected between the two statements.
+                if AttachmentBlob.objects.filter(pk=sha256).update(ref_count=F('ref_count') + 1):
+                    break
+        if not os.path.exists(final_path):
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            os.replace(temp_path, final_path)
+    finally:
+        if os.path.exists(temp_path):
+            os.unlink(temp_path)
+    blob.ref_count += 1
+    return blob
+
+
+def attach(bug, uploaded):
+    # One transaction, so a failed insert does not leave the blob with a reference nobody holds.
+    with transaction.atomic(using=router.db_for_write(BugAttachment)):
+        blob = store_blob(uploaded)
+        return BugAttachment.objects.create(
+            bug=bug, blob=blob, file=blob_name(blob.sha256), name=os.path.basename(uploaded.name)[:255],
+            size=blob.size, mime_type=blob.mime_type,
+        )
+
+
+def release_blob(sender, instance, **kwargs):
+    """ Drop the deleted attachment's reference to its blob. """
+    if instance.blob_id:
+        AttachmentBlob.objects.filter(pk=instance.blob_id, ref_count__gt=0).update(ref_count=F('ref_count') - 1)
+
+
+post_delete.connect(release_blob, sender=BugAttachment, dispatch_uid='core-attachments-release-blob')
+
+
+def _stored_anywhere(sha256):
+    """ Blob files are shared by every database that holds attachments (see Core.sharding). """
+    return any(AttachmentBlob.objects.using(using).filter(pk=sha256).exists() for using in sharding.databases())
+
+
+def _remove_blob(using, sha256, cutoff, dry_run=False):
+    """ Delete an unreferenced blob older than `cutoff`, and its file unless another database has it.
+
+    Returns the bytes freed, or None when the blob stays.
+    """
+    path = blob_path(sha256)
+    try:
+        if os.path.getmtime(path) > cutoff:
+            return None
+        size = os.path.getsize(path)
+    except FileNotFoundError:
+        size = 0
+    if dry_run:
+        return size
+    with transaction.atomic(using=using):
+        deleted, _ = (
+            AttachmentBlob.objects.using(using).filter(pk=sha256, ref_count=0, attachments__isnull=True).delete()
+        )
+        if deleted and size:
+            if _stored_anywhere(sha256):
+                size = 0  # Another database still has the file.
+            else:
+                os.unlink(path)
+    return size if deleted else None
+
+
+def remove_unreferenced_blobs(sha256s, grace_seconds=None):
+    """ collect_garbage() for just these blobs, e.g. the ones a purge released. Returns (removed, bytes freed). """
+    if grace_seconds is None:
+        grace_seconds = settings.ATTACHMENT_GC_GRACE_SECONDS
+    cutoff = time.time() - grace_seconds
+    removed = freed = 0
+    sha256s = list(sha256s)
+    for using in sharding.databases():
+        for start in range(0, len(sha256s), 500):
+            unreferenced = AttachmentBlob.objects.using(using).filter(
+                pk__in=sha256s[start:start + 500], ref_count=0, attachments__isnull=True,
+            )
+            for sha256 in unreferenced.values_list('sha256', flat=True):
+                size = _remove_blob(using, sha256, cutoff)
+                if size is not None:
+                    removed, freed = removed + 1, freed + size
+    return removed, freed
+
+
+def collect_garbage(grace_seconds=None, dry_run=False):
+    """ Delete unreferenced blobs, blob files without a row and stale temp uploads.
+
+    Only things older than `grace_seconds` are touched, so uploads in flight survive.
+    Returns (blobs removed, orphan files removed, bytes freed).
+    """
+    if grace_seconds is None:
+        grace_seconds = settings.ATTACHMENT_GC_GRACE_SECONDS
+    cutoff = time.time() - grace_seconds
+    removed = orphans = freed = 0
+
+    for using in sharding.databases():
+        unreferenced = AttachmentBlob.objects.using(using).filter(ref_count=0, attachments__isnull=True)
+        for sha256 in unreferenced.values_list('sha256', flat=True).iterator():
+            size = _remove_blob(using, sha256, cutoff, dry_run)
+            if size is not None:
+                removed, freed = removed + 1, freed + size
+
+    root = os.path.join(settings.MEDIA_ROOT, 'blobs')
+    for dirpath, _, filenames in os.walk(root):
+        for filename in filenames:
+            path = os.path.join(dirpath, filename)
+            if os.path.getmtime(path) > cutoff:
+                continue
+            in_temp = os.path.dirname(path) == os.path.join(root, 'tmp')
+            if in_temp or not _stored_anywhere(filename):
+                orphans, freed = orphans + 1, freed + os.path.getsize(path)
+                if not dry_run:
+                    os.unlink(path)
+    return removed, orphans, freed
+
+
+def _ranged_chunks(fh, start, length):
+    with fh:
+        fh.seek(start)
+        while length > 0:
+            chunk = fh.read(min(CHUNK_SIZE, length))
+            if not chunk:
+                break
+            length -= len(chunk)
+            yield chunk
+
+
+def serve_attachment(request, attachment):
+    """ Download response with ETag, single byte-range and web-server sendfile support. """
+    path = attachment.file.path
+    size = os.path.getsize(path)
+    etag = f'"{attachment.blob_id}"' if attachment.blob_id else None
+    filename = attachment.name or os.path.basename(attachment.file.name)
+    content_type = attachment.mime_type or guess_mime_type(filename)
+
+    if etag and request.META.get('HTTP_IF_NONE_MATCH') == etag:
+        return HttpResponseNotModified(headers={'ETag': etag})
+
+    header = settings.ATTACHMENT_SENDFILE_HEADER
+    if header:
+        # The web server handles ranges and streams the file itself.
+        response = HttpResponse(content_type=content_type)
+        response[header] = settings.ATTACHMENT_SENDFILE_PREFIX + attachment.file.name
+    else:
+        match = RANGE_RE.match(request.META.get('HTTP_RANGE', ''))
+        if match and match.groups() != ('', ''):
+            first, last = match.groups()
+            if first:
+                start, end = int(first), min(int(last), size - 1) if last else size - 1
+            else:
+                start, end = max(size - int(last), 0), size - 1
+            if start > end or start >= size:
+                return HttpResponse(status=416, headers={'Content-Range': f"bytes */{size}"})
+            response = StreamingHttpResponse(
+                _ranged_chunks(open(path, 'rb'), start, end - start + 1), status=206, content_type=content_type
+            )
+            response['Content-Range'] = f"bytes {start}-{end}/{size}"
+            response['Content-Length'] = str(end - start + 1)
+        else:
+            # FileResponse hands the file to wsgi.file_wrapper, which servers implement with sendfile().
+            response = FileResponse(open(path, 'rb'), content_type=content_type)
+    response['Accept-Ranges'] = 'bytes'
+    response['Content-Disposition'] = content_disposition_header(True, filename)
+    if etag:
+        response['ETag'] = etag
+        response['Cache-Control'] = 'private, max-age=31536000, immutable'
+    return response
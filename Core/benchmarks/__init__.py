@@ -0,0 +1,7 @@
+"""
+Benchmark suite for the Auth, SocialAuth and Core request paths.
+
+`seed` generates a synthetic tenant at a configurable scale, `harness` times
+registered benchmarks and writes/compares JSON results, and `orm` / `endpoints`
+hold the benchmarks themselves. Run it with `python manage.py run_benchmarks`.
+"""
@@ -0,0 +1,23 @@
+from django.test import Client
+
+from Auth.models import User
+from .seed import Seeder
+
+
+class BenchmarkContext:
+    """ Seeded data and logged-in clients shared by all benchmarks of a run. """
+
+    def __init__(self, seeder: Seeder):
+        self.seeder = seeder
+        self.project = max(seeder.projects, key=lambda p: p.pk)
+        self.tags = seeder.tags
+        self.user = seeder.users[0]
+        self.worker_ids = [worker.pk for worker in seeder.workers]
+        self.client = Client()
+        self.refresh_token = self.user.tokens()['refresh']
+
+        admin_user = User.objects.create_superuser(
+            f"{seeder.prefix}-admin@example.com", "Bench", "Admin", "bench-password"
+        )
+        self.admin_client = Client()
+        self.admin_client.force_login(admin_user)
@@ -0,0 +1,46 @@
+import uuid
+
+from django.urls import reverse
+
+from .harness import benchmark
+from .seed import SEED_PASSWORD
+
+# --------------------------- End-to-end requests --------------------------- #
+# Run through the Django test client, so they cover middleware, DRF and
+# serializers but not the HTTP server.
+
+
+@benchmark('request.register', 'request', repeat=5)
+def register(context):
+    response = context.client.post(reverse('register'), {
+        'email': f"bench-{uuid.uuid4().hex}@example.com", 'first_name': "Bench", 'last_name': "Register",
+        'password': SEED_PASSWORD, 'password_confirm': SEED_PASSWORD,
+    }, content_type='application/json')
+    assert response.status_code == 201, response.content
+
+
+@benchmark('request.login', 'request', repeat=5)
+def login(context):
+    response = context.client.post(reverse('login'), {
+        'email': context.user.email, 'password': SEED_PASSWORD,
+    }, content_type='application/json')
+    assert response.status_code == 200, response.content
+
+
+@benchmark('request.token_refresh', 'request')
+def token_refresh(context):
+    response = context.client.post(reverse('token-refresh'), {
+        'refresh': context.refresh_token,
+    }, content_type='application/json')
+    assert response.status_code == 200, response.content
+
+
+def admin_changelist(model_name):
+    def run(context):
+        response = context.admin_client.get(reverse(f"admin:Core_{model_name}_changelist"))
+        assert response.status_code == 200, response.status_code
+    return benchmark(f"request.admin.{model_name}", 'admin', repeat=10)(run)
+
+
+for model_name in ('bug', 'activitylog', 'timetracking', 'project', 'sprint', 'worker', 'notification'):
+    admin_changelist(model_name)
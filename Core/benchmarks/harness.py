@@ -0,0 +1,95 @@
+import json
+import platform
+import statistics
+import subprocess
+import time
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+import django
+from django.db import connection, reset_queries
+from django.test.utils import CaptureQueriesContext
+
+_registry = []
+
+
+@dataclass
+class Benchmark:
+    name: str
+    group: str
+    func: object
+    repeat: int
+
+
+def benchmark(name, group, repeat=20):
+    """ Register `func(context)` as a benchmark; the first call is a warm-up and is not timed. """
+    def decorator(func):
+        _registry.append(Benchmark(name, group, func, repeat))
+        return func
+    return decorator
+
+
+def registered(groups=None):
+    return [b for b in _registry if not groups or b.group in groups]
+
+
+def run_benchmark(bench, context, repeat=None):
+    repeat = repeat or bench.repeat
+    bench.func(context)
+    timings = []
+    with CaptureQueriesContext(connection) as ctx:
+        for _ in range(repeat):
+            started = time.perf_counter()
+            bench.func(context)
+            timings.append((time.perf_counter() - started) * 1000)
+    queries = len(ctx.captured_queries)
+    reset_queries()
+    timings.sort()
+    return {
+        'group': bench.group,
+        'repeat': repeat,
+        'median_ms': round(statistics.median(timings), 3),
+        'p95_ms': round(timings[max(int(len(timings) * 0.95) - 1, 0)], 3),
+        'min_ms': round(timings[0], 3),
+        'queries': round(queries / repeat, 2),
+    }
+
+
+def environment(scale):
+    try:
+        commit = subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'commit': commit,
+        'scale': scale,
+        'python': platform.python_version(),
+        'django': django.get_version(),
+        'database': connection.vendor,
+    }
+
+
+def save_results(path, meta, results):
+    with open(path, 'w') as fh:
+        json.dump({'meta': meta, 'results': results}, fh, indent=2, sort_keys=True)
+
+
+def load_results(path):
+    with open(path) as fh:
+        return json.load(fh)
+
+
+def compare(baseline, current, threshold=0.10):
+    """ Rows of (name, baseline ms, current ms, change, regressed) for benchmarks in both runs. """
+    rows = []
+    for name, result in sorted(current.items()):
+        before = baseline.get(name)
+        if before is None or not before['median_ms']:
+            continue
+        change = result['median_ms'] / before['median_ms'] - 1
+        regressed = change > threshold or result['queries'] > before['queries']
+        rows.append((name, before['median_ms'], result['median_ms'], change, regressed))
+    return rows
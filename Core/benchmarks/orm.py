@@ -0,0 +1,97 @@
+from django.db.models import Count, Sum
+
+from Core import cache, permissions, tag_index
+from Core.models import Bug, ActivityLog, Notification, TimeTracking, Worker
+from .harness import benchmark
+
+# --------------------------- ORM hot paths --------------------------- #
+
+
+@benchmark('orm.bug_page', 'orm')
+def bug_page(context):
+    list(
+        Bug.objects.filter(project=context.project)
+        .select_related('project', 'assigned_team', 'assigned_worker__user')
+        .order_by('-created_at')[:100]
+    )
+
+
+@benchmark('orm.bug_page_str', 'orm')
+def bug_page_str(context):
+    [str(bug) for bug in Bug.objects.filter(project=context.project).order_by('-created_at')[:100]]
+
+
+@benchmark('orm.bugs_with_two_tags', 'orm')
+def bugs_with_two_tags(context):
+    first, second = context.tags[:2]
+    list(
+        Bug.objects.filter(project=context.project, tags=first).filter(tags=second)
+        .values_list('id', flat=True)[:100]
+    )
+
+
+@benchmark('orm.bugs_with_two_tags_bitmap', 'orm')
+def bugs_with_two_tags_bitmap(context):
+    first, second = context.tags[:2]
+    tag_index.query(context.project.pk, all_tags=[first.pk, second.pk], limit=100)
+
+
+@benchmark('orm.bugs_tags_a_and_b_not_c', 'orm')
+def bugs_tags_a_and_b_not_c(context):
+    first, second, third = context.tags[:3]
+    queryset = (
+        Bug.objects.filter(project=context.project, tags=first).filter(tags=second)
+        .exclude(tags=third).order_by('-pk')
+    )
+    queryset.count()
+    list(queryset.values_list('id', flat=True)[:100])
+
+
+@benchmark('orm.bugs_tags_a_and_b_not_c_bitmap', 'orm')
+def bugs_tags_a_and_b_not_c_bitmap(context):
+    first, second, third = context.tags[:3]
+    tag_index.query(context.project.pk, all_tags=[first.pk, second.pk], no_tags=[third.pk], limit=100)
+
+
+@benchmark('orm.most_blocking_bugs', 'orm')
+def most_blocking_bugs(context):
+    list(
+        Bug.objects.filter(project=context.project, status__in=['open', 'in_progress'])
+        .annotate(blocks=Count('blocked_by')).order_by('-blocks')[:20]
+    )
+
+
+@benchmark('orm.project_activity', 'orm')
+def project_activity(context):
+    list(
+        ActivityLog.objects.filter(project=context.project)
+        .select_related('bug', 'worker__user').order_by('-created_at')[:50]
+    )
+
+
+@benchmark('orm.unread_notifications', 'orm')
+def unread_notifications(context):
+    Notification.objects.filter(user=context.user, is_read=False).count()
+
+
+@benchmark('orm.time_per_worker', 'orm')
+def time_per_worker(context):
+    list(
+        TimeTracking.objects.filter(bug__project=context.project)
+        .values('worker').annotate(total=Sum('time_spent'))
+    )
+
+
+@benchmark('orm.cached_workers', 'orm')
+def cached_workers(context):
+    cache.get_many(Worker, context.worker_ids)
+
+
+@benchmark('orm.reachable_projects_uncached', 'orm')
+def reachable_projects_uncached(context):
+    permissions.compute_project_ids(context.user)
+
+
+@benchmark('orm.reachable_projects', 'orm')
+def reachable_projects(context):
+    permissions.can_access(context.user, context.project.pk)
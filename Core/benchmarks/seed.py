@@ -0,0 +1,151 @@
+import random
+from datetime import date, timedelta
+
+from django.contrib.auth.hashers import make_password
+from django.db import transaction
+
+from Auth.models import User
+from Core import triage
+from Core.models import (
+    Workspace, Team, Worker, Project, Sprint, Tag,
+    Bug, ActivityLog, Notification, TimeTracking
+)
+
+SCALES = {
+    'tiny': dict(workspaces=1, teams=2, workers=3, projects=2, sprints=2, bugs=50, tags=10,
+                 tags_per_bug=2, deps_per_bug=1, logs_per_bug=2, notifications_per_user=5),
+    'small': dict(workspaces=2, teams=3, workers=5, projects=3, sprints=4, bugs=500, tags=30,
+                  tags_per_bug=3, deps_per_bug=2, logs_per_bug=3, notifications_per_user=20),
+    'medium': dict(workspaces=5, teams=4, workers=8, projects=5, sprints=6, bugs=4000, tags=100,
+                   tags_per_bug=3, deps_per_bug=2, logs_per_bug=4, notifications_per_user=50),
+    'large': dict(workspaces=10, teams=5, workers=10, projects=10, sprints=8, bugs=20000, tags=300,
+                  tags_per_bug=4, deps_per_bug=3, logs_per_bug=5, notifications_per_user=100),
+}
+
+SEED_PASSWORD = 'bench-password'
+BATCH_SIZE = 2000
+
+
+class Seeder:
+    """ Generates workspaces, teams, workers, projects, sprints, bugs (with tags and
+    dependencies), activity logs and notifications with bulk inserts.
+
+    Counts are per parent: `teams` per workspace, `workers` per team, `projects` per
+    workspace, `sprints` and `bugs` per project.
+    """
+
+    def __init__(self, scale='small', seed=0, prefix='bench', **overrides):
+        self.counts = {**SCALES[scale], **overrides}
+        self.random = random.Random(seed)
+        self.prefix = prefix
+        self.password = make_password(SEED_PASSWORD)
+
+    @transaction.atomic
+    def run(self):
+        c = self.counts
+        self.workspaces = Workspace.objects.bulk_create(
+            Workspace(name=f"{self.prefix}-workspace-{i}") for i in range(c['workspaces'])
+        )
+        self.teams = Team.objects.bulk_create(
+            Team(workspace=ws, name=f"{self.prefix}-team-{ws.pk}-{i}")
+            for ws in self.workspaces for i in range(c['teams'])
+        )
+        self.users = User.objects.bulk_create(
+            User(
+                email=f"{self.prefix}-{team.pk}-{i}@example.com", first_name="Bench", last_name=f"User{i}",
+                password=self.password, is_verified=True, workspace_id=team.workspace_id,
+                role=self.random.choice(['developer', 'tester']),
+            )
+            for team in self.teams for i in range(c['workers'])
+        )
+        self.workers = Worker.objects.bulk_create(
+            Worker(user=user, team=self.teams[i // c['workers']]) for i, user in enumerate(self.users)
+        )
+        self.tags = Tag.objects.bulk_create(Tag(name=f"{self.prefix}-tag-{i}") for i in range(c['tags']))
+        self.projects = Project.objects.bulk_create(
+            Project(
+                workspace=ws, name=f"{self.prefix}-project-{ws.pk}-{i}",
+                assigned_team=self.random.choice([t for t in self.teams if t.workspace_id == ws.pk]),
+                github_repo=f"https://github.com/{self.prefix}/repo-{ws.pk}-{i}",
+            )
+            for ws in self.workspaces for i in range(c['projects'])
+        )
+        start = date.today() - timedelta(days=14 * c['sprints'])
+        self.sprints = Sprint.objects.bulk_create(
+            Sprint(
+                project=project, name=f"Sprint {i + 1}", is_active=i == c['sprints'] - 1,
+                start_date=start + timedelta(days=14 * i), end_date=start + timedelta(days=14 * i + 13),
+            )
+            for project in self.projects for i in range(c['sprints'])
+        )
+        self.seed_bugs()
+        return self
+
+    def seed_bugs(self):
+        c = self.counts
+        rng = self.random
+        workers_by_team = {}
+        for worker in self.workers:
+            workers_by_team.setdefault(worker.team_id, []).append(worker)
+        sprints_by_project = {}
+        for sprint in self.sprints:
+            sprints_by_project.setdefault(sprint.project_id, []).append(sprint)
+
+        bugs = []
+        for project in self.projects:
+            team_workers = workers_by_team[project.assigned_team_id]
+            for i in range(c['bugs']):
+                worker = rng.choice(team_workers)
+                bugs.append(Bug(
+                    project=project,
+                    title=f"{rng.choice(['Crash', 'Timeout', 'Wrong total', 'Broken link'])} in module {i % 97}",
+                    description=f"Steps to reproduce #{i}: open the page, click save, observe the error.",
+                    status=rng.choice([s for s, _ in Bug.STATUS_CHOICES]),
+                    severity=rng.choice([s for s, _ in Bug.SEVERITY_CHOICES]),
+                    priority=rng.choice([p for p, _ in Bug.PRIORITY_CHOICES]),
+                    assigned_team_id=project.assigned_team_id,
+                    assigned_worker=worker,
+                    sprint=rng.choice(sprints_by_project[project.pk]),
+                    reported_by_id=rng.choice(team_workers).user_id,
+                ))
+        self.bugs = Bug.objects.bulk_create(bugs, batch_size=BATCH_SIZE)
+
+        tag_links = Bug.tags.through
+        self.bulk(tag_links, (
+            tag_links(bug_id=bug.pk, tag_id=tag.pk)
+            for bug in self.bugs for tag in rng.sample(self.tags, min(c['tags_per_bug'], len(self.tags)))
+        ))
+        bugs_by_project = {}
+        for bug in self.bugs:
+            bugs_by_project.setdefault(bug.project_id, []).append(bug)
+        dependency_links = Bug.dependencies.through
+        self.bulk(dependency_links, (
+            dependency_links(from_bug_id=bug.pk, to_bug_id=other.pk)
+            for bug in self.bugs
+            for other in rng.sample(bugs_by_project[bug.project_id], c['deps_per_bug'])
+            if other.pk != bug.pk
+        ))
+        triage.rescore(Bug.objects.filter(project__in=self.projects))
+        self.bulk(ActivityLog, (
+            ActivityLog(project_id=bug.project_id, bug=bug, worker_id=bug.assigned_worker_id,
+                        message=f"Status changed to {bug.status}")
+            for bug in self.bugs for _ in range(c['logs_per_bug'])
+        ))
+        self.bulk(TimeTracking, (
+            TimeTracking(bug=bug, worker_id=bug.assigned_worker_id, time_spent=timedelta(minutes=rng.randint(5, 480)))
+            for bug in self.bugs if bug.status in ('resolved', 'closed')
+        ))
+        self.bulk(Notification, (
+            Notification(user=user, message=f"Bug update #{i}", is_read=rng.random() < 0.5)
+            for user in self.users for i in range(c['notifications_per_user'])
+        ))
+
+    def bulk(self, model, rows):
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= BATCH_SIZE:
+                model.objects.bulk_create(batch, ignore_conflicts=True)
+                batch = []
+        if batch:
+            model.objects.bulk_create(batch, ignore_conflicts=True)
@@ -0,0 +1,166 @@
+from dataclasses import dataclass
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Case, F, When
+from django.utils import timezone
+
+from . import cache
+from .models import ActivityLog, Bug, Sprint, Team, Worker
+from .permissions import ALL, reachable_project_ids
+from .signals import bugs_bulk_updated
+
+# --------------------------- Bulk bug updates --------------------------- #
+# One query loads the selected bugs with their project's workspace, which is all
+# that existence, access (with the cached project ids of Core.permissions) and
+# target checks need and gives the old values for the activity log. Only rows
+# whose values actually change are written, with queryset.update() in chunks of
+# BUG_BULK_CHUNK_SIZE ids. That sends no Bug signals: `auto_close_resolved_bugs`
+# is reproduced in SQL, and receivers that keep derived data current get
+# `bugs_bulk_updated` instead. Activity log rows are written with bulk_create,
+# and watchers are notified through the signal (see Core/notifications.py), all
+# in the same transaction.
+
+FIELDS = ('status', 'severity', 'priority', 'sprint', 'assigned_team', 'assigned_worker')
+RELATED = {
+    'sprint_id': Sprint.objects.select_related('project'),
+    'assigned_team_id': Team.objects.all(),
+    'assigned_worker_id': Worker.objects.prefetch_related('user'),
+}
+AUTO_CLOSE_AFTER = timedelta(days=7)
+
+
+class BulkUpdateError(Exception):
+    """ The request cannot be applied as a whole; `bug_ids` are the bugs at fault. """
+
+    def __init__(self, message, status=400, bug_ids=()):
+        super().__init__(message)
+        self.status = status
+        self.bug_ids = sorted(bug_ids)
+
+
+@dataclass
+class BulkResult:
+    matched: int
+    changes: dict  # {bug id: {field: [old, new]}} for the bugs that change
+    dry_run: bool = False
+
+    @property
+    def updated(self):
+        return len(self.changes)
+
+
+def _chunks(items, size):
+    items = list(items)
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+
+def check_targets(rows, changes):
+    """ The new sprint must belong to each bug's project, and the new team and worker to its workspace. """
+    sprint, team, worker = (changes.get(name) for name in ('sprint', 'assigned_team', 'assigned_worker'))
+    worker_team = cache.related(worker, 'team') if worker is not None else None
+    checks = [
+        (sprint, lambda row: row['project_id'] == sprint.project_id,
+         lambda: f"Sprint {sprint.pk} belongs to another project."),
+        (team, lambda row: row['project__workspace_id'] == team.workspace_id,
+         lambda: f"Team {team.pk} belongs to another workspace."),
+        (worker, lambda row: worker_team is None or row['project__workspace_id'] == worker_team.workspace_id,
+         lambda: f"Worker {worker.pk} belongs to another workspace."),
+    ]
+    for target, fits, message in checks:
+        if target is None:
+            continue
+        wrong = [pk for pk, row in rows.items() if not fits(row)]
+        if wrong:
+            raise BulkUpdateError(message(), 400, wrong)
+
+
+def update_bugs(user, bug_ids, changes, dry_run=False):
+    """ Apply the same field changes to many bugs in one transaction; raises BulkUpdateError.
+
+    `changes` maps names in FIELDS to values, with model instances (or None) for
+    the foreign keys. With `dry_run` nothing is written.
+    """
+    columns = {Bug._meta.get_field(name).attname: getattr(value, 'pk', value) for name, value in changes.items()}
+    bug_ids = set(bug_ids)
+    with transaction.atomic(using=router.db_for_write(Bug)):
+        rows = {
+            row['pk']: row for row in
+            Bug.objects.filter(pk__in=bug_ids).select_for_update(of=('self',))
+            .values('pk', 'project_id', 'project__workspace_id', *(f.attname for f in map(Bug._meta.get_field, FIELDS)))
+        }
+        missing = bug_ids - rows.keys()
+        if missing:
+            raise BulkUpdateError("Some bugs do not exist.", 404, missing)
+        project_ids = reachable_project_ids(user)
+        forbidden = [pk for pk, row in rows.items() if project_ids is not ALL and row['project_id'] not in project_ids]
+        if forbidden:
+            raise BulkUpdateError("You do not have access to the projects of some bugs.", 403, forbidden)
+        check_targets(rows, changes)
+
+        diffs = {}
+        for pk, row in rows.items():
+            diff = {column: [row[column], value] for column, value in columns.items() if row[column] != value}
+            if diff:
+                diffs[pk] = diff
+        result = BulkResult(len(rows), diffs, dry_run)
+        if dry_run or not diffs:
+            return result
+
+        _write(diffs, columns)
+        _log(user, rows, diffs)
+        bugs_bulk_updated.send(
+            sender=Bug, bug_ids=list(diffs), project_ids={rows[pk]['project_id'] for pk in diffs}, fields=set(columns),
+            changes=diffs, changed_by=user,
+        )
+    return result
+
+
+def _write(diffs, columns):
+    values = {**columns, 'updated_at': timezone.now(), 'version': F('version') + 1}
+    # What auto_close_resolved_bugs does on save. UPDATE reads the old row, so
+    # F('updated_at') is the previous save time, as it is in the signal.
+    if 'status' not in columns:
+        values['resolved_at'] = Case(
+            When(status='resolved', then=F('updated_at') + AUTO_CLOSE_AFTER), default=F('resolved_at'),
+        )
+    elif columns['status'] == 'resolved':
+        values['resolved_at'] = F('updated_at') + AUTO_CLOSE_AFTER
+    for chunk in _chunks(diffs, settings.BUG_BULK_CHUNK_SIZE):
+        Bug.objects.filter(pk__in=chunk).update(**values)
+
+
+def _labels(diffs):
+    """ {column: {id: display name}} for the foreign keys in the diffs. """
+    labels = {}
+    for column, queryset in RELATED.items():
+        ids = {value for diff in diffs.values() if column in diff for value in diff[column] if value is not None}
+        if ids:
+            labels[column] = {pk: str(obj) for pk, obj in queryset.in_bulk(ids).items()}
+    return labels
+
+
+def _name(column, value, labels):
+    return 'none' if value is None else labels.get(column, {}).get(value, value)
+
+
+def describe(diff, labels):
+    """ 'status open → resolved, sprint none → Sprint 3' """
+    return ', '.join(
+        f"{column.removesuffix('_id').replace('_', ' ')} {_name(column, old, labels)} → {_name(column, new, labels)}"
+        for column, (old, new) in diff.items()
+    )
+
+
+def _log(user, rows, diffs):
+    labels = _labels(diffs)
+    worker_id = Worker.objects.filter(user_id=user.pk).values_list('pk', flat=True).first()
+    ActivityLog.objects.bulk_create([
+        ActivityLog(
+            project_id=rows[pk]['project_id'], bug_id=pk, worker_id=worker_id,
+            message=f"Bulk update by {user.email}: {describe(diff, labels)}",
+        )
+        for pk, diff in diffs.items()
+    ], batch_size=settings.BUG_BULK_CHUNK_SIZE)
@@ -0,0 +1,278 @@
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core import checks
+from django.core.cache import caches
+from django.db import router, transaction
+from django.db.models.signals import post_save, post_delete
+
+# --------------------------- Read-through lookup cache --------------------------- #
+# Small, rarely changed tables (Workspace, Project, Team, Tag, Worker) are looked up
+# on nearly every bug operation. Lookups go through an in-process LRU first, then the
+# shared Django cache backend, then the database. Every model has a version number in
+# the shared backend; a save or delete bumps it, which orphans every cached entry for
+# that model in all processes at once. The bump waits for the writing transaction to
+# commit: bumped any earlier, a concurrent reader could cache the old, still committed
+# row under the new version, and that entry would outlive the commit.
+# The version bump only reaches other processes through a backend they share, and
+# the permission cache (Core/permissions.py) rides on these versions, so a
+# process-local backend would let other workers keep serving a user's old project
+# set; `check --deploy` refuses one while the cache is enabled.
+
+PROCESS_LOCAL_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+DEFAULTS = {
+    'BACKEND': 'default',
+    'MAXSIZE': 1024,
+    'TIMEOUT': 300,
+    'VERSION_TTL': 1.0,
+    'ENABLED': True,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'CORE_CACHE', {})}
+
+
+@checks.register(checks.Tags.caches, deploy=True)
+def check_shared_backend(app_configs, **kwargs):
+    """ Invalidation must reach every worker, so CORE_CACHE needs a cache backend they all share. """
+    config = get_config()
+    backend = settings.CACHES.get(config['BACKEND'], {}).get('BACKEND')
+    if not config['ENABLED'] or backend not in PROCESS_LOCAL_BACKENDS:
+        return []
+    return [
+        checks.Error(
+            f"CORE_CACHE uses the cache {config['BACKEND']!r} ({backend}), which is private to each process, so "
+            f"other workers would keep cached rows and project permissions after they change.",
+            hint="Point CACHE_URL at a shared backend (Redis, Memcached, database), or set CORE_CACHE_ENABLED=False.",
+            id='Core.E002',
+        )
+    ]
+
+
+class LRUCache:
+    """ Thread-safe, size-bounded mapping that evicts the least recently used key. """
+
+    def __init__(self, maxsize):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                self._data.move_to_end(key)
+            except KeyError:
+                return default
+            return self._data[key]
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class ModelCache:
+    """ Versioned read-through cache of one model's rows, keyed by primary key. """
+
+    def __init__(self, model, select_related=()):
+        config = get_config()
+        self.model = model
+        self.select_related = tuple(select_related)
+        self.prefix = f"core-cache:{model._meta.label_lower}"
+        self.local = LRUCache(config['MAXSIZE'])
+        self._version = None
+        self._version_checked_at = 0.0
+        self.reset_stats()
+
+    @property
+    def backend(self):
+        return caches[get_config()['BACKEND']]
+
+    def reset_stats(self):
+        self.local_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    def stats(self):
+        lookups = self.local_hits + self.shared_hits + self.misses
+        hits = self.local_hits + self.shared_hits
+        return {
+            'local_hits': self.local_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': hits / lookups if lookups else 0.0,
+            'local_size': len(self.local),
+        }
+
+    def version(self):
+        """ Shared version of this model's entries, re-read at most every VERSION_TTL seconds. """
+        now = time.monotonic()
+        if self._version is None or now - self._version_checked_at > get_config()['VERSION_TTL']:
+            version = self.backend.get(f"{self.prefix}:version")
+            if version is None:
+                version = 1
+                self.backend.add(f"{self.prefix}:version", version, None)
+            if version != self._version:
+                self.local.clear()
+            self._version = version
+            self._version_checked_at = now
+        return self._version
+
+    def _key(self, version, pk):
+        return f"{self.prefix}:{version}:{pk}"
+
+    def _queryset(self):
+        queryset = self.model._base_manager.all()
+        if self.select_related:
+            # A relation into another database (a shard's worker and its user) cannot be joined.
+            db = router.db_for_read(self.model)
+            joined = [
+                name for name in self.select_related
+                if router.db_for_read(self.model._meta.get_field(name).related_model) == db
+            ]
+            queryset = queryset.select_related(*joined).prefetch_related(*set(self.select_related) - set(joined))
+        return queryset
+
+    def get(self, pk):
+        """ Return the instance with this primary key, or None if it does not exist. """
+        return self.get_many([pk]).get(self.model._meta.pk.to_python(pk))
+
+    def get_many(self, pks):
+        """ Return a dict of primary key to instance; missing rows are left out. """
+        config = get_config()
+        pks = {self.model._meta.pk.to_python(pk) for pk in pks if pk is not None}
+        if not config['ENABLED']:
+            return self._queryset().in_bulk(pks)
+
+        version = self.version()
+        found = {}
+        for pk in pks:
+            obj = self.local.get(pk)
+            if obj is not None:
+                found[pk] = obj
+        self.local_hits += len(found)
+
+        missing = pks - found.keys()
+        if missing:
+            shared = self.backend.get_many([self._key(version, pk) for pk in missing])
+            for obj in shared.values():
+                found[obj.pk] = obj
+                self.local.set(obj.pk, obj)
+            self.shared_hits += len(shared)
+            missing -= found.keys()
+
+        if missing:
+            fetched = self._queryset().in_bulk(missing)
+            self.backend.set_many(
+                {self._key(version, pk): obj for pk, obj in fetched.items()}, config['TIMEOUT']
+            )
+            for pk, obj in fetched.items():
+                self.local.set(pk, obj)
+            found.update(fetched)
+            self.misses += len(missing)
+        return found
+
+    def invalidate(self):
+        """ Orphan every cached entry of this model, in this and all other processes. """
+        key = f"{self.prefix}:version"
+        try:
+            self._version = self.backend.incr(key)
+        except ValueError:
+            self._version = 2
+            self.backend.set(key, self._version, None)
+        self._version_checked_at = time.monotonic()
+        self.local.clear()
+
+
+_registry = {}
+
+
+def register(model, select_related=(), invalidated_by=()):
+    """ Cache lookups of `model`; saves or deletes of it (or of `invalidated_by`) invalidate the cache.
+
+    An `invalidated_by` entry is a model, or a (model, field names) pair whose saves only
+    invalidate when they may have changed one of those fields.
+    """
+    model_cache = ModelCache(model, select_related)
+    _registry[model] = model_cache
+
+    def invalidate(sender, using=None, **kwargs):
+        transaction.on_commit(model_cache.invalidate, using=using)
+
+    def invalidate_on(fields):
+        def receiver(sender, using=None, update_fields=None, **kwargs):
+            if update_fields is None or fields & set(update_fields):
+                transaction.on_commit(model_cache.invalidate, using=using)
+        return receiver
+
+    for sender in (model, *invalidated_by):
+        sender, fields = sender if isinstance(sender, tuple) else (sender, None)
+        uid = f"core-cache:{model._meta.label_lower}:{sender._meta.label_lower}"
+        on_save = invalidate if fields is None else invalidate_on(set(fields))
+        post_save.connect(on_save, sender=sender, weak=False, dispatch_uid=f"{uid}:save")
+        post_delete.connect(invalidate, sender=sender, weak=False, dispatch_uid=f"{uid}:delete")
+    return model_cache
+
+
+def cache_for(model):
+    return _registry.get(model)
+
+
+def get(model, pk):
+    model_cache = _registry.get(model)
+    if model_cache is None:
+        return model._default_manager.filter(pk=pk).first()
+    return model_cache.get(pk)
+
+
+def get_many(model, pks):
+    model_cache = _registry.get(model)
+    if model_cache is None:
+        return model._default_manager.in_bulk(pks)
+    return model_cache.get_many(pks)
+
+
+def related(instance, field_name):
+    """ Follow a foreign key through the cache, unless the related object is already loaded. """
+    field = instance._meta.get_field(field_name)
+    if field.is_cached(instance) or field.related_model not in _registry:
+        return getattr(instance, field_name)
+    pk = getattr(instance, field.attname)
+    if pk is None:
+        return None
+    return _registry[field.related_model].get(pk)
+
+
+def stats():
+    """ Hit/miss counters of every registered model cache, keyed by model label. """
+    return {model._meta.label: model_cache.stats() for model, model_cache in _registry.items()}
+
+
+def reset_stats():
+    for model_cache in _registry.values():
+        model_cache.reset_stats()
+
+
+def invalidate_all():
+    for model_cache in _registry.values():
+        model_cache.invalidate()
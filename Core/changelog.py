@@ -0,0 +1,221 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Max, Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save, pre_delete
+from django.utils import timezone
+
+from .models import Bug, ChangeLog, Project, Sprint, Tag, Team, Worker
+from . import sharding
+from .permissions import ALL, reachable_project_ids
+from .signals import bugs_bulk_updated
+
+# --------------------------- Change log for delta sync --------------------------- #
+# Every save or delete of a Bug, Sprint, Project or Tag appends (model, id,
+# project) to ChangeLog, whose auto-increment `seq` gives all changes one
+# order. Clients keep the last seq they have seen and ask for what came after;
+# entries only say *that* an object changed, and the response carries each
+# object's current state, or its id under `deleted` when it is gone (or moved
+# out of the user's projects).
+#
+# Entries are buffered per transaction and inserted in one statement after it
+# commits, so rolled-back changes leave nothing behind and a seq is never
+# handed out long before it becomes visible. Entries younger than
+# CHANGELOG_SETTLE_SECONDS are still held back, so that a slightly earlier seq
+# committing after a later one is not skipped by a client that polls in
+# between.
+
+MODELS = {
+    'bug': Bug,
+    'sprint': Sprint,
+    'project': Project,
+    'tag': Tag,
+}
+FIELDS = {
+    'bug': [
+        'id', 'project_id', 'title', 'description', 'status', 'severity', 'priority', 'sprint_id',
+        'assigned_team_id', 'assigned_worker_id', 'github_issue_url', 'github_issue_number',
+        'reported_by_id', 'created_at', 'updated_at', 'resolved_at',
+    ],
+    'sprint': ['id', 'project_id', 'name', 'start_date', 'end_date', 'is_active'],
+    'project': ['id', 'workspace_id', 'name', 'description', 'github_repo', 'assigned_team_id', 'created_at'],
+    'tag': ['id', 'name'],
+}
+LABELS = {model: label for label, model in MODELS.items()}
+
+
+class ChangeLogGone(Exception):
+    """ The requested seq is older than the retained log; the client must resync from scratch. """
+
+
+class _Buffer:
+    def __init__(self, using):
+        self.using = using
+        self.entries = set()
+
+    def flush(self):
+        ChangeLog.objects.using(self.using).bulk_create(
+            [ChangeLog(model=model, object_id=object_id, project_id=project_id)
+             for model, object_id, project_id in sorted(self.entries, key=lambda entry: entry[:2])],
+            batch_size=1000,
+        )
+
+
+def _buffer(using):
+    """ The buffer of the current transaction, registered to flush once it commits. """
+    connection = connections[using]
+    buffer = getattr(connection, '_changelog_buffer', None)
+    callbacks = connection.run_on_commit
+    # A rollback drops the callback (and with it the buffer), so look for it where it was registered.
+    if buffer is None or not (len(callbacks) > buffer.position and callbacks[buffer.position][1] is buffer.flush):
+        buffer = _Buffer(using)
+        buffer.position = len(callbacks)
+        connection._changelog_buffer = buffer
+        transaction.on_commit(buffer.flush, using=using)
+    return buffer
+
+
+def record(model, entries):
+    """ Log changes of `model` objects, given as (id, project id) pairs. """
+    entries = [(model, object_id, project_id) for object_id, project_id in entries]
+    if not entries:
+        return
+    using = router.db_for_write(ChangeLog)
+    if connections[using].in_atomic_block:
+        _buffer(using).entries.update(entries)
+    else:
+        buffer = _Buffer(using)
+        buffer.entries.update(entries)
+        buffer.flush()
+
+
+def project_of(instance):
+    return instance.pk if isinstance(instance, Project) else getattr(instance, 'project_id', None)
+
+
+# --------------------------- Reading --------------------------- #
+
+def changes_since(user, since, limit):
+    """ {'next', 'has_more', 'changes': {model: [rows]}, 'deleted': {model: [ids]}} after `since`. """
+    low, high = sharding.id_range(router.db_for_read(ChangeLog))
+    if since and not low <= since < high:
+        raise ChangeLogGone(f"{since} was handed out by another database; the workspace moved, fetch everything again.")
+    if since and not ChangeLog.objects.filter(seq__lte=since).exists() and ChangeLog.objects.exists():
+        raise ChangeLogGone(f"Changes up to {since} are no longer kept; fetch everything again.")
+
+    horizon = timezone.now() - timedelta(seconds=settings.CHANGELOG_SETTLE_SECONDS)
+    unsettled = ChangeLog.objects.filter(recorded_at__gt=horizon).order_by('seq').values_list('seq', flat=True).first()
+    ceiling = unsettled - 1 if unsettled is not None else ChangeLog.objects.aggregate(seq=Max('seq'))['seq'] or 0
+    ceiling = max(ceiling, since)
+
+    project_ids = reachable_project_ids(user)
+    entries = ChangeLog.objects.filter(seq__gt=since, seq__lte=ceiling).order_by('seq')
+    if project_ids is not ALL:
+        entries = entries.filter(Q(project__in=project_ids) | Q(project__isnull=True))
+    entries = list(entries.values_list('seq', 'model', 'object_id')[:limit + 1])
+    has_more = len(entries) > limit
+    entries = entries[:limit]
+
+    ids = {}
+    for _, model, object_id in entries:
+        ids.setdefault(model, set()).add(object_id)
+    changes, deleted = {}, {}
+    for model, object_ids in ids.items():
+        rows = current_rows(model, object_ids, project_ids)
+        if rows:
+            changes[model] = rows
+        gone = object_ids - {row['id'] for row in rows}
+        if gone:
+            deleted[model] = sorted(gone)
+    return {
+        'next': entries[-1][0] if has_more else ceiling,
+        'has_more': has_more,
+        'changes': changes,
+        'deleted': deleted,
+    }
+
+
+def current_rows(model, object_ids, project_ids=ALL):
+    """ Current field values of the objects that still exist within `project_ids`, with tag ids for bugs. """
+    queryset = MODELS[model].objects.filter(pk__in=object_ids)
+    if project_ids is not ALL and model != 'tag':
+        queryset = queryset.filter(**{'pk__in' if model == 'project' else 'project__in': project_ids})
+    rows = list(queryset.order_by('pk').values(*FIELDS[model]))
+    if model == 'bug' and rows:
+        tags = {}
+        links = Bug.tags.through.objects.filter(bug_id__in=[row['id'] for row in rows]).values_list('bug_id', 'tag_id')
+        for bug_id, tag_id in links:
+            tags.setdefault(bug_id, []).append(tag_id)
+        for row in rows:
+            row['tags'] = sorted(tags.get(row['id'], ()))
+    return rows
+
+
+def prune(older_than):
+    """ Delete entries recorded before `older_than`, keeping the newest of them as the retention marker. """
+    marker = (
+        ChangeLog.objects.filter(recorded_at__lt=older_than).order_by('-seq').values_list('seq', flat=True).first()
+    )
+    if marker is None:
+        return 0
+    deleted, _ = ChangeLog.objects.filter(seq__lt=marker).delete()
+    return deleted
+
+
+# --------------------------- Signal receivers --------------------------- #
+
+def object_saved(sender, instance, raw=False, **kwargs):
+    if raw:
+        return
+    entries = [(instance.pk, project_of(instance))]
+    previous = getattr(instance, '_changelog_project_id', None)
+    if sender is Bug and previous is not None and previous != instance.project_id:
+        # Also tell the old project's clients, who will see the bug as deleted.
+        entries.append((instance.pk, previous))
+        instance._changelog_project_id = instance.project_id
+    record(LABELS[sender], entries)
+
+
+def object_deleted(sender, instance, **kwargs):
+    record(LABELS[sender], [(instance.pk, project_of(instance))])
+
+
+def remember_project(sender, instance, **kwargs):
+    instance._changelog_project_id = instance.__dict__.get('project_id')
+
+
+def bug_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action not in ('post_add', 'post_remove', 'pre_clear'):
+        return
+    if not reverse:
+        record('bug', [(instance.pk, instance.project_id)])
+        return
+    bugs = Bug.objects.filter(tags=instance) if action == 'pre_clear' else Bug.objects.filter(pk__in=pk_set)
+    record('bug', bugs.values_list('pk', 'project_id'))
+
+
+def related_deleting(sender, instance, **kwargs):
+    """ Deleting these nulls Bug and Project foreign keys (or drops tag links) without Bug signals. """
+    if sender is Tag:
+        bugs = Bug.objects.filter(tags=instance)
+    else:
+        field = {Sprint: 'sprint', Team: 'assigned_team', Worker: 'assigned_worker'}[sender]
+        bugs = Bug.objects.filter(**{field: instance})
+    record('bug', bugs.values_list('pk', 'project_id'))
+    if sender is Team:
+        record('project', Project.objects.filter(assigned_team=instance).values_list('pk', 'pk'))
+
+
+def bugs_updated_in_bulk(sender, bug_ids, **kwargs):
+    record('bug', Bug.objects.filter(pk__in=bug_ids).values_list('pk', 'project_id'))
+
+
+for _model in MODELS.values():
+    post_save.connect(object_saved, sender=_model, dispatch_uid=f'core-changelog-{_model._meta.model_name}-saved')
+    post_delete.connect(object_deleted, sender=_model, dispatch_uid=f'core-changelog-{_model._meta.model_name}-deleted')
+for _model in (Tag, Sprint, Team, Worker):
+    pre_delete.connect(related_deleting, sender=_model, dispatch_uid=f'core-changelog-{_model._meta.model_name}-nulls')
+post_init.connect(remember_project, sender=Bug, dispatch_uid='core-changelog-remember')
+m2m_changed.connect(bug_tags_changed, sender=Bug.tags.through, dispatch_uid='core-changelog-tags')
+bugs_bulk_updated.connect(bugs_updated_in_bulk, dispatch_uid='core-changelog-bulk')
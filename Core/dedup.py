@@ -0,0 +1,246 @@
+import hashlib
+import re
+from array import array
+
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Exists, OuterRef, Q
+from django.db.models.signals import post_save
+
+from .models import Bug, BugLSHBand, BugSignature
+
+# --------------------------- Near-duplicate detection --------------------------- #
+# Each bug gets a MinHash signature of the words of its title and description,
+# split into BANDS bands whose hashes are stored in BugLSHBand. Two bugs share a
+# band with high probability when their word sets are similar, so candidates
+# come from an indexed lookup instead of a scan of the project; candidates are
+# then kept only if their estimated Jaccard similarity reaches THRESHOLD.
+# Changing NUM_PERM or BANDS needs `manage.py cluster_duplicate_bugs --rebuild`.
+# A bug with no words besides stop words gets the empty signature (every value
+# MASK32) and no band rows: it has nothing to be a duplicate of.
+
+WORD_RE = re.compile(r'[^\W_]+')  # Letters and digits of any script.
+MASK32 = 0xFFFFFFFF
+STOP_WORDS = frozenset(
+    'a an and are as at be but by for from has have i if in is it its of on or so that the '
+    'then this to was were when which while with'.split()
+)
+
+DEFAULTS = {
+    'NUM_PERM': 128,
+    'BANDS': 32,
+    'THRESHOLD': 0.5,
+    'DESCRIPTION_WORDS': 200,
+}
+
+
+def get_config():
+    return {**DEFAULTS, **getattr(settings, 'BUG_DEDUP', {})}
+
+
+def text_hash(title, description):
+    return hashlib.blake2b(f"{title}\0{description}".encode(), digest_size=16).hexdigest()
+
+
+def shingles(title, description, description_words=200):
+    """ Distinct words of the title and the start of the description, without stop words. """
+    words = WORD_RE.findall(title.lower()) + WORD_RE.findall((description or '').lower())[:description_words]
+    return {word for word in words if word not in STOP_WORDS}
+
+
+def minhash(title, description, config=None):
+    """ Signature as an array of NUM_PERM 32-bit ints.
+
+    Each shingle is hashed once with SHAKE-128 into NUM_PERM 32-bit values, one
+    per hash function; the signature is the column-wise minimum.
+    """
+    config = config or get_config()
+    num_perm = config['NUM_PERM']
+    hashes = [
+        array('I', hashlib.shake_128(shingle.encode()).digest(4 * num_perm))
+        for shingle in shingles(title, description, config['DESCRIPTION_WORDS'])
+    ]
+    if not hashes:
+        return array('I', [MASK32] * num_perm)
+    return array('I', map(min, zip(*hashes)))
+
+
+def is_empty(signature):
+    return all(value == MASK32 for value in signature)
+
+
+def band_buckets(signature, bands):
+    """ (band, bucket) pairs; the bucket is a signed 64-bit hash of the band's rows. """
+    rows = len(signature) // bands
+    return [
+        (band, int.from_bytes(
+            hashlib.blake2b(signature[band * rows:(band + 1) * rows].tobytes(), digest_size=8).digest(),
+            'little', signed=True,
+        ))
+        for band in range(bands)
+    ]
+
+
+def unpack(data):
+    signature = array('I')
+    signature.frombytes(bytes(data))
+    return signature
+
+
+def similarity(a, b):
+    """ Estimated Jaccard similarity of the two signatures' shingle sets. """
+    return sum(1 for x, y in zip(a, b) if x == y) / len(a)
+
+
+# --------------------------- Index maintenance --------------------------- #
+
+def sign(rows, config):
+    """ (bug id, project id, text hash, signature) for (bug id, project id, title, description) rows.
+
+    Pure computation, so the batch command can run it in worker processes.
+    """
+    return [
+        (bug_id, project_id, text_hash(title, description), minhash(title, description, config))
+        for bug_id, project_id, title, description in rows
+    ]
+
+
+def _insert_bands(using, rows):
+    # Plain executemany: building tens of thousands of model instances for
+    # bulk_create costs several times more than the insert itself.
+    quote = connections[using].ops.quote_name
+    columns = ', '.join(quote(f.column) for f in (
+        BugLSHBand._meta.get_field(name) for name in ('project', 'bug', 'band', 'bucket')
+    ))
+    with connections[using].cursor() as cursor:
+        cursor.executemany(
+            f"INSERT INTO {quote(BugLSHBand._meta.db_table)} ({columns}) VALUES (%s, %s, %s, %s)", rows
+        )
+
+
+def store_signatures(signed, config):
+    """ Save signatures and their band rows, replacing any old ones for the same bugs. """
+    signatures, bands = [], []
+    for bug_id, project_id, digest, signature in signed:
+        signatures.append(BugSignature(
+            bug_id=bug_id, project_id=project_id, text_hash=digest, minhash=signature.tobytes(),
+        ))
+        if not is_empty(signature):
+            bands.extend(
+                (project_id, bug_id, band, bucket) for band, bucket in band_buckets(signature, config['BANDS'])
+            )
+    using = router.db_for_write(BugLSHBand)
+    with transaction.atomic(using=using):
+        BugLSHBand.objects.using(using).filter(bug_id__in=[s.bug_id for s in signatures]).delete()
+        BugSignature.objects.using(using).bulk_create(
+            signatures, update_conflicts=True, unique_fields=['bug'],
+            update_fields=['project', 'text_hash', 'minhash'],
+        )
+        _insert_bands(using, bands)
+    return len(signatures)
+
+
+def index_bugs(bugs, config=None):
+    config = config or get_config()
+    rows = [(bug.pk, bug.project_id, bug.title, bug.description) for bug in bugs]
+    return store_signatures(sign(rows, config), config)
+
+
+def update_signature(sender, instance, raw=False, **kwargs):
+    """ Re-sign a saved bug when its text or project changed. """
+    if raw:
+        return
+    current = BugSignature.objects.filter(bug_id=instance.pk).values_list('text_hash', 'project_id').first()
+    if current != (text_hash(instance.title, instance.description), instance.project_id):
+        index_bugs([instance])
+
+
+post_save.connect(update_signature, sender=Bug, dispatch_uid='core-dedup-update-signature')
+
+
+# --------------------------- Lookup --------------------------- #
+
+def find_duplicates(project_id, title, description, exclude=None, limit=10, threshold=None):
+    """ Bugs of the project that look like the given text, most similar first, as (similarity, bug id). """
+    config = get_config()
+    threshold = config['THRESHOLD'] if threshold is None else threshold
+    signature = minhash(title, description, config)
+    if is_empty(signature):
+        return []
+
+    match = Q()
+    for band, bucket in band_buckets(signature, config['BANDS']):
+        match |= Q(band=band, bucket=bucket)
+    candidates = BugLSHBand.objects.filter(match, project_id=project_id).values_list('bug_id', flat=True)
+    candidate_ids = set(candidates) - {exclude}
+
+    scored = []
+    for bug_id, data in BugSignature.objects.filter(bug_id__in=candidate_ids).values_list('bug_id', 'minhash'):
+        score = similarity(signature, unpack(data))
+        if score >= threshold:
+            scored.append((score, bug_id))
+    scored.sort(key=lambda row: (-row[0], row[1]))
+    return scored[:limit]
+
+
+# --------------------------- Batch clustering --------------------------- #
+
+class UnionFind:
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent
+        root = parent.setdefault(item, item)
+        while root != parent[root]:
+            root = parent[root]
+        while item != root:
+            parent[item], item = root, parent[item]
+        return root
+
+    def union(self, a, b):
+        a, b = self.find(a), self.find(b)
+        if a != b:
+            self.parent[max(a, b)] = min(a, b)
+
+    def groups(self):
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return [sorted(members) for members in groups.values() if len(members) > 1]
+
+
+def cluster_project(project_id, threshold=None, max_bucket=50, chunk_size=5000):
+    """ Groups of likely duplicate bugs in the project, found from buckets shared by two or more bugs.
+
+    Band rows are streamed in bucket order and only bugs in a shared bucket have
+    their signatures loaded. Buckets larger than `max_bucket` are checked against
+    their first member only, so a template-like text shared by thousands of bugs
+    does not turn into a quadratic comparison.
+    """
+    threshold = get_config()['THRESHOLD'] if threshold is None else threshold
+    bands = BugLSHBand.objects.filter(project_id=project_id)
+    shared = bands.filter(Exists(
+        bands.filter(band=OuterRef('band'), bucket=OuterRef('bucket')).exclude(pk=OuterRef('pk'))
+    )).order_by('band', 'bucket', 'bug_id').values_list('band', 'bucket', 'bug_id')
+
+    buckets = {}
+    for band, bucket, bug_id in shared.iterator(chunk_size=chunk_size):
+        buckets.setdefault((band, bucket), []).append(bug_id)
+
+    signatures = {}
+    bug_ids = sorted({bug_id for members in buckets.values() for bug_id in members})
+    for start in range(0, len(bug_ids), chunk_size):
+        chunk = BugSignature.objects.filter(bug_id__in=bug_ids[start:start + chunk_size])
+        signatures.update((bug_id, unpack(data)) for bug_id, data in chunk.values_list('bug_id', 'minhash'))
+
+    clusters = UnionFind()
+    for members in buckets.values():
+        pairs = (
+            ((a, b) for i, a in enumerate(members) for b in members[i + 1:])
+            if len(members) <= max_bucket else ((members[0], b) for b in members[1:])
+        )
+        for a, b in pairs:
+            if clusters.find(a) != clusters.find(b) and similarity(signatures[a], signatures[b]) >= threshold:
+                clusters.union(a, b)
+    return clusters.groups()
@@ -0,0 +1,6 @@
+""" Mirrors GitHub issues of a project's `github_repo` into its bugs.
+
+`client` talks to the REST API over a pooled async HTTP connection, `sync` turns
+pages of issues into bug upserts and `fake` is a local stand-in for the API used
+by the benchmark and for trying the sync without network access.
+"""
@@ -0,0 +1,103 @@
+import asyncio
+import re
+from dataclasses import dataclass, field
+from datetime import timezone
+from email.utils import parsedate_to_datetime
+
+import httpx
+from django.conf import settings
+
+LINK_RE = re.compile(r'<([^>]+)>;\s*rel="(\w+)"')
+PAGE_RE = re.compile(r'[?&]page=(\d+)')
+RETRY_STATUSES = {500, 502, 503, 504}
+
+
+class GitHubError(Exception):
+    pass
+
+
+def server_time(response):
+    """ The response's Date header as an aware datetime, so cursors do not depend on the local clock. """
+    value = response.headers.get('Date')
+    if not value:
+        return None
+    date = parsedate_to_datetime(value)
+    return date if date.tzinfo else date.replace(tzinfo=timezone.utc)
+
+
+@dataclass
+class Page:
+    number: int
+    status: int
+    issues: list = field(default_factory=list)
+    etag: str = ''
+    last_page: int = 1
+    date: object = None
+
+    @property
+    def not_modified(self):
+        return self.status == 304
+
+
+class GitHubClient:
+    """ Async client for the issues endpoint of the GitHub REST API.
+
+    One `httpx.AsyncClient` keeps up to `max_connections` keep-alive connections
+    open; `concurrency` bounds how many page requests are in flight at once.
+    Use it as an async context manager.
+    """
+
+    def __init__(self, base_url=None, token=None, concurrency=None, per_page=None, timeout=None, retries=3):
+        self.base_url = (base_url or settings.GITHUB_API_URL).rstrip('/')
+        self.token = token if token is not None else settings.GITHUB_TOKEN
+        self.concurrency = concurrency or settings.GITHUB_SYNC_CONCURRENCY
+        self.per_page = per_page or settings.GITHUB_SYNC_PER_PAGE
+        self.timeout = timeout or settings.GITHUB_TIMEOUT
+        self.retries = retries
+
+    async def __aenter__(self):
+        headers = {'Accept': 'application/vnd.github+json', 'X-GitHub-Api-Version': '2022-11-28'}
+        if self.token:
+            headers['Authorization'] = f"Bearer {self.token}"
+        self.http = httpx.AsyncClient(
+            base_url=self.base_url, headers=headers, timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+        )
+        self.semaphore = asyncio.Semaphore(self.concurrency)
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.http.aclose()
+
+    async def issues_page(self, repo, page=1, since=None, etag=None):
+        """ One page of the repository's issues (open and closed), oldest created first. """
+        params = {'state': 'all', 'sort': 'created', 'direction': 'asc', 'per_page': self.per_page, 'page': page}
+        if since is not None:
+            params['since'] = since.strftime('%Y-%m-%dT%H:%M:%SZ')
+        headers = {'If-None-Match': etag} if etag else {}
+
+        async with self.semaphore:
+            for attempt in range(self.retries + 1):
+                try:
+                    response = await self.http.get(f"/repos/{repo}/issues", params=params, headers=headers)
+                except httpx.TransportError as exc:
+                    if attempt == self.retries:
+                        raise GitHubError(f"GET {repo} issues page {page} failed: {exc}") from exc
+                else:
+                    if response.status_code not in RETRY_STATUSES or attempt == self.retries:
+                        break
+                await asyncio.sleep(0.5 * 2 ** attempt)
+
+        if response.status_code == 304:
+            return Page(page, 304, etag=etag, date=server_time(response))
+        if response.status_code in (403, 429) and response.headers.get('X-RateLimit-Remaining') == '0':
+            raise GitHubError(f"GitHub rate limit exhausted; it resets at {response.headers.get('X-RateLimit-Reset')}.")
+        if response.status_code != 200:
+            raise GitHubError(f"GET {repo} issues page {page} returned {response.status_code}: {response.text[:200]}")
+
+        last_page = page
+        for url, rel in LINK_RE.findall(response.headers.get('Link', '')):
+            match = PAGE_RE.search(url)
+            if rel == 'last' and match:
+                last_page = int(match.group(1))
+        return Page(page, 200, response.json(), response.headers.get('ETag', ''), last_page, server_time(response))
@@ -0,0 +1,157 @@
+import hashlib
+import json
+import random
+import re
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from email.utils import format_datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+ISSUES_PATH_RE = re.compile(r'^/repos/([\w.-]+/[\w.-]+)/issues$')
+LABELS = ['bug', 'crash', 'ui', 'backend', 'performance', 'regression', 'docs', 'security']
+
+
+class FakeGitHub:
+    """ In-process stand-in for the issues endpoint of the GitHub REST API.
+
+    Supports `state`, `since`, `per_page` and `page`, sorts by creation, sends
+    `Link`, `ETag` and `Date` headers and answers 304 to a matching
+    `If-None-Match`. `latency` adds a delay per request to mimic a remote API.
+    """
+
+    def __init__(self, latency=0.0, seed=0):
+        self.latency = latency
+        self.random = random.Random(seed)
+        self.repos = {}
+        self.requests = 0
+        self.not_modified = 0
+        self.lock = threading.Lock()
+        self.server = None
+
+    def add_repo(self, repo, issues, pull_requests=0):
+        """ Create `issues` issues (plus some pull requests, which the sync must skip). """
+        started = datetime.now(timezone.utc) - timedelta(days=365)
+        items = self.repos.setdefault(repo, [])
+        for number in range(len(items) + 1, len(items) + issues + pull_requests + 1):
+            created = started + timedelta(minutes=number)
+            item = {
+                'number': number,
+                'html_url': f"https://github.com/{repo}/issues/{number}",
+                'title': f"Issue {number}: {self.random.choice(['Crash', 'Timeout', 'Typo', 'Leak'])} in module {number % 97}",
+                'body': f"Reported against build {number % 13}. Steps to reproduce attached.",
+                'state': 'closed' if self.random.random() < 0.3 else 'open',
+                'labels': [{'name': name} for name in self.random.sample(LABELS, self.random.randint(0, 2))],
+                'created_at': created, 'updated_at': created, 'closed_at': None,
+            }
+            if item['state'] == 'closed':
+                item['closed_at'] = created + timedelta(hours=1)
+            items.append(item)
+        for item in self.random.sample(items[-(issues + pull_requests):], pull_requests):
+            item['pull_request'] = {'url': item['html_url'].replace('/issues/', '/pulls/')}
+        return items
+
+    def touch(self, repo, count, close=False):
+        """ Update `count` random issues now, as if someone edited them on GitHub. """
+        now = datetime.now(timezone.utc)
+        items = self.random.sample(self.repos[repo], count)
+        for item in items:
+            item['title'] = f"{item['title'].split(' [edited')[0]} [edited {now:%H:%M:%S}]"
+            item['updated_at'] = now
+            if close:
+                item['state'], item['closed_at'] = 'closed', now
+        return [item['number'] for item in items]
+
+    # --------------------------- Server --------------------------- #
+
+    def start(self, port=0):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def do_GET(self):
+                fake.handle(self)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer(('127.0.0.1', port), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self.url
+
+    @property
+    def url(self):
+        host, port = self.server.server_address
+        return f"http://{host}:{port}"
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.stop()
+
+    def handle(self, request):
+        if self.latency:
+            time.sleep(self.latency)
+        with self.lock:
+            self.requests += 1
+        parts = urlsplit(request.path)
+        match = ISSUES_PATH_RE.match(parts.path)
+        if not match or match.group(1) not in self.repos:
+            return self.send(request, 404, {'message': 'Not Found'})
+
+        query = {key: values[-1] for key, values in parse_qs(parts.query).items()}
+        per_page = min(int(query.get('per_page', 30)), 100)
+        page = max(int(query.get('page', 1)), 1)
+        items = self.repos[match.group(1)]
+        if query.get('since'):
+            since = datetime.strptime(query['since'], '%Y-%m-%dT%H:%M:%SZ').replace(tzinfo=timezone.utc)
+            items = [item for item in items if item['updated_at'] >= since]
+        if query.get('state', 'open') != 'all':
+            items = [item for item in items if item['state'] == query.get('state', 'open')]
+        if query.get('direction') == 'desc':
+            items = items[::-1]
+
+        last_page = max((len(items) + per_page - 1) // per_page, 1)
+        body = json.dumps([
+            {key: value.strftime('%Y-%m-%dT%H:%M:%SZ') if isinstance(value, datetime) else value
+             for key, value in item.items()}
+            for item in items[(page - 1) * per_page:page * per_page]
+        ]).encode()
+        etag = f'W/"{hashlib.sha1(body).hexdigest()}"'
+        if request.headers.get('If-None-Match') == etag:
+            with self.lock:
+                self.not_modified += 1
+            return self.send(request, 304, None, {'ETag': etag})
+
+        links = []
+        base = f"{self.url}{parts.path}?" + '&'.join(f"{k}={v}" for k, v in query.items() if k != 'page')
+        if page < last_page:
+            links.append(f'<{base}&page={page + 1}>; rel="next"')
+            links.append(f'<{base}&page={last_page}>; rel="last"')
+        headers = {'ETag': etag}
+        if links:
+            headers['Link'] = ', '.join(links)
+        self.send(request, 200, body, headers)
+
+    def send(self, request, status, body, headers=None):
+        if isinstance(body, dict):
+            body = json.dumps(body).encode()
+        request.send_response(status)
+        request.send_header('Date', format_datetime(datetime.now(timezone.utc), usegmt=True))
+        for key, value in (headers or {}).items():
+            request.send_header(key, value)
+        if body is not None:
+            request.send_header('Content-Type', 'application/json')
+            request.send_header('Content-Length', str(len(body)))
+        request.end_headers()
+        if body is not None:
+            request.wfile.write(body)
@@ -0,0 +1,210 @@
+import asyncio
+import re
+import time
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.db import transaction
+from django.db.models import F, Value
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+
+from Core import changelog, saved_filters, tag_index, triage
+from Core.models import Bug, GitHubSyncState, Tag
+from .client import GitHubClient, GitHubError
+
+# --------------------------- GitHub issue sync --------------------------- #
+# Issues are listed oldest-created first with `since` set to the server time of
+# the previous sync. An issue that changes during a sync can only push later
+# entries further down the listing, so as long as pages are fetched in order an
+# entry pushed over a page boundary is seen twice rather than skipped. Page 1 is
+# requested with the previous ETag; a 304 means nothing changed and costs no
+# rate limit. Each next page is fetched while the previous one is upserted, and
+# projects are synced side by side to keep the client's connections busy.
+# GitHub is the source of truth for title, description and URL. Status only
+# moves between open and closed, so local in-progress and resolved states
+# survive, and labels are added as tags.
+
+REPO_RE = re.compile(r'github\.com[/:]([\w.-]+)/([\w.-]+?)(?:\.git)?/*$')
+ISSUE_URL_RE = re.compile(r'/issues/(\d+)/*$')
+CLOSED_STATES = ('resolved', 'closed')
+
+
+def repo_slug(url):
+    """ 'owner/repo' for a GitHub repository URL, or None. """
+    match = REPO_RE.search(url or '')
+    return f"{match.group(1)}/{match.group(2)}" if match else None
+
+
+@dataclass
+class SyncResult:
+    project_id: int
+    pages: int = 0
+    issues: int = 0
+    not_modified: bool = False
+    seconds: float = 0.0
+
+
+class ProjectSync:
+    """ One sync run of one project; the database work runs on the sync thread. """
+
+    def __init__(self, project, client):
+        self.project = project
+        self.client = client
+        self.repo = repo_slug(project.github_repo)
+        self.result = SyncResult(project.pk)
+        self.tags = {}
+
+    def link_existing(self):
+        """ Fill in issue numbers of bugs that were linked by URL before syncing existed. """
+        bugs = Bug.objects.filter(project=self.project, github_issue_number__isnull=True, github_issue_url__isnull=False)
+        taken = set(
+            Bug.objects.filter(project=self.project, github_issue_number__isnull=False)
+            .values_list('github_issue_number', flat=True)
+        )
+        linked = []
+        for bug in bugs.only('pk', 'github_issue_url'):
+            match = ISSUE_URL_RE.search(bug.github_issue_url)
+            if match and int(match.group(1)) not in taken:
+                bug.github_issue_number = int(match.group(1))
+                taken.add(bug.github_issue_number)
+                linked.append(bug)
+        Bug.objects.bulk_update(linked, ['github_issue_number'], batch_size=1000)
+
+    def upsert(self, issues):
+        issues = [issue for issue in issues if 'pull_request' not in issue]
+        if not issues:
+            return 0
+        project = self.project
+        bugs = [
+            Bug(
+                project_id=project.pk,
+                github_issue_number=issue['number'],
+                github_issue_url=issue['html_url'],
+                title=issue['title'][:255],
+                description=issue.get('body') or '',
+                status='closed' if issue['state'] == 'closed' else 'open',
+                resolved_at=parse_datetime(issue['closed_at']) if issue.get('closed_at') else None,
+                assigned_team_id=project.assigned_team_id,
+            )
+            for issue in issues
+        ]
+        closed = [issue['number'] for issue in issues if issue['state'] == 'closed']
+        reopened = [issue['number'] for issue in issues if issue['state'] != 'closed']
+        numbers = [issue['number'] for issue in issues]
+        rows = Bug.objects.filter(project_id=project.pk)
+        # Every row the sync changes moves to a new version, as bulk edits do, so
+        # a copy loaded before the sync cannot write the old values back.
+        bump = {'updated_at': timezone.now(), 'version': F('version') + 1}
+        with transaction.atomic():
+            current = {
+                number: values for number, *values in rows.filter(github_issue_number__in=numbers)
+                .values_list('github_issue_number', 'pk', 'title', 'description', 'github_issue_url')
+            }
+            changed = [
+                bug for bug in bugs if bug.github_issue_number not in current
+                or current[bug.github_issue_number][1:] != [bug.title, bug.description, bug.github_issue_url]
+            ]
+            # An upsert cannot add to the version on conflict, so edited rows get it from a second UPDATE.
+            Bug.objects.bulk_create(
+                changed, update_conflicts=True, unique_fields=['project', 'github_issue_number'],
+                update_fields=['title', 'description', 'github_issue_url', 'updated_at'],
+            )
+            rows.filter(pk__in=[
+                current[bug.github_issue_number][0] for bug in changed if bug.github_issue_number in current
+            ]).update(version=F('version') + 1)
+            rows.filter(github_issue_number__in=closed).exclude(status__in=CLOSED_STATES).update(
+                status='closed', resolved_at=Coalesce(F('resolved_at'), Value(timezone.now())), **bump,
+            )
+            rows.filter(github_issue_number__in=reopened, status__in=CLOSED_STATES).update(
+                status='open', resolved_at=None, **bump,
+            )
+            self.add_labels(issues)
+            # bulk_create sends no signals, so the tag bitmaps, change log, saved filter
+            # results and triage scores cannot follow along.
+            synced = rows.filter(github_issue_number__in=numbers)
+            tag_index.invalidate(project.pk)
+            saved_filters.bump_projects([project.pk])
+            changelog.record('bug', synced.values_list('pk', 'project_id'))
+            triage.rescore(synced)  # Only the new bugs, still at the default score, are written.
+        return len(bugs)
+
+    def add_labels(self, issues):
+        names = {label['name'][:50] for issue in issues for label in issue.get('labels', ())}
+        missing = names - self.tags.keys()
+        if missing:
+            Tag.objects.bulk_create([Tag(name=name) for name in missing], ignore_conflicts=True)
+            self.tags.update(Tag.objects.filter(name__in=missing).values_list('name', 'pk'))
+        if not names:
+            return
+        bug_ids = dict(
+            Bug.objects.filter(project_id=self.project.pk, github_issue_number__in=[i['number'] for i in issues])
+            .values_list('github_issue_number', 'pk')
+        )
+        links = Bug.tags.through
+        links.objects.bulk_create([
+            links(bug_id=bug_ids[issue['number']], tag_id=self.tags[label['name'][:50]])
+            for issue in issues for label in issue.get('labels', ())
+        ], ignore_conflicts=True)
+
+    async def store_pages(self, page, since):
+        """ Upsert `page` and every page after it, fetching each next page while the previous one is stored. """
+        while True:
+            following = None
+            if page.number < page.last_page:
+                following = asyncio.ensure_future(self.client.issues_page(self.repo, page.number + 1, since))
+            try:
+                self.result.issues += await sync_to_async(self.upsert)(page.issues)
+            except BaseException:
+                if following is not None:
+                    following.cancel()
+                    await asyncio.gather(following, return_exceptions=True)
+                raise
+            if following is None:
+                return
+            page = await following
+            self.result.pages += 1
+
+    async def run(self, full=False):
+        if self.repo is None:
+            raise GitHubError(f"Project {self.project.pk} has no GitHub repository URL.")
+        started = time.perf_counter()
+        state, _ = await GitHubSyncState.objects.aget_or_create(project=self.project)
+        since, etag = (None, None) if full else (state.since, state.etag)
+        if not since:
+            await sync_to_async(self.link_existing)()
+
+        first = await self.client.issues_page(self.repo, 1, since, etag)
+        self.result.pages = 1
+        if first.not_modified:
+            self.result.not_modified = True
+        else:
+            await self.store_pages(first, since)
+            # A 304 for page 1 says nothing about later pages, so only single-page listings keep an ETag.
+            state.etag = first.etag if first.last_page == 1 else ''
+
+        # Only move the cursor once every page is stored, so a failed run is retried in full.
+        state.since = first.date or timezone.now()
+        state.last_synced_at = timezone.now()
+        state.issues_synced += self.result.issues
+        await state.asave()
+        self.result.seconds = time.perf_counter() - started
+        return self.result
+
+
+async def async_sync_projects(projects, full=False, **client_options):
+    """ Sync the projects side by side over one pooled client; each project's pages still come in order. """
+    async with GitHubClient(**client_options) as client:
+        tasks = [asyncio.ensure_future(ProjectSync(project, client).run(full)) for project in projects]
+        try:
+            return await asyncio.gather(*tasks)
+        except BaseException:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            raise
+
+
+def sync_projects(projects, full=False, **client_options):
+    return asyncio.run(async_sync_projects(list(projects), full, **client_options))
@@ -0,0 +1,305 @@
+import gzip
+import json
+import mmap
+import os
+import re
+import tempfile
+import zlib
+from functools import lru_cache
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+
+from .attachments import CHUNK_SIZE, blob_path
+from .models import AttachmentBlob, BugAttachment, LogIndex
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+# --------------------------- Log attachment index --------------------------- #
+# Text attachments are re-written as a sequence of independently compressed
+# blocks (about LOGINDEX_BLOCK_SIZE of text each, cut at line ends) plus an
+# index holding each block's offset and first line number and, for every token,
+# the blocks it occurs in. A search only decompresses the blocks that can match,
+# reading them through mmap, so memory stays bounded by the block size whatever
+# the size of the log.
+
+TOKEN_RE = re.compile(rb'[A-Za-z][A-Za-z0-9_]{2,39}')
+QUERY_TOKEN_RE = re.compile(r'[A-Za-z0-9_]+')
+MIN_TOKEN, MAX_TOKEN = 3, 40
+
+
+class SearchError(ValueError):
+    pass
+
+
+# --------------------------- Codecs --------------------------- #
+
+def default_codec():
+    codec = settings.LOGINDEX_CODEC
+    if codec == 'auto':
+        return 'zstd' if zstandard else 'gzip'
+    if codec == 'zstd' and zstandard is None:
+        raise RuntimeError("LOGINDEX_CODEC is 'zstd' but the zstandard package is not installed.")
+    return codec
+
+
+def compress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdCompressor(level=3).compress(data)
+    return gzip.compress(data, compresslevel=6)
+
+
+def decompress(codec, data):
+    if codec == 'zstd':
+        return zstandard.ZstdDecompressor().decompress(data)
+    return gzip.decompress(data)
+
+
+# --------------------------- Storage --------------------------- #
+
+def index_dir():
+    path = os.path.join(settings.MEDIA_ROOT, 'logindex')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def blocks_path(sha256):
+    return os.path.join(settings.MEDIA_ROOT, 'logindex', f"{sha256}.blocks")
+
+
+def table_path(sha256):
+    return os.path.join(settings.MEDIA_ROOT, 'logindex', f"{sha256}.idx")
+
+
+def load_table(sha256):
+    """ Block table and postings of an indexed blob. """
+    # Keyed on the file itself: a rebuild in another process replaces the file, so every process misses.
+    stat = os.stat(table_path(sha256))
+    return _read_table(sha256, stat.st_ino, stat.st_mtime_ns, stat.st_size)
+
+
+@lru_cache(maxsize=64)
+def _read_table(sha256, inode, mtime_ns, size):
+    with open(table_path(sha256), 'rb') as fh:
+        return json.loads(zlib.decompress(fh.read()))
+
+
+def remove_index_files(sender, instance, **kwargs):
+    for path in (blocks_path(instance.blob_id), table_path(instance.blob_id)):
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+post_delete.connect(remove_index_files, sender=LogIndex, dispatch_uid='core-logindex-remove-files')
+
+
+# --------------------------- Ingestion --------------------------- #
+
+def is_indexable(attachment):
+    mime_type = attachment.mime_type or ''
+    extension = os.path.splitext(attachment.name or '')[1].lower()
+    return mime_type.startswith('text/') or extension in settings.LOGINDEX_EXTENSIONS
+
+
+def _blocks(fh, block_size):
+    """ Yield chunks of about `block_size` bytes ending at a newline where there is one. """
+    pending = b''
+    while True:
+        chunk = fh.read(CHUNK_SIZE)
+        if chunk:
+            pending += chunk
+            if len(pending) < block_size:
+                continue
+        if not pending:
+            return
+        if not chunk:
+            yield pending
+            return
+        cut = pending.rfind(b'\n', 0, block_size) + 1 or block_size
+        yield pending[:cut]
+        pending = pending[cut:]
+
+
+def index_blob(blob, codec=None, block_size=None):
+    """ Build (or rebuild) the compressed block file and index for a text blob. """
+    codec = codec or default_codec()
+    block_size = block_size or settings.LOGINDEX_BLOCK_SIZE
+    max_tokens = settings.LOGINDEX_MAX_TOKENS
+    blocks, postings = [], {}
+    complete = True
+    offset = line = 0
+    ends_with_newline = True
+
+    directory = index_dir()
+    with open(blob_path(blob.sha256), 'rb') as source, \
+            tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as out:
+        try:
+            for block_id, text in enumerate(_blocks(source, block_size)):
+                data = compress(codec, text)
+                out.write(data)
+                blocks.append([offset, len(data), line])
+                offset += len(data)
+                line += text.count(b'\n')
+                ends_with_newline = text.endswith(b'\n')
+                for token in set(TOKEN_RE.findall(text.lower())):
+                    token = token.decode('ascii')
+                    ids = postings.get(token)
+                    if ids is not None:
+                        ids.append(block_id)
+                    elif len(postings) < max_tokens:
+                        postings[token] = [block_id]
+                    else:
+                        complete = False
+        except BaseException:
+            os.unlink(out.name)
+            raise
+    os.replace(out.name, blocks_path(blob.sha256))
+
+    table = zlib.compress(json.dumps({
+        'codec': codec, 'blocks': blocks, 'tokens': postings, 'complete': complete,
+    }, separators=(',', ':')).encode())
+    with tempfile.NamedTemporaryFile(dir=directory, suffix='.tmp', delete=False) as out:
+        out.write(table)
+    os.replace(out.name, table_path(blob.sha256))
+
+    index, _ = LogIndex.objects.update_or_create(blob=blob, defaults={
+        'codec': codec,
+        'line_count': line if ends_with_newline else line + 1,
+        'block_count': len(blocks),
+        'compressed_size': offset + len(table),
+        'complete_vocabulary': complete,
+    })
+    return index
+
+
+def pending_blobs(max_size=None):
+    """ Blobs with at least one indexable attachment and no log index yet. """
+    attachments = BugAttachment.objects.filter(blob__isnull=False, blob__log_index__isnull=True)
+    if max_size is not None:
+        attachments = attachments.filter(size__lte=max_size)
+    blob_ids = {
+        a.blob_id for a in attachments.only('blob_id', 'name', 'mime_type').iterator()
+        if is_indexable(a)
+    }
+    return AttachmentBlob.objects.filter(pk__in=blob_ids)
+
+
+def index_new_attachment(sender, instance, created, **kwargs):
+    """ Small text uploads are indexed right after commit; larger ones by index_log_attachments. """
+    if not created or not instance.blob_id or not is_indexable(instance):
+        return
+    if instance.size is None or instance.size > settings.LOGINDEX_INLINE_MAX_SIZE:
+        return
+
+    def build():
+        blob = AttachmentBlob.objects.filter(pk=instance.blob_id, log_index__isnull=True).first()
+        if blob is not None:
+            index_blob(blob)
+
+    transaction.on_commit(build)
+
+
+post_save.connect(index_new_attachment, sender=BugAttachment, dispatch_uid='core-logindex-index-new')
+
+
+# --------------------------- Search --------------------------- #
+
+def candidate_blocks(table, query):
+    """ Blocks that may contain the literal `query`, or None when every block must be scanned.
+
+    Tokens are indexed lower-cased, so the candidates hold for case-insensitive searches too.
+    """
+    if not table['complete']:
+        return None
+    words = [(m.start(), m.end(), m.group().lower()) for m in QUERY_TOKEN_RE.finditer(query)]
+    tokens = table['tokens']
+    candidates = None
+    for start, end, word in words:
+        # A word at the edge of the query may be part of a longer word in the log.
+        exact = start > 0 and end < len(query)
+        if not MIN_TOKEN <= len(word) < MAX_TOKEN or not word[0].isalpha():
+            continue
+        if exact:
+            blocks = set(tokens.get(word, ()))
+        else:
+            blocks = set()
+            for token, ids in tokens.items():
+                if word in token:
+                    blocks.update(ids)
+        candidates = blocks if candidates is None else candidates & blocks
+        if not candidates:
+            break
+    return sorted(candidates) if candidates is not None else None
+
+
+def _matching_lines(text, pattern):
+    """ (line index within the block, line) for every line of `text` the pattern matches. """
+    position = line = 0
+    end = -1
+    for match in pattern.finditer(text):
+        if match.start() <= end:
+            continue
+        start = text.rfind(b'\n', 0, match.start()) + 1
+        line += text.count(b'\n', position, start)
+        position = start
+        end = text.find(b'\n', match.end())
+        end = len(text) if end == -1 else end
+        yield line, text[start:end]
+
+
+def search_blob(sha256, pattern, query=None, limit=100):
+    """ Matching (line number, line) pairs for one indexed blob, and how many blocks were read. """
+    table = load_table(sha256)
+    blocks = table['blocks']
+    ids = candidate_blocks(table, query) if query is not None else None
+    ids = range(len(blocks)) if ids is None else ids
+    matches = []
+    if not ids:
+        return matches, 0
+    with open(blocks_path(sha256), 'rb') as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        for scanned, block_id in enumerate(ids, 1):
+            offset, length, first_line = blocks[block_id]
+            text = decompress(table['codec'], mm[offset:offset + length])
+            for index, line in _matching_lines(text, pattern):
+                matches.append((first_line + index + 1, line.decode('utf-8', 'replace')))
+                if len(matches) >= limit:
+                    return matches, scanned
+    return matches, len(ids)
+
+
+def search_project_logs(project_id, query, regex=False, ignore_case=False, limit=100):
+    """ grep across every indexed log attached to the project's bugs. """
+    # Blocks are searched whole, so ^ and $ need MULTILINE to anchor at line boundaries, as in grep.
+    flags = re.MULTILINE | (re.IGNORECASE if ignore_case else 0)
+    try:
+        source = query.encode() if regex else re.escape(query.encode())
+        pattern = re.compile(source, flags)
+    except re.error as exc:
+        raise SearchError(f"Invalid regular expression: {exc}")
+
+    attachments = {}
+    rows = BugAttachment.objects.filter(bug__project_id=project_id, blob__log_index__isnull=False) \
+        .order_by('-uploaded_at').values('id', 'bug_id', 'name', 'blob_id')
+    for row in rows:
+        attachments.setdefault(row['blob_id'], []).append(row)
+
+    results, scanned, truncated = [], 0, False
+    for sha256, rows in attachments.items():
+        matches, read = search_blob(sha256, pattern, None if regex else query, limit - len(results))
+        scanned += read
+        for line, text in matches:
+            for row in rows:
+                results.append({
+                    'attachment': row['id'], 'bug': row['bug_id'], 'name': row['name'],
+                    'line': line, 'text': text,
+                })
+        if len(results) >= limit:
+            truncated = True
+            break
+    return {'results': results[:limit], 'truncated': truncated, 'blocks_scanned': scanned}
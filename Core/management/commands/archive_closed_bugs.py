@@ -0,0 +1,38 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Core.archive import archive_closed_bugs, candidates
+from Core.sharding import databases, use_shard
+
+
+class Command(BaseCommand):
+    help = (
+        "Move closed bugs that were last updated more than --days ago, with their activity log, time "
+        "tracking and attachments, into the compressed archive. Archived bugs can be restored through "
+        "POST /api/core/bugs/<id>/restore/."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.BUG_ARCHIVE_AFTER_DAYS,
+                            help="Archive bugs closed before this many days ago.")
+        parser.add_argument('--batch-size', type=int, default=settings.BUG_ARCHIVE_BATCH_SIZE,
+                            help="Bugs per transaction.")
+        parser.add_argument('--limit', type=int, help="Archive at most this many bugs per database.")
+        parser.add_argument('--dry-run', action='store_true', help="Only count the bugs that would be archived.")
+
+    def handle(self, *args, **options):
+        older_than = timezone.now() - timedelta(days=options['days'])
+        total = 0
+        for using in databases():
+            with use_shard(using):
+                if options['dry_run']:
+                    count = candidates(older_than).count()
+                else:
+                    count = archive_closed_bugs(older_than, options['batch_size'], options['limit'])
+            total += count
+            self.stdout.write(f"{using}: {count}")
+        verb = "Would archive" if options['dry_run'] else "Archived"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {total} bugs."))
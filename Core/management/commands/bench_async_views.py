@@ -0,0 +1,92 @@
+import http.client
+import json
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.core.management.base import BaseCommand
+
+from Auth.models import User
+
+ENDPOINTS = {
+    'login': ('login/', 'async/login/'),
+    'register': ('register/', 'async/register/'),
+    'google': ('google/', 'async/google/'),
+}
+
+LOGIN_EMAIL = 'bench-async-login@example.com'
+LOGIN_PASSWORD = 'bench-async-pass'
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare sync (WSGI) and async (ASGI) auth endpoints under concurrent load. Start both servers "
+        "against the same database first, e.g. `gunicorn Server.wsgi -w 1 --threads 8 -b :8000` and "
+        "`uvicorn Server.asgi:application --port 8001`."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--wsgi-url', default='http://127.0.0.1:8000/api/v1/auth/')
+        parser.add_argument('--asgi-url', default='http://127.0.0.1:8001/api/v1/auth/')
+        parser.add_argument('--requests', type=int, default=200)
+        parser.add_argument('--concurrency', type=int, default=32)
+        parser.add_argument('--endpoint', action='append', choices=list(ENDPOINTS))
+
+    def handle(self, *args, **options):
+        if not User.objects.filter(email=LOGIN_EMAIL).exists():
+            User.objects.create_user(LOGIN_EMAIL, "Bench", "Login", LOGIN_PASSWORD, is_verified=True)
+        try:
+            self.stdout.write(f"{'endpoint':<10}{'server':<6}{'req/s':>8}{'p50 ms':>9}{'p99 ms':>9}{'errors':>8}")
+            for endpoint in options['endpoint'] or ENDPOINTS:
+                sync_path, async_path = ENDPOINTS[endpoint]
+                for server, url in (('wsgi', options['wsgi_url'] + sync_path), ('asgi', options['asgi_url'] + async_path)):
+                    rate, p50, p99, errors = self.run(endpoint, url, options['requests'], options['concurrency'])
+                    self.stdout.write(f"{endpoint:<10}{server:<6}{rate:>8.1f}{p50:>9.1f}{p99:>9.1f}{errors:>8}")
+        finally:
+            User.objects.filter(email__startswith='bench-async-').delete()
+
+    def payload(self, endpoint):
+        if endpoint == 'login':
+            return {'email': LOGIN_EMAIL, 'password': LOGIN_PASSWORD}
+        if endpoint == 'register':
+            return {
+                'email': f"bench-async-{uuid.uuid4().hex}@example.com", 'first_name': "Bench",
+                'last_name': "Register", 'password': LOGIN_PASSWORD, 'password_confirm': LOGIN_PASSWORD,
+            }
+        # An invalid token still exercises the certificate fetch and verification path.
+        return {'access_token': 'bench-invalid-token'}
+
+    def run(self, endpoint, url, requests, concurrency):
+        parts = urlsplit(url)
+        local = threading.local()
+
+        def request(_):
+            conn = getattr(local, 'conn', None)
+            if conn is None:
+                conn = local.conn = http.client.HTTPConnection(parts.hostname, parts.port, timeout=60)
+            body = json.dumps(self.payload(endpoint))
+            started = time.perf_counter()
+            try:
+                conn.request('POST', parts.path, body, {'Content-Type': 'application/json'})
+                response = conn.getresponse()
+                response.read()
+                ok = response.status < 500
+            except (OSError, http.client.HTTPException):
+                local.conn = None
+                ok = False
+            return (time.perf_counter() - started) * 1000, ok
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(concurrency) as pool:
+            results = list(pool.map(request, range(requests)))
+        elapsed = time.perf_counter() - started
+        latencies = sorted(latency for latency, _ in results)
+        errors = sum(1 for _, ok in results if not ok)
+        return (
+            requests / elapsed,
+            latencies[len(latencies) // 2],
+            latencies[max(int(len(latencies) * 0.99) - 1, 0)],
+            errors,
+        )
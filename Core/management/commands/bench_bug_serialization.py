@@ -0,0 +1,74 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.http import QueryDict
+from rest_framework.renderers import JSONRenderer
+
+from Core.benchmarks.seed import Seeder
+from Core.models import Bug
+from Core.serializers import BugListSerializer
+from Server.renderers import FastJSONRenderer, orjson
+
+FIELDSETS = [
+    ('all fields', ''),
+    ('fields=id,title,status', 'fields=id,title,status'),
+    ('fields=id,title,status,tags', 'fields=id,title,status,tags'),
+    ('expand=project,assigned_worker,reported_by', 'expand=project,assigned_worker,reported_by'),
+]
+
+
+class Command(BaseCommand):
+    help = (
+        "Time one page of the bug list (query, serializer, renderer) and its payload size for several "
+        "?fields= / ?expand= fieldsets, with DRF's JSONRenderer and FastJSONRenderer. Seeds a project "
+        "and rolls it back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bugs', type=int, default=1000, help="Bugs on the page.")
+        parser.add_argument('--repeat', type=int, default=5, help="Runs per case; the fastest is reported.")
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            seeder = Seeder('tiny', prefix='bench-fields', workspaces=1, projects=1, bugs=options['bugs']).run()
+            self.run(seeder.projects[0], options['bugs'], options['repeat'])
+            transaction.set_rollback(True)
+
+    def run(self, project, limit, repeat):
+        self.stdout.write(f"{limit} bugs per page; orjson {'installed' if orjson else 'missing'} ({connection.vendor})")
+        self.stdout.write(
+            f"{'fieldset':<46}{'renderer':>10}{'queries':>9}{'query ms':>10}{'serialize ms':>14}"
+            f"{'render ms':>11}{'bytes':>10}"
+        )
+        for label, query in FIELDSETS:
+            fields, expand = BugListSerializer.fieldset(QueryDict(query))
+            for name, renderer in (('drf', JSONRenderer()), ('fast', FastJSONRenderer())):
+                best = None
+                for _ in range(repeat):
+                    sample = self.sample(project, limit, fields, expand, renderer)
+                    best = sample if best is None else [min(a, b) for a, b in zip(best, sample)]
+                queries, fetch, serialize, render, size = best
+                self.stdout.write(
+                    f"{label:<46}{name:>10}{queries:>9}{fetch * 1000:>10.1f}{serialize * 1000:>14.1f}"
+                    f"{render * 1000:>11.1f}{size:>10}"
+                )
+
+    def sample(self, project, limit, fields, expand, renderer):
+        queries = 0
+
+        def count(execute, *args):
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        bugs = Bug.objects.filter(project_id=project.pk).order_by('-pk')
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            page = list(BugListSerializer.optimize(bugs, fields, expand)[:limit])
+            fetched = time.perf_counter()
+            data = {'results': BugListSerializer(page, many=True, fields=fields, expand=expand).data}
+            serialized = time.perf_counter()
+            body = renderer.render(data)
+            rendered = time.perf_counter()
+        return [queries, fetched - started, serialized - fetched, rendered - serialized, len(body)]
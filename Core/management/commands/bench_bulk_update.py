@@ -0,0 +1,67 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+
+from Core.benchmarks.seed import Seeder
+from Core.bulk import update_bugs
+from Core.models import ActivityLog, Bug, Notification, Sprint
+
+
+class Command(BaseCommand):
+    help = (
+        "Move bugs to another sprint and resolve them, once with a save() per bug (plus its activity log "
+        "and notification) and once with Core.bulk.update_bugs (data is rolled back)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bugs', type=int, action='append', help="Bugs per update (repeatable).")
+
+    def handle(self, *args, **options):
+        sizes = options['bugs'] or [30, 300, 3000]
+        self.stdout.write(f"{'bugs':>6}{'mode':>10}{'queries':>9}{'ms':>10}{'bugs/s':>10}  ({connection.vendor})")
+        with transaction.atomic():
+            seeder = Seeder(
+                'tiny', prefix='bench-bulk', workspaces=1, projects=1, sprints=2, bugs=2 * max(sizes),
+                logs_per_bug=0, notifications_per_user=0,
+            ).run()
+            user = seeder.users[0]
+            user.is_staff = True
+            bugs = list(Bug.objects.filter(project=seeder.projects[0]).order_by('pk'))
+            target = Sprint.objects.filter(project=seeder.projects[0]).order_by('pk').last()
+            for size in sizes:
+                self.measure('save', size, lambda: self.per_object(user, bugs[:size], target))
+                self.measure('bulk', size, lambda: update_bugs(
+                    user, [bug.pk for bug in bugs[size:2 * size]], {'sprint': target, 'status': 'resolved'},
+                ))
+                Bug.objects.filter(pk__in=[bug.pk for bug in bugs]).update(sprint=seeder.sprints[0], status='open')
+            transaction.set_rollback(True)
+
+    def per_object(self, user, bugs, sprint):
+        """ What a client does today: one PATCH, hence one save, per bug. """
+        for bug in bugs:
+            bug.refresh_from_db()
+            old_status = bug.status
+            bug.sprint = sprint
+            bug.status = 'resolved'
+            bug.save()
+            ActivityLog.objects.create(
+                project_id=bug.project_id, bug=bug, message=f"Status changed from {old_status} to {bug.status}",
+            )
+            if bug.assigned_worker_id:
+                Notification.objects.create(user_id=bug.assigned_worker.user_id, message=f"{bug.title} was resolved.")
+
+    def measure(self, mode, size, run):
+        queries = 0
+
+        def count(execute, *args):
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            with transaction.atomic():
+                run()
+            elapsed = time.perf_counter() - started
+        self.stdout.write(f"{size:>6}{mode:>10}{queries:>9}{elapsed * 1000:>10.1f}{size / elapsed:>10.0f}")
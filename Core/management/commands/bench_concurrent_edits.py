@@ -0,0 +1,137 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test import override_settings
+
+from Core.models import Bug, Project
+from Core.sharding import is_sharded, use_shard
+from Core.versioning import VersionConflict
+
+# The production SQLite profile (WAL, write lock taken at BEGIN, busy timeout).
+PROFILE = {
+    'ENGINE': 'Server.backends.sqlite3',
+    'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+}
+ROUTERS = ['Core.sharding.WorkspaceRouter']
+ALIAS = 'bench_edits'
+PRIORITIES = [p for p, _ in Bug.PRIORITY_CHOICES]
+
+
+def _connect(path):
+    connections.settings[ALIAS] = connections.configure_settings({'default': {'NAME': path, **PROFILE}})['default']
+    if hasattr(connections._connections, ALIAS):
+        del connections[ALIAS]
+
+
+def _edit(bug, rng):
+    bug.priority = rng.choice(PRIORITIES)
+    bug.description = f"Edited {rng.random()}"
+
+
+def _locking_worker(path, bug_ids, edits, think, seed):
+    """ Read the bug with select_for_update, edit it and save it, all in one transaction. """
+    _connect(path)
+    rng = random.Random(seed)
+    done = locked = 0
+    with use_shard(ALIAS):
+        for _ in range(edits):
+            try:
+                with transaction.atomic(using=ALIAS):
+                    bug = Bug.objects.select_for_update().get(pk=rng.choice(bug_ids))
+                    time.sleep(think)
+                    _edit(bug, rng)
+                    bug.save()
+                done += 1
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                locked += 1
+    connections[ALIAS].close()
+    return done, 0, locked
+
+
+def _optimistic_worker(path, bug_ids, edits, think, seed):
+    """ Read the bug, edit it and save it against the version read; on a conflict, read it again and redo the edit. """
+    _connect(path)
+    rng = random.Random(seed)
+    done = conflicts = locked = 0
+    with use_shard(ALIAS):
+        for _ in range(edits):
+            pk = rng.choice(bug_ids)
+            while True:
+                bug = Bug.objects.get(pk=pk)
+                time.sleep(think)
+                _edit(bug, rng)
+                try:
+                    bug.save()
+                except VersionConflict:
+                    conflicts += 1
+                    continue
+                except OperationalError as exc:
+                    if 'locked' not in str(exc):
+                        raise
+                    locked += 1
+                    break
+                done += 1
+                break
+    connections[ALIAS].close()
+    return done, conflicts, locked
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent edits of a few hot bugs, with select_for_update and with optimistic concurrency "
+        "(version column, conditional UPDATE of the changed fields), on a temporary SQLite file in the "
+        "production profile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8, help="Editor processes.")
+        parser.add_argument('--edits', type=int, default=100, help="Edits per worker.")
+        parser.add_argument('--hot', type=int, default=4, help="Bugs the edits are spread over.")
+        parser.add_argument('--think-ms', type=float, default=2.0,
+                            help="Time between reading a bug and saving it (serializers, validation, round trips).")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{options['workers']} workers x {options['edits']} edits over {options['hot']} bugs, "
+            f"{options['think_ms']} ms between read and write"
+        )
+        self.stdout.write(f"{'approach':<12}{'edits/s':>9}{'ok':>7}{'conflicts':>11}{'locked':>8}{'seconds':>9}")
+        with override_settings(DATABASE_ROUTERS=ROUTERS):
+            for name, worker in (('locking', _locking_worker), ('optimistic', _optimistic_worker)):
+                with tempfile.TemporaryDirectory() as tmp:
+                    path = os.path.join(tmp, f'{ALIAS}.sqlite3')
+                    bug_ids = self.prepare(path, options['hot'])
+                    started = time.perf_counter()
+                    with multiprocessing.get_context('fork').Pool(options['workers']) as pool:
+                        results = pool.starmap(worker, [
+                            (path, bug_ids, options['edits'], options['think_ms'] / 1000, seed)
+                            for seed in range(options['workers'])
+                        ])
+                    elapsed = time.perf_counter() - started
+                done, conflicts, locked = (sum(column) for column in zip(*results))
+                self.stdout.write(
+                    f"{name:<12}{done / elapsed:>9.0f}{done:>7}{conflicts:>11}{locked:>8}{elapsed:>9.2f}"
+                )
+
+    def prepare(self, path, hot):
+        """ Create the Core tables and one project with `hot` bugs; returns their ids. """
+        _connect(path)
+        with connections[ALIAS].schema_editor() as editor:
+            for model in apps.get_app_config('Core').get_models():
+                if is_sharded(model):
+                    editor.create_model(model)
+        with use_shard(ALIAS):
+            project = Project.objects.create(workspace_id=1, name="Bench")
+            bugs = Bug.objects.bulk_create([
+                Bug(project=project, title=f"Hot bug {i}", description="Concurrent edit benchmark.") for i in range(hot)
+            ])
+        connections[ALIAS].close()
+        return [bug.pk for bug in bugs]
@@ -0,0 +1,70 @@
+import statistics
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections, connections
+from django.db.backends.signals import connection_created
+from django.test import Client
+
+
+class Command(BaseCommand):
+    help = "Request load against a one-query endpoint, counting new database connections per mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=8)
+        parser.add_argument('--path', default='/api/v1/auth/verify-email/')
+
+    def handle(self, *args, **options):
+        settings_dict = connections['default'].settings_dict
+        configured = settings_dict['CONN_MAX_AGE']
+        modes = [('per-request', 0)]
+        if configured or settings_dict['OPTIONS'].get('pool'):
+            modes.append(('persistent' if configured else 'pool', configured))
+        else:
+            modes.append(('persistent', 600))
+
+        self.stdout.write(f"{'mode':<12}{'connections':>12}{'req/s':>9}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, max_age in modes:
+            settings_dict['CONN_MAX_AGE'] = max_age
+            opened, elapsed, latencies = self.run(options)
+            latencies.sort()
+            p99 = latencies[int(len(latencies) * 0.99) - 1]
+            self.stdout.write(
+                f"{name:<12}{opened:>12}{len(latencies) / elapsed:>9.0f}"
+                f"{statistics.median(latencies):>9.2f}{p99:>9.2f}"
+            )
+        settings_dict['CONN_MAX_AGE'] = configured
+
+    def run(self, options):
+        opened = []
+        lock = threading.Lock()
+
+        def count(sender, connection, **kwargs):
+            with lock:
+                opened.append(connection.alias)
+
+        local = threading.local()
+
+        def request(_):
+            client = getattr(local, 'client', None)
+            if client is None:
+                client = local.client = Client()
+            started = time.perf_counter()
+            # The test client skips the handler's connection cleanup, so run it like WSGI would.
+            close_old_connections()
+            client.post(options['path'], {'otp': '000000'}, content_type='application/json')
+            close_old_connections()
+            return (time.perf_counter() - started) * 1000
+
+        connection_created.connect(count)
+        try:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(options['concurrency']) as pool:
+                latencies = list(pool.map(request, range(options['requests'])))
+            elapsed = time.perf_counter() - started
+        finally:
+            connection_created.disconnect(count)
+        return len(opened), elapsed, latencies
@@ -0,0 +1,71 @@
+import json
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+
+from Auth.models import User
+from Core.benchmarks.seed import Seeder
+from Core.changelog import current_rows
+from Core.models import Bug, ChangeLog, Tag, Workspace
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare a client re-downloading every bug it can see with one fetching /api/core/changes/ "
+        "after a few edits: bytes, queries and time per poll. The seeded data is deleted afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', default='medium', choices=['tiny', 'small', 'medium', 'large'])
+        parser.add_argument('--edits', type=int, action='append', help="Bugs changed between polls (repeatable).")
+
+    def handle(self, *args, **options):
+        # Change log entries are written on commit, so this runs outside a transaction and cleans up after.
+        start = ChangeLog.objects.order_by('-seq').values_list('seq', flat=True).first() or 0
+        seeder = Seeder(options['scale'], prefix='bench-delta').run()
+        try:
+            with override_settings(CHANGELOG_SETTLE_SECONDS=0):
+                self.run(seeder, start, options['edits'] or [0, 10, 100])
+        finally:
+            Workspace.objects.filter(pk__in=[ws.pk for ws in seeder.workspaces]).delete()
+            User.objects.filter(pk__in=[user.pk for user in seeder.users]).delete()
+            Tag.objects.filter(pk__in=[tag.pk for tag in seeder.tags]).delete()
+            ChangeLog.objects.filter(seq__gt=start).delete()
+
+    def run(self, seeder, since, edit_counts):
+        user = seeder.users[0]
+        client = APIClient()
+        client.force_authenticate(user)
+        project_ids = [p.pk for p in seeder.projects if p.workspace_id == user.workspace_id]
+        bug_ids = list(Bug.objects.filter(project__in=project_ids).values_list('pk', flat=True))
+        self.stdout.write(f"{len(bug_ids)} visible bugs ({connection.vendor})")
+        self.stdout.write(f"{'edits':>6}{'mode':>8}{'bytes':>12}{'queries':>9}{'ms':>9}")
+
+        for edits in edit_counts:
+            for bug in Bug.objects.filter(pk__in=random.Random(edits).sample(bug_ids, edits)):
+                bug.status = 'in_progress'
+                bug.save()
+            self.measure(edits, 'full', lambda: json.dumps(current_rows('bug', set(bug_ids)), default=str).encode())
+            response = self.measure(edits, 'delta', lambda: client.get(reverse('changes'), {'since': since}))
+            since = response.data['next']
+
+    def measure(self, edits, mode, run):
+        queries = 0
+
+        def count(execute, *args):
+            nonlocal queries
+            queries += 1
+            return execute(*args)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            result = run()
+            elapsed = time.perf_counter() - started
+        size = len(result) if isinstance(result, bytes) else len(result.content)
+        self.stdout.write(f"{edits:>6}{mode:>8}{size:>12}{queries:>9}{elapsed * 1000:>9.1f}")
+        return result
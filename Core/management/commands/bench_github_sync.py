@@ -0,0 +1,59 @@
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from Auth.models import User
+from Core.benchmarks.seed import Seeder
+from Core.github.fake import FakeGitHub
+from Core.github.sync import sync_projects
+from Core.models import Bug, Tag, Workspace
+
+REPO = 'bench/issues'
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure GitHub issue sync throughput against a local fake API: a full sync, a sync with "
+        "nothing changed (304) and an incremental sync after some issues were edited."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--issues', type=int, default=50000)
+        parser.add_argument('--latency', type=float, default=0.05, help="Seconds the fake API waits per request.")
+        parser.add_argument('--concurrency', type=int, action='append', help="Page requests in flight (repeatable).")
+        parser.add_argument('--per-page', type=int, default=100)
+        parser.add_argument('--touch', type=int, default=500, help="Issues edited before the incremental sync.")
+
+    def handle(self, *args, **options):
+        fake = FakeGitHub(latency=options['latency'])
+        fake.add_repo(REPO, options['issues'], pull_requests=options['issues'] // 50)
+        self.stdout.write(
+            f"{options['issues']} issues, {options['per_page']} per page, {options['latency'] * 1000:.0f} ms latency "
+            f"({connection.vendor})"
+        )
+        self.stdout.write(
+            f"{'concurrency':>11}{'run':>13}{'pages':>7}{'issues':>8}{'304':>5}{'seconds':>9}{'issues/s':>10}"
+        )
+        with fake:
+            for concurrency in options['concurrency'] or [1, 8, 32]:
+                seeder = Seeder('tiny', prefix=f'bench-github-{concurrency}', projects=1, sprints=1, bugs=0).run()
+                project = seeder.projects[0]
+                project.github_repo = f"https://github.com/{REPO}"
+                project.save(update_fields=['github_repo'])
+                client = dict(base_url=fake.url, concurrency=concurrency, per_page=options['per_page'])
+                try:
+                    # The first run after a full sync stores the ETag of an empty listing; the second gets a 304.
+                    for run in ('full', 'unchanged', 'unchanged', 'incremental'):
+                        if run == 'incremental':
+                            fake.touch(REPO, options['touch'], close=True)
+                        result, = sync_projects([project], **client)
+                        rate = result.issues / result.seconds if result.seconds else 0
+                        self.stdout.write(
+                            f"{concurrency:>11}{run:>13}{result.pages:>7}{result.issues:>8}"
+                            f"{'yes' if result.not_modified else 'no':>5}{result.seconds:>9.2f}{rate:>10.0f}"
+                        )
+                    synced = Bug.objects.filter(project=project, github_issue_number__isnull=False).count()
+                    self.stdout.write(f"{'':>11}{'bugs stored':>13}{synced:>20}")
+                finally:
+                    Workspace.objects.filter(pk__in=[ws.pk for ws in seeder.workspaces]).delete()
+                    Tag.objects.filter(name__startswith=seeder.prefix).delete()
+                    User.objects.filter(pk__in=[user.pk for user in seeder.users]).delete()
@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from Auth.models import User
+from Core import cache
+from Core.models import Workspace, Team, Worker, Project, Sprint, Bug
+
+CHANGELISTS = ['bug', 'project', 'team', 'sprint', 'worker']
+
+
+class Command(BaseCommand):
+    help = "Compare admin changelist queries with the lookup cache disabled and enabled (data is rolled back)."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--bugs', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=5)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            admin_user = self.seed(options['bugs'])
+            client = Client()
+            client.force_login(admin_user)
+            self.run(client, options['repeat'])
+            transaction.set_rollback(True)
+        cache.invalidate_all()
+
+    def seed(self, bug_count):
+        workspaces = [Workspace.objects.create(name=f"bench-ws-{i}") for i in range(3)]
+        teams = [Team.objects.create(workspace=ws, name=f"team-{ws.pk}-{i}") for ws in workspaces for i in range(2)]
+        workers = []
+        for i, team in enumerate(teams):
+            user = User.objects.create_user(f"bench-worker-{i}@example.com", "Bench", "Worker", "bench-pass")
+            workers.append(Worker.objects.create(user=user, team=team))
+        projects = [
+            Project.objects.create(workspace=team.workspace, name=f"project-{team.pk}", assigned_team=team)
+            for team in teams
+        ]
+        for project in projects:
+            Sprint.objects.create(project=project, name="Sprint 1", start_date="2025-01-01", end_date="2025-01-14")
+        Bug.objects.bulk_create(
+            Bug(
+                project=projects[i % len(projects)],
+                title=f"Bench bug {i}",
+                description="Seeded for the lookup cache benchmark.",
+                assigned_team=teams[i % len(teams)],
+                assigned_worker=workers[i % len(workers)],
+            )
+            for i in range(bug_count)
+        )
+        return User.objects.create_superuser("bench-admin@example.com", "Bench", "Admin", "bench-pass")
+
+    def measure(self, client, url, repeat):
+        queries = []
+        started = time.perf_counter()
+        for _ in range(repeat):
+            with CaptureQueriesContext(connection) as ctx:
+                response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            queries.append(len(ctx.captured_queries))
+        elapsed = (time.perf_counter() - started) / repeat
+        return max(queries[1:] or queries), elapsed * 1000
+
+    def run(self, client, repeat):
+        disabled = {**settings.CORE_CACHE, 'ENABLED': False}
+        self.stdout.write(f"{'changelist':<12}{'queries off':>12}{'queries on':>12}{'ms off':>10}{'ms on':>10}")
+        for name in CHANGELISTS:
+            url = reverse(f"admin:Core_{name}_changelist")
+            with override_settings(CORE_CACHE=disabled):
+                queries_off, ms_off = self.measure(client, url, repeat)
+            cache.invalidate_all()
+            queries_on, ms_on = self.measure(client, url, repeat)
+            self.stdout.write(f"{name:<12}{queries_off:>12}{queries_on:>12}{ms_off:>10.1f}{ms_on:>10.1f}")
+
+        self.stdout.write("\nCache hit rates:")
+        for label, model_stats in cache.stats().items():
+            self.stdout.write(f"  {label:<16} hit rate {model_stats['hit_rate']:.1%} "
+                              f"(local {model_stats['local_hits']}, shared {model_stats['shared_hits']}, "
+                              f"misses {model_stats['misses']})")
@@ -0,0 +1,115 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.apps import apps
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+from django.test import override_settings
+
+from Core.models import ActivityLog, Bug, Project
+from Core.sharding import is_sharded, use_shard
+
+# The production SQLite profile (WAL, write lock taken at BEGIN, busy timeout).
+PROFILE = {
+    'ENGINE': 'Server.backends.sqlite3',
+    'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+}
+ROUTERS = ['Core.sharding.WorkspaceRouter']
+
+
+def _connect(directory, shard):
+    alias = f"bench_shard_{shard}"
+    connections.settings[alias] = connections.configure_settings(
+        {'default': {'NAME': os.path.join(directory, f'{alias}.sqlite3'), **PROFILE}}
+    )['default']
+    if hasattr(connections._connections, alias):
+        del connections[alias]
+    return alias
+
+
+def _write_worker(directory, shard, workspace_id, writes, hold, seed):
+    """ Change a bug's status and log it, like a PATCH, on the shard of the writer's workspace.
+
+    `hold` seconds of waiting inside the transaction stand for the rest of the
+    request's time under the write lock (serializers, receivers, round trips).
+    """
+    alias = _connect(directory, shard)
+    rng = random.Random(seed)
+    done = locked = 0
+    with use_shard(alias):
+        bug_ids = list(Bug.objects.filter(project__workspace_id=workspace_id).values_list('pk', flat=True))
+        for _ in range(writes):
+            try:
+                with transaction.atomic(using=alias):
+                    bug = Bug.objects.get(pk=rng.choice(bug_ids))
+                    bug.status = 'in_progress' if bug.status == 'open' else 'open'
+                    bug.save()
+                    time.sleep(hold)
+                    ActivityLog.objects.create(project_id=bug.project_id, bug=bug, message=f"Status set to {bug.status}")
+                done += 1
+            except OperationalError as exc:
+                if 'locked' not in str(exc):
+                    raise
+                locked += 1
+    connections[alias].close()
+    return done, locked
+
+
+class Command(BaseCommand):
+    help = (
+        "Concurrent bug updates from one writer per workspace, with the workspaces spread over 1, 2, 4... "
+        "SQLite shards (temporary files, production profile)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--shards', type=int, action='append', help="Shard counts to compare (repeatable).")
+        parser.add_argument('--workers', type=int, default=8, help="Writer processes, one workspace each.")
+        parser.add_argument('--writes', type=int, default=200, help="Writes per worker.")
+        parser.add_argument('--bugs', type=int, default=2000, help="Bugs per workspace.")
+        parser.add_argument('--hold-ms', type=float, default=2.0,
+                            help="Extra time each transaction keeps the write lock.")
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        counts = options['shards'] or [n for n in (1, 2, 4, 8) if n <= workers]
+        self.stdout.write(f"{'shards':>6}{'writes/s':>10}{'ok':>8}{'locked':>8}{'seconds':>9}{'speedup':>9}")
+        baseline = None
+        with override_settings(DATABASE_ROUTERS=ROUTERS):
+            for count in counts:
+                with tempfile.TemporaryDirectory() as tmp:
+                    for shard in range(count):
+                        self.prepare(tmp, shard, [w for w in range(1, workers + 1) if w % count == shard], options['bugs'])
+                    started = time.perf_counter()
+                    ctx = multiprocessing.get_context('fork')
+                    with ctx.Pool(workers) as pool:
+                        results = pool.starmap(_write_worker, [
+                            (tmp, workspace_id % count, workspace_id, options['writes'], options['hold_ms'] / 1000, workspace_id)
+                            for workspace_id in range(1, workers + 1)
+                        ])
+                    elapsed = time.perf_counter() - started
+                done = sum(r[0] for r in results)
+                locked = sum(r[1] for r in results)
+                rate = done / elapsed
+                baseline = baseline or rate
+                self.stdout.write(
+                    f"{count:>6}{rate:>10.0f}{done:>8}{locked:>8}{elapsed:>9.2f}{rate / baseline:>8.1f}x"
+                )
+
+    def prepare(self, directory, shard, workspace_ids, bugs):
+        """ Create the sharded Core tables and each workspace's project and bugs. """
+        alias = _connect(directory, shard)
+        with connections[alias].schema_editor() as editor:
+            for model in apps.get_app_config('Core').get_models():
+                if is_sharded(model):
+                    editor.create_model(model)
+        with transaction.atomic(using=alias):
+            for workspace_id in workspace_ids:
+                project = Project.objects.using(alias).create(workspace_id=workspace_id, name=f"Bench {workspace_id}")
+                Bug.objects.using(alias).bulk_create([
+                    Bug(project=project, title=f"Bench bug {i}", description="Sharded write benchmark.")
+                    for i in range(bugs)
+                ], batch_size=500)
+        connections[alias].close()
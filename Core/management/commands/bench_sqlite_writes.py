@@ -0,0 +1,93 @@
+import multiprocessing
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import OperationalError, connections, transaction
+
+PROFILES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'OPTIONS': {},
+    },
+    'production': {
+        'ENGINE': 'Server.backends.sqlite3',
+        'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'timeout': 20},
+    },
+}
+
+
+def _connect(profile, name):
+    alias = f"bench_{profile}"
+    connections.settings[alias] = connections.configure_settings(
+        {'default': {'NAME': name, **PROFILES[profile]}}
+    )['default']
+    if hasattr(connections._connections, alias):
+        del connections[alias]
+    return alias
+
+
+def _write_worker(profile, name, writes, rows, seed):
+    """ Read-modify-write bug updates, like a view doing get() then save() in one transaction. """
+    alias = _connect(profile, name)
+    rng = random.Random(seed)
+    done = locked = 0
+    for _ in range(writes):
+        bug_id = rng.randint(1, rows)
+        try:
+            with transaction.atomic(using=alias):
+                with connections[alias].cursor() as cursor:
+                    cursor.execute("SELECT status FROM bench_bug WHERE id = %s", [bug_id])
+                    status = 'open' if cursor.fetchone()[0] == 'closed' else 'closed'
+                    cursor.execute(
+                        "UPDATE bench_bug SET status = %s, updated_at = %s WHERE id = %s",
+                        [status, time.time(), bug_id],
+                    )
+            done += 1
+        except OperationalError as exc:
+            if 'locked' not in str(exc):
+                raise
+            locked += 1
+    connections[alias].close()
+    return done, locked
+
+
+class Command(BaseCommand):
+    help = "Concurrent bug-update benchmark for the default and production SQLite profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=8)
+        parser.add_argument('--writes', type=int, default=300, help="Writes per worker.")
+        parser.add_argument('--rows', type=int, default=10000)
+
+    def handle(self, *args, **options):
+        self.stdout.write(f"{'profile':<12}{'writes/s':>10}{'ok':>8}{'locked':>8}{'seconds':>9}")
+        for profile in PROFILES:
+            with tempfile.TemporaryDirectory() as tmp:
+                name = os.path.join(tmp, 'bench.sqlite3')
+                self.prepare(profile, name, options['rows'])
+                started = time.perf_counter()
+                ctx = multiprocessing.get_context('fork')
+                with ctx.Pool(options['workers']) as pool:
+                    results = pool.starmap(_write_worker, [
+                        (profile, name, options['writes'], options['rows'], seed)
+                        for seed in range(options['workers'])
+                    ])
+                elapsed = time.perf_counter() - started
+            done = sum(r[0] for r in results)
+            locked = sum(r[1] for r in results)
+            self.stdout.write(f"{profile:<12}{done / elapsed:>10.0f}{done:>8}{locked:>8}{elapsed:>9.2f}")
+
+    def prepare(self, profile, name, rows):
+        alias = _connect(profile, name)
+        with transaction.atomic(using=alias), connections[alias].cursor() as cursor:
+            cursor.execute(
+                "CREATE TABLE bench_bug (id INTEGER PRIMARY KEY, status TEXT NOT NULL, updated_at REAL NOT NULL)"
+            )
+            cursor.executemany(
+                "INSERT INTO bench_bug (id, status, updated_at) VALUES (%s, %s, %s)",
+                [(i, 'open', time.time()) for i in range(1, rows + 1)],
+            )
+        connections[alias].close()
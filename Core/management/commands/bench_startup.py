@@ -0,0 +1,103 @@
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+PROFILES = ['full', 'api', 'admin']
+
+# Runs in a fresh interpreter per sample. It times django.setup() plus loading
+# the WSGI handler (middleware) and the URLconf, then sends requests for a
+# trivial view through the handler with and without the profile's middleware.
+CHILD = '''
+import json, os, sys, time, types
+started = time.perf_counter()
+modules_before = len(sys.modules)
+import django
+django.setup()
+from django.core.wsgi import get_wsgi_application
+from django.urls import get_resolver
+handler = get_wsgi_application()
+get_resolver().url_patterns
+startup = time.perf_counter() - started
+modules = len(sys.modules) - modules_before
+google = 'google.auth' in sys.modules
+
+from django.http import HttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import path
+from django.core.handlers.wsgi import WSGIHandler
+urls = types.ModuleType('bench_startup_urls')
+urls.urlpatterns = [path('ping/', lambda request: HttpResponse('ok'))]
+sys.modules[urls.__name__] = urls
+factory = RequestFactory()
+requests = int(os.environ['BENCH_STARTUP_REQUESTS'])
+
+def per_request(handler):
+    elapsed = 0.0
+    for _ in range(requests):
+        request = factory.get('/ping/')
+        request.urlconf = urls.__name__
+        begin = time.perf_counter()
+        response = handler.get_response(request)
+        elapsed += time.perf_counter() - begin
+        assert response.status_code == 200, response.status_code
+    return elapsed / requests
+
+per_request(handler)
+with_middleware = per_request(handler)
+with override_settings(MIDDLEWARE=[]):
+    bare = WSGIHandler()
+per_request(bare)
+without_middleware = per_request(bare)
+from django.conf import settings
+print(json.dumps({
+    'startup': startup, 'modules': modules, 'google': google, 'apps': len(settings.INSTALLED_APPS),
+    'middleware': len(settings.MIDDLEWARE), 'request': with_middleware,
+    'overhead': with_middleware - without_middleware,
+}))
+'''
+
+
+class Command(BaseCommand):
+    help = "Measure cold start time and per-request middleware overhead of each SERVER_PROFILE."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--profile', action='append', choices=PROFILES, help="Profiles to measure (repeatable).")
+        parser.add_argument('--samples', type=int, default=5, help="Fresh processes per profile.")
+        parser.add_argument('--requests', type=int, default=2000, help="Requests per process for the overhead.")
+
+    def handle(self, *args, **options):
+        self.stdout.write(
+            f"{'profile':<8}{'process ms':>11}{'setup ms':>10}{'modules':>9}{'apps':>6}{'middleware':>12}"
+            f"{'request us':>12}{'middleware us':>15}{'google':>8}"
+        )
+        for profile in options['profile'] or PROFILES:
+            samples = [self.sample(profile, options['requests']) for _ in range(options['samples'])]
+            first = samples[0]
+            self.stdout.write(
+                f"{profile:<8}{statistics.median(s['process'] for s in samples) * 1000:>11.0f}"
+                f"{statistics.median(s['startup'] for s in samples) * 1000:>10.0f}{first['modules']:>9}"
+                f"{first['apps']:>6}{first['middleware']:>12}"
+                f"{statistics.median(s['request'] for s in samples) * 1e6:>12.1f}"
+                f"{statistics.median(s['overhead'] for s in samples) * 1e6:>15.1f}"
+                f"{'loaded' if first['google'] else 'lazy':>8}"
+            )
+
+    def sample(self, profile, requests):
+        env = {
+            **os.environ, 'SERVER_PROFILE': profile, 'BENCH_STARTUP_REQUESTS': str(requests),
+            'DJANGO_SETTINGS_MODULE': os.environ.get('DJANGO_SETTINGS_MODULE', 'Server.settings'),
+        }
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD], env=env, cwd=settings.BASE_DIR, capture_output=True, text=True,
+        )
+        elapsed = time.perf_counter() - started
+        if result.returncode:
+            raise RuntimeError(f"{profile} worker failed:\n{result.stderr}")
+        return {**json.loads(result.stdout.strip().splitlines()[-1]), 'process': elapsed}
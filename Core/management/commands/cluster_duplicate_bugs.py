@@ -0,0 +1,88 @@
+import json
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+
+from Core.dedup import cluster_project, get_config, sign, store_signatures
+from Core.models import Bug, Project
+
+
+class Command(BaseCommand):
+    help = (
+        "Sign bugs that have no MinHash signature yet (bugs created with bulk_create, or all of them "
+        "with --rebuild), then group each project's bugs into clusters of likely duplicates."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', help="Only these projects (repeatable).")
+        parser.add_argument('--rebuild', action='store_true', help="Re-sign every bug, e.g. after changing BUG_DEDUP.")
+        parser.add_argument('--threshold', type=float, help="Minimum estimated similarity (default BUG_DEDUP THRESHOLD).")
+        parser.add_argument('--workers', type=int, default=1, help="Processes used to compute signatures.")
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--index-only', action='store_true', help="Update signatures without clustering.")
+        parser.add_argument('--output', help="Write the clusters to this JSON file instead of printing them.")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.order_by('pk')
+        if options['project']:
+            projects = projects.filter(pk__in=options['project'])
+        project_ids = list(projects.values_list('pk', flat=True))
+
+        started = time.perf_counter()
+        signed = self.index(project_ids, options)
+        self.stdout.write(f"Signed {signed} bugs in {time.perf_counter() - started:.1f}s.")
+        if options['index_only']:
+            return
+
+        clusters = {}
+        for project_id in project_ids:
+            started = time.perf_counter()
+            groups = cluster_project(project_id, options['threshold'])
+            clusters[project_id] = groups
+            self.stdout.write(
+                f"Project {project_id}: {len(groups)} clusters covering "
+                f"{sum(len(g) for g in groups)} bugs ({time.perf_counter() - started:.1f}s)."
+            )
+        if options['output']:
+            with open(options['output'], 'w') as fh:
+                json.dump({str(k): v for k, v in clusters.items()}, fh, indent=2)
+        else:
+            for project_id, groups in clusters.items():
+                for group in groups:
+                    self.stdout.write(f"  project {project_id}: {', '.join(map(str, group))}")
+
+    def index(self, project_ids, options):
+        config = get_config()
+        bugs = Bug.objects.filter(project_id__in=project_ids).order_by('pk')
+        if not options['rebuild']:
+            bugs = bugs.filter(signature__isnull=True)
+        rows = bugs.values_list('pk', 'project_id', 'title', 'description')
+        batch_size = options['batch_size']
+
+        def batches():
+            batch = []
+            for row in rows.iterator(chunk_size=batch_size):
+                batch.append(row)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+            if batch:
+                yield batch
+
+        signed = 0
+        if options['workers'] > 1:
+            # Executor.map would queue every batch up front; keep a few in flight instead.
+            with ProcessPoolExecutor(options['workers']) as pool:
+                pending = deque()
+                for batch in batches():
+                    pending.append(pool.submit(sign, batch, config))
+                    if len(pending) >= options['workers'] * 2:
+                        signed += store_signatures(pending.popleft().result(), config)
+                while pending:
+                    signed += store_signatures(pending.popleft().result(), config)
+        else:
+            for batch in batches():
+                signed += store_signatures(sign(batch, config), config)
+        return signed
@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Core.notifications import flush
+
+
+class Command(BaseCommand):
+    help = (
+        "Merge buffered bug notifications into one digest per user and bug once the oldest is --window "
+        "seconds old, and queue one email per user. Run it on a schedule, one instance at a time."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--window', type=int, default=settings.NOTIFICATION_DIGEST_WINDOW,
+                            help="Seconds to wait for more changes to a bug before notifying (0: flush everything).")
+        parser.add_argument('--batch-size', type=int, default=settings.NOTIFICATION_FLUSH_BATCH_SIZE,
+                            help="(user, bug) pairs per transaction.")
+
+    def handle(self, *args, **options):
+        merged, notifications, emails = flush(options['window'], options['batch_size'])
+        self.stdout.write(self.style.SUCCESS(
+            f"Merged {merged} events into {notifications} notifications; queued {emails} emails."
+        ))
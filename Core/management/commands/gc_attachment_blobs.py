@@ -0,0 +1,20 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Core.attachments import collect_garbage
+
+
+class Command(BaseCommand):
+    help = "Delete attachment blobs no attachment refers to, orphaned blob files and stale temp uploads."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.ATTACHMENT_GC_GRACE_SECONDS,
+                            help="Leave anything younger than this many seconds alone.")
+        parser.add_argument('--dry-run', action='store_true')
+
+    def handle(self, *args, **options):
+        removed, orphans, freed = collect_garbage(options['grace'], options['dry_run'])
+        verb = "Would remove" if options['dry_run'] else "Removed"
+        self.stdout.write(self.style.SUCCESS(
+            f"{verb} {removed} unreferenced blobs and {orphans} orphaned files ({freed / 1024 / 1024:.1f} MiB)."
+        ))
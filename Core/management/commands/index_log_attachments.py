@@ -0,0 +1,31 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from Core.logindex import index_blob, pending_blobs
+from Core.models import AttachmentBlob
+
+
+class Command(BaseCommand):
+    help = "Build the compressed search index for text attachments that do not have one yet."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--max-size', type=int, help="Skip attachments larger than this many bytes.")
+        parser.add_argument('--rebuild', action='store_true', help="Re-index blobs that already have an index.")
+        parser.add_argument('--codec', choices=['zstd', 'gzip'])
+
+    def handle(self, *args, **options):
+        blobs = pending_blobs(options['max_size'])
+        if options['rebuild']:
+            blobs = blobs | AttachmentBlob.objects.filter(log_index__isnull=False)
+        indexed = original = compressed = 0
+        started = time.perf_counter()
+        for blob in blobs.iterator():
+            index = index_blob(blob, codec=options['codec'])
+            indexed, original, compressed = indexed + 1, original + blob.size, compressed + index.compressed_size
+            self.stdout.write(f"{blob.sha256[:12]}  {index.line_count} lines in {index.block_count} blocks")
+        ratio = original / compressed if compressed else 0
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {indexed} blobs ({original / 1024 / 1024:.1f} MiB, {ratio:.1f}x compression) "
+            f"in {time.perf_counter() - started:.1f}s."
+        ))
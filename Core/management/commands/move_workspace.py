@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.models import Workspace
+from Core.sharding import databases, move_workspace, shard_for
+
+
+class Command(BaseCommand):
+    help = (
+        "Copy a workspace's Core data to another database in WORKSPACE_SHARDS (or back to 'default'), "
+        "switch the shard map to it and delete the old copy. Writes to the workspace get 503 meanwhile."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('workspace', type=int, help="Workspace id.")
+        parser.add_argument('database', help="Database alias to move it to.")
+        parser.add_argument('--batch-size', type=int, default=1000, help="Rows per INSERT.")
+
+    def handle(self, *args, **options):
+        workspace = Workspace.objects.filter(pk=options['workspace']).first()
+        if workspace is None:
+            raise CommandError(f"Workspace {options['workspace']} does not exist.")
+        target = options['database']
+        if target not in databases():
+            raise CommandError(f"{target!r} is not a workspace database; choose from {', '.join(databases())}.")
+        source = shard_for(workspace.pk)
+        if source == target:
+            raise CommandError(f"{workspace} is already on {target!r}.")
+
+        copy = move_workspace(workspace.pk, target, options['batch_size'])
+        for model, count in copy.counts.items():
+            skipped = copy.skipped.get(model)
+            self.stdout.write(f"{model._meta.label:<24}{count:>10}" + (f"  ({skipped} skipped)" if skipped else ""))
+        self.stdout.write(self.style.SUCCESS(f"Moved {workspace} from {source!r} to {target!r}."))
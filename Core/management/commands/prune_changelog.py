@@ -0,0 +1,23 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from Core.changelog import prune
+from Core.sharding import databases, use_shard
+
+
+class Command(BaseCommand):
+    help = "Delete delta-sync change log entries; clients that last synced before them must resync in full."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--days', type=int, default=settings.CHANGELOG_RETENTION_DAYS,
+                            help="Keep entries recorded in the last this many days.")
+
+    def handle(self, *args, **options):
+        deleted = 0
+        for using in databases():
+            with use_shard(using):
+                deleted += prune(timezone.now() - timedelta(days=options['days']))
+        self.stdout.write(self.style.SUCCESS(f"Removed {deleted} change log entries."))
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.models import Workspace
+from Core.purge import PurgeError, plan, purge_workspace
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete a workspace with its users and all their Core data using chunked raw DELETEs instead of "
+        "Django's in-memory cascade. Safe to run again if interrupted."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('workspace', type=int, help="Workspace id.")
+        parser.add_argument('--chunk-size', type=int, help="Ids per DELETE (default: PURGE_CHUNK_SIZE).")
+        parser.add_argument('--dry-run', action='store_true', help="Only print the order tables are purged in.")
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            for depth, label, field, on_delete in plan():
+                self.stdout.write(f"{'  ' * depth}{label}.{field} {on_delete}")
+            return
+        workspace = Workspace.objects.filter(pk=options['workspace']).first()
+        if workspace is None:
+            raise CommandError(f"Workspace {options['workspace']} does not exist.")
+
+        def progress(label, deleted):
+            self.stdout.write(f"{label:<40}{deleted:>12}", ending='\r')
+
+        try:
+            result = purge_workspace(workspace.pk, options['chunk_size'], progress)
+        except PurgeError as exc:
+            raise CommandError(str(exc))
+        self.stdout.write(' ' * 52, ending='\r')
+        for label, count in sorted(result.deleted.items()):
+            self.stdout.write(f"{label:<40}{count:>12}")
+        for label, count in sorted(result.nulled.items()):
+            self.stdout.write(f"{label:<40}{count:>12}  set to null")
+        if result.cleanup is not None:
+            removed, freed = result.cleanup.result()
+            self.stdout.write(f"Removed {removed} attachment blobs ({freed / 1024 / 1024:.1f} MiB).")
+        self.stdout.write(self.style.SUCCESS(f"Purged {workspace}."))
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from Core.models import Bug
+from Core.sharding import databases, use_shard
+from Core.triage import rescore
+
+
+class Command(BaseCommand):
+    help = (
+        "Recompute the stored triage score of every bug, e.g. after migrating or changing the TRIAGE_* "
+        "weights. Only rows whose score changes are written."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, help="Only this project's bugs.")
+        parser.add_argument('--batch-size', type=int, default=settings.TRIAGE_RESCORE_BATCH_SIZE,
+                            help="Bugs per query.")
+
+    def handle(self, *args, **options):
+        total = 0
+        for using in databases():
+            with use_shard(using):
+                bugs = Bug.objects.all()
+                if options['project']:
+                    bugs = bugs.filter(project_id=options['project'])
+                changed = rescore(bugs, options['batch_size'])
+            total += changed
+            self.stdout.write(f"{using}: {changed}")
+        self.stdout.write(self.style.SUCCESS(f"Rescored {total} bugs."))
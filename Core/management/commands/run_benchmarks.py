@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.test import override_settings
+
+from Core import cache
+from Core.benchmarks import harness, orm, endpoints  # noqa: F401 (registers benchmarks)
+from Core.benchmarks.context import BenchmarkContext
+from Core.benchmarks.seed import SCALES, Seeder
+
+
+class Command(BaseCommand):
+    help = (
+        "Seed a synthetic tenant, run the ORM, request and admin benchmarks, and save the results as JSON. "
+        "The seeded data is rolled back afterwards."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small')
+        parser.add_argument('--group', action='append', help="Only run these groups (orm, request, admin).")
+        parser.add_argument('--filter', default='', help="Only run benchmarks whose name contains this.")
+        parser.add_argument('--repeat', type=int, help="Override every benchmark's repeat count.")
+        parser.add_argument('--output', help="Write results to this JSON file.")
+        parser.add_argument('--compare', help="Baseline JSON file to compare against.")
+        parser.add_argument('--threshold', type=float, default=0.10, help="Allowed slowdown before flagging.")
+        parser.add_argument('--fail-on-regression', action='store_true')
+
+    def handle(self, *args, **options):
+        benchmarks = [b for b in harness.registered(options['group']) if options['filter'] in b.name]
+        if not benchmarks:
+            raise CommandError("No benchmarks selected.")
+
+        results = {}
+        with override_settings(EMAIL_BACKEND='django.core.mail.backends.locmem.EmailBackend'):
+            with transaction.atomic():
+                context = BenchmarkContext(Seeder(options['scale']).run())
+                for bench in benchmarks:
+                    results[bench.name] = harness.run_benchmark(bench, context, options['repeat'])
+                    result = results[bench.name]
+                    self.stdout.write(
+                        f"{bench.name:<32}{result['median_ms']:>10.2f} ms{result['p95_ms']:>10.2f} ms p95"
+                        f"{result['queries']:>8} queries"
+                    )
+                transaction.set_rollback(True)
+        cache.invalidate_all()
+
+        if options['output']:
+            harness.save_results(options['output'], harness.environment(options['scale']), results)
+            self.stdout.write(f"Results written to {options['output']}")
+        if options['compare']:
+            self.report(harness.load_results(options['compare'])['results'], results, options)
+
+    def report(self, baseline, results, options):
+        regressions = 0
+        self.stdout.write(f"\n{'benchmark':<32}{'baseline':>10}{'current':>10}{'change':>9}")
+        for name, before, after, change, regressed in harness.compare(baseline, results, options['threshold']):
+            regressions += regressed
+            line = f"{name:<32}{before:>10.2f}{after:>10.2f}{change:>+9.1%}"
+            self.stdout.write(self.style.ERROR(line) if regressed else line)
+        if regressions and options['fail_on_regression']:
+            raise CommandError(f"{regressions} benchmark(s) regressed.")
@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+
+from Core.benchmarks.seed import SCALES, Seeder
+
+
+class Command(BaseCommand):
+    help = "Populate the database with a synthetic tenant for benchmarking."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--scale', choices=list(SCALES), default='small')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='bench')
+        for name in SCALES['small']:
+            parser.add_argument(f"--{name.replace('_', '-')}", type=int, dest=name)
+
+    def handle(self, *args, **options):
+        overrides = {name: options[name] for name in SCALES['small'] if options[name] is not None}
+        seeder = Seeder(options['scale'], seed=options['seed'], prefix=options['prefix'], **overrides).run()
+        self.stdout.write(self.style.SUCCESS(
+            f"Seeded {len(seeder.workspaces)} workspaces, {len(seeder.projects)} projects, "
+            f"{len(seeder.users)} users and {len(seeder.bugs)} bugs."
+        ))
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from Core.github.client import GitHubError
+from Core.github.sync import sync_projects
+from Core.models import Project
+
+
+class Command(BaseCommand):
+    help = "Mirror GitHub issues into bugs for projects with a github_repo, fetching only what changed since the last run."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--project', type=int, action='append', help="Only these projects (repeatable).")
+        parser.add_argument('--full', action='store_true', help="Ignore the saved cursor and ETag and fetch everything.")
+        parser.add_argument('--base-url', help="API root, e.g. a local fake server (default GITHUB_API_URL).")
+        parser.add_argument('--concurrency', type=int, help="Page requests in flight (default GITHUB_SYNC_CONCURRENCY).")
+
+    def handle(self, *args, **options):
+        projects = Project.objects.exclude(github_repo__isnull=True).exclude(github_repo='').order_by('pk')
+        if options['project']:
+            projects = projects.filter(pk__in=options['project'])
+        try:
+            results = sync_projects(
+                projects, options['full'], base_url=options['base_url'], concurrency=options['concurrency'],
+            )
+        except GitHubError as exc:
+            raise CommandError(str(exc))
+        for result in results:
+            if result.not_modified:
+                self.stdout.write(f"Project {result.project_id}: not modified.")
+            else:
+                self.stdout.write(
+                    f"Project {result.project_id}: {result.issues} issues from {result.pages} pages "
+                    f"in {result.seconds:.1f}s."
+                )
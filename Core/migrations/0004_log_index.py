@@ -0,0 +1,26 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0003_attachment_blobs'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LogIndex',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='log_index', serialize=False, to='Core.attachmentblob')),
+                ('codec', models.CharField(max_length=10)),
+                ('line_count', models.BigIntegerField()),
+                ('block_count', models.PositiveIntegerField()),
+                ('compressed_size', models.BigIntegerField()),
+                ('complete_vocabulary', models.BooleanField(default=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
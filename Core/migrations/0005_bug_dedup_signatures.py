@@ -0,0 +1,36 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0004_log_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BugSignature',
+            fields=[
+                ('bug', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='signature', serialize=False, to='Core.bug')),
+                ('text_hash', models.CharField(max_length=32)),
+                ('minhash', models.BinaryField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.project')),
+            ],
+        ),
+        migrations.CreateModel(
+            name='BugLSHBand',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('band', models.PositiveSmallIntegerField()),
+                ('bucket', models.BigIntegerField()),
+                ('bug', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.bug')),
+                ('project', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='+', to='Core.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'band', 'bucket'], name='Core_buglsh_project_a7aba8_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.6 on 2026-10-19 13:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0005_bug_dedup_signatures'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='GitHubSyncState',
+            fields=[
+                ('project', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='github_sync', serialize=False, to='Core.project')),
+                ('since', models.DateTimeField(blank=True, null=True)),
+                ('etag', models.CharField(blank=True, max_length=255)),
+                ('last_synced_at', models.DateTimeField(blank=True, null=True)),
+                ('issues_synced', models.PositiveIntegerField(default=0)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='bug',
+            name='github_issue_number',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='bug',
+            constraint=models.UniqueConstraint(fields=('project', 'github_issue_number'), name='unique_project_github_issue'),
+        ),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:07
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0009_workspace_shards'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ArchivedBug',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('bug_id', models.BigIntegerField(unique=True)),
+                ('title', models.CharField(max_length=255)),
+                ('closed_at', models.DateTimeField()),
+                ('archived_at', models.DateTimeField(auto_now_add=True)),
+                ('data', models.BinaryField()),
+                ('project', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='archived_bugs', to='Core.project')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['project', 'closed_at'], name='Core_archiv_project_35b4e9_idx')],
+            },
+        ),
+    ]
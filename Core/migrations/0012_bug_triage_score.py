@@ -0,0 +1,24 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:17
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0011_notification_digests'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bug',
+            name='triage_score',
+            field=models.FloatField(default=0, editable=False),
+        ),
+        migrations.AddIndex(
+            model_name='bug',
+            index=models.Index(fields=['project', 'status', '-triage_score', '-id'], name='bug_triage_queue'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:19
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0012_bug_triage_score'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='bug',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='project',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+        migrations.AddField(
+            model_name='sprint',
+            name='version',
+            field=models.PositiveIntegerField(default=1, editable=False),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.6 on 2026-10-19 14:51
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+def backfill_triage_scores(apps, schema_editor):
+    """ Score the bugs that existed before 0012 added the column, TRIAGE_RESCORE_BATCH_SIZE at a time. """
+    from Core.triage import rescore
+
+    Bug = apps.get_model('Core', 'Bug')
+    rescore(Bug.objects.using(schema_editor.connection.alias).all())
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('Core', '0013_versions'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='bug',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now, editable=False),
+        ),
+        migrations.RunPython(backfill_triage_scores, migrations.RunPython.noop),
+    ]
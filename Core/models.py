@@ -1,8 +1,14 @@
 from django.db import models
+from django.utils import timezone
 from datetime import timedelta
 from Auth.models import User
+from .cache import related
+from .versioning import VersionedModel
 
 # --------------------------- 1️⃣ Workspace, Teams & Workers --------------------------- #
+# Foreign keys to User and Workspace have no database constraint: with workspace
+# sharding (Core/sharding.py) those two tables stay on the control database while
+# the rest of Core can live on a shard.
 class Workspace(models.Model):
     name = models.CharField(max_length=255, unique=True)
     description = models.TextField(blank=True, null=True)
@@ -11,26 +17,36 @@ class Workspace(models.Model):
     def __str__(self):
         return self.name
 
+class WorkspaceShard(models.Model):
+    """ The database holding a workspace's Core data; workspaces without a row are on 'default'. """
+    workspace = models.OneToOneField(Workspace, on_delete=models.CASCADE, primary_key=True, related_name="shard")
+    alias = models.CharField(max_length=100)
+    moving = models.BooleanField(default=False)
+    moved_at = models.DateTimeField(null=True, blank=True)
+
+    def __str__(self):
+        return f"{self.workspace_id} on {self.alias}"
+
 class Team(models.Model):
-    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name="teams")
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, db_constraint=False, related_name="teams")
     name = models.CharField(max_length=255)
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return f"{self.name} ({self.workspace.name})"
+        return f"{self.name} ({related(self, 'workspace').name})"
 
 class Worker(models.Model):
-    user = models.OneToOneField(User, on_delete=models.CASCADE)
+    user = models.OneToOneField(User, on_delete=models.CASCADE, db_constraint=False)
     team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name="workers")
     role = models.CharField(max_length=50, choices=[("developer", "Developer"), ("tester", "Tester")], default="developer")
     joined_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
-        return self.user.username
+        return self.user.email
 
 # --------------------------- 2️⃣ Project & Sprint Management --------------------------- #
-class Project(models.Model):
-    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, related_name="projects")
+class Project(VersionedModel):
+    workspace = models.ForeignKey(Workspace, on_delete=models.CASCADE, db_constraint=False, related_name="projects")
     name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     github_repo = models.URLField(blank=True, null=True)
@@ -38,9 +54,9 @@ class Project(models.Model):
     assigned_team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name="projects")
 
     def __str__(self):
-        return f"{self.name} ({self.workspace.name})"
+        return f"{self.name} ({related(self, 'workspace').name})"
 
-class Sprint(models.Model):
+class Sprint(VersionedModel):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="sprints")
     name = models.CharField(max_length=255)
     start_date = models.DateField()
@@ -48,7 +64,7 @@ class Sprint(models.Model):
     is_active = models.BooleanField(default=True)
 
     def __str__(self):
-        return f"{self.project.name} - {self.name}"
+        return f"{related(self, 'project').name} - {self.name}"
 
 # --------------------------- 3️⃣ Bug Tracking --------------------------- #
 class Tag(models.Model):
@@ -57,7 +73,7 @@ class Tag(models.Model):
     def __str__(self):
         return self.name
 
-class Bug(models.Model):
+class Bug(VersionedModel):
     STATUS_CHOICES = [
         ('open', 'Open'),
         ('in_progress', 'In Progress'),
@@ -89,62 +105,213 @@ class Bug(models.Model):
     assigned_team = models.ForeignKey(Team, on_delete=models.SET_NULL, null=True, blank=True, related_name="bugs")
     assigned_worker = models.ForeignKey(Worker, on_delete=models.SET_NULL, null=True, blank=True, related_name="bugs")
     github_issue_url = models.URLField(blank=True, null=True)
+    github_issue_number = models.PositiveIntegerField(null=True, blank=True)
     sprint = models.ForeignKey(Sprint, on_delete=models.SET_NULL, null=True, blank=True, related_name="bugs")
     dependencies = models.ManyToManyField("self", symmetrical=False, blank=True, related_name="blocked_by")
-    reported_by = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, related_name="reported_bugs")
-    created_at = models.DateTimeField(auto_now_add=True)
+    reported_by = models.ForeignKey(
+        User, on_delete=models.SET_NULL, db_constraint=False, null=True, blank=True, related_name="reported_bugs",
+    )
+    # Set when the instance is made rather than at INSERT, so the triage score computed in pre_save sees it.
+    created_at = models.DateTimeField(default=timezone.now, editable=False, db_index=True)
     updated_at = models.DateTimeField(auto_now=True)
     resolved_at = models.DateTimeField(null=True, blank=True)
+    triage_score = models.FloatField(default=0, editable=False)  # See Core/triage.py.
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['project', 'github_issue_number'], name='unique_project_github_issue'),
+        ]
+        indexes = [
+            models.Index(fields=['project', 'status', '-triage_score', '-id'], name='bug_triage_queue'),
+        ]
 
     def __str__(self):
-        return f"{self.title} ({self.project.name})"
+        return f"{self.title} ({related(self, 'project').name})"
     
     
 
 # --------------------------- 4️⃣ Bug Attachments --------------------------- #
+class AttachmentBlob(models.Model):
+    """ One stored file, shared by every attachment with the same content. """
+    sha256 = models.CharField(max_length=64, primary_key=True)
+    size = models.BigIntegerField()
+    mime_type = models.CharField(max_length=100)
+    ref_count = models.PositiveIntegerField(default=0, db_index=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return self.sha256
+
+
+class LogIndex(models.Model):
+    """ Compressed, block-indexed copy of a text blob, used for grep-style search. """
+    blob = models.OneToOneField(AttachmentBlob, on_delete=models.CASCADE, primary_key=True, related_name="log_index")
+    codec = models.CharField(max_length=10)
+    line_count = models.BigIntegerField()
+    block_count = models.PositiveIntegerField()
+    compressed_size = models.BigIntegerField()
+    complete_vocabulary = models.BooleanField(default=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"{self.blob_id} ({self.codec}, {self.block_count} blocks)"
+
+
 class BugAttachment(models.Model):
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name="attachments")
     file = models.FileField(upload_to="bug_attachments/")
-    uploaded_at = models.DateTimeField(auto_now_add=True)
+    blob = models.ForeignKey(AttachmentBlob, on_delete=models.PROTECT, null=True, blank=True, related_name="attachments")
+    name = models.CharField(max_length=255, blank=True)
+    size = models.BigIntegerField(null=True, blank=True, db_index=True)
+    mime_type = models.CharField(max_length=100, blank=True, db_index=True)
+    uploaded_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return self.name or self.file.name
+
+
+
+# --------------------------- 5️⃣ Duplicate Detection --------------------------- #
+class BugSignature(models.Model):
+    """ MinHash signature of a bug's title and description, used to find near-duplicates. """
+    bug = models.OneToOneField(Bug, on_delete=models.CASCADE, primary_key=True, related_name="signature")
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="+")
+    text_hash = models.CharField(max_length=32)
+    minhash = models.BinaryField()
+
+    def __str__(self):
+        return f"Signature of bug {self.bug_id}"
+
+
+class BugLSHBand(models.Model):
+    """ One LSH band of a bug's signature; bugs sharing a (band, bucket) are duplicate candidates. """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="+", db_index=False)
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name="+")
+    band = models.PositiveSmallIntegerField()
+    bucket = models.BigIntegerField()
 
+    class Meta:
+        indexes = [models.Index(fields=['project', 'band', 'bucket'])]
 
+    def __str__(self):
+        return f"Bug {self.bug_id} band {self.band}"
+
+
+
+# --------------------------- 6️⃣ Bug Archive --------------------------- #
+class ArchivedBug(models.Model):
+    """ A closed bug moved out of the hot tables by Core.archive, with its children as one compressed blob. """
+    bug_id = models.BigIntegerField(unique=True)
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="archived_bugs")
+    title = models.CharField(max_length=255)
+    closed_at = models.DateTimeField()
+    archived_at = models.DateTimeField(auto_now_add=True)
+    data = models.BinaryField()
+
+    class Meta:
+        indexes = [models.Index(fields=['project', 'closed_at'])]
+
+    def __str__(self):
+        return f"Archived bug {self.bug_id}: {self.title}"
 
-# --------------------------- 5️⃣ Activity Logs & Notifications --------------------------- #
+
+
+# --------------------------- 7️⃣ Saved Filters --------------------------- #
+class SavedFilter(models.Model):
+    """ A named bug query written in the filter DSL of Core.saved_filters. """
+    project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="saved_filters")
+    owner = models.ForeignKey(
+        User, on_delete=models.SET_NULL, db_constraint=False, null=True, blank=True, related_name="saved_filters",
+    )
+    name = models.CharField(max_length=100)
+    query = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.name} ({related(self, 'project').name})"
+
+
+
+# --------------------------- 8️⃣ GitHub Sync --------------------------- #
+class GitHubSyncState(models.Model):
+    """ Where the last GitHub issue sync of a project stopped. """
+    project = models.OneToOneField(Project, on_delete=models.CASCADE, primary_key=True, related_name="github_sync")
+    since = models.DateTimeField(null=True, blank=True)
+    etag = models.CharField(max_length=255, blank=True)
+    last_synced_at = models.DateTimeField(null=True, blank=True)
+    issues_synced = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f"GitHub sync of project {self.project_id} (since {self.since})"
+
+
+
+# --------------------------- 9️⃣ Delta Sync --------------------------- #
+class ChangeLog(models.Model):
+    """ One change to a Bug, Sprint, Project or Tag; `seq` orders every change for delta sync. """
+    seq = models.BigAutoField(primary_key=True)
+    model = models.CharField(max_length=10)
+    object_id = models.BigIntegerField()
+    # Not a real foreign key: entries outlive deleted projects as tombstones.
+    project = models.ForeignKey(
+        Project, on_delete=models.DO_NOTHING, db_constraint=False, null=True, blank=True, related_name="+",
+    )
+    recorded_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"#{self.seq} {self.model} {self.object_id}"
+
+
+
+# --------------------------- 🔟 Activity Logs & Notifications --------------------------- #
 class ActivityLog(models.Model):
     project = models.ForeignKey(Project, on_delete=models.CASCADE, related_name="activity_logs")
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name="activity_logs", null=True, blank=True)
     worker = models.ForeignKey(Worker, on_delete=models.SET_NULL, null=True, blank=True, related_name="activities")
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
         return f"{self.message} - {self.created_at}"
-    
 
 
 class Notification(models.Model):
-    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="notifications")
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name="notifications")
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, null=True, blank=True, related_name="notifications")
     message = models.TextField()
+    event_count = models.PositiveIntegerField(default=1)
     is_read = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
 
     def __str__(self):
-        return f"{self.user.username}: {self.message[:30]}"
-    
+        return f"{self.user.email}: {self.message[:30]}"
 
 
-# --------------------------- 6️⃣ Time Tracking --------------------------- #
+class NotificationEvent(models.Model):
+    """ A change to a bug waiting to be merged into its watcher's digest Notification (see Core/notifications.py). """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, db_constraint=False, related_name="notification_events")
+    bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name="notification_events")
+    message = models.TextField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.user_id} / {self.bug_id}: {self.message[:30]}"
+
+
+
+# --------------------------- 1️⃣1️⃣ Time Tracking --------------------------- #
 class TimeTracking(models.Model):
     bug = models.ForeignKey(Bug, on_delete=models.CASCADE, related_name="time_tracking")
     worker = models.ForeignKey(Worker, on_delete=models.CASCADE, related_name="time_spent")
     time_spent = models.DurationField(default=timedelta())
 
     def __str__(self):
-        return f"{self.worker.user.username} - {self.bug.title}: {self.time_spent}"
-    
+        return f"{related(self, 'worker')} - {self.bug.title}: {self.time_spent}"
+
 
 
-# --------------------------- 7️⃣ Workflow Automation --------------------------- #
+# --------------------------- 1️⃣2️⃣ Workflow Automation --------------------------- #
 def auto_close_resolved_bugs(sender, instance, **kwargs):
     """ Automatically close resolved bugs after 7 days. """
     if instance.status == "resolved":
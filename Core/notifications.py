@@ -0,0 +1,203 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import router, transaction
+from django.db.models import Max, Min
+from django.db.models.signals import post_init, post_save
+from django.utils import timezone
+
+from Auth.models import QueuedEmail, User
+from Auth.utils import queue_email
+from . import cache, sharding
+from .bulk import describe
+from .models import Bug, Notification, NotificationEvent, Sprint, Worker
+from .signals import bugs_bulk_updated
+
+# --------------------------- Notification digests --------------------------- #
+# A burst of edits to one bug used to mean a Notification row (and an email)
+# per edit and watcher. notify() records a NotificationEvent per watcher
+# instead. flush(), run on a schedule by `manage.py flush_notifications`,
+# merges the events of each (user, bug) pair into one digest Notification
+# once the oldest of them is NOTIFICATION_DIGEST_WINDOW seconds old. It
+# handles NOTIFICATION_FLUSH_BATCH_SIZE pairs per transaction with
+# bulk_create and one DELETE, and then queues one email per user listing all
+# of that user's new digests in the Auth outbox, which `send_queued_emails`
+# sends. A notification is therefore at most the window plus the schedule
+# interval late.
+#
+# Watchers of a bug are its reporter and its assignee (the previous one too,
+# when the bug is reassigned), except whoever made the change: the view that
+# saves a bug sets `bug.changed_by` to the editing user. Saving a bug records
+# an event when a watched field changes, and bulk updates record one per
+# changed bug and watcher through `bugs_bulk_updated` (see Core/bulk.py), so
+# both end up in the same digests.
+
+WATCHED = ('title', 'status', 'severity', 'priority', 'sprint_id', 'assigned_worker_id')
+
+
+def notify(user_ids, bug, message, changed_by=None):
+    """ Queue `message` about `bug` for each user but the one who made the change, for the next digest. """
+    NotificationEvent.objects.bulk_create([
+        NotificationEvent(user_id=user_id, bug_id=bug.pk, message=message)
+        for user_id in sorted(set(user_ids) - {None, getattr(changed_by, 'pk', None)})
+    ])
+
+
+def digest(title, messages):
+    """ The message of a digest Notification: the event itself, or a summary of several. """
+    if len(messages) == 1:
+        return messages[0]
+    lines = list(dict.fromkeys(messages))
+    shown = settings.NOTIFICATION_DIGEST_MAX_LINES
+    summary = '; '.join(lines[:shown])
+    if len(lines) > shown:
+        summary += f"; and {len(lines) - shown} more"
+    return f"{len(messages)} updates to \"{title}\": {summary}."
+
+
+def _events(groups):
+    """ {(user id, bug id): [event]} of `groups`, up to the last event id each group had when it was selected. """
+    last = {(group['user_id'], group['bug_id']): group['last'] for group in groups}
+    events = NotificationEvent.objects.filter(
+        user_id__in={user_id for user_id, _ in last}, bug_id__in={bug_id for _, bug_id in last},
+        pk__lte=max(last.values()),
+    ).order_by('pk')
+    grouped = {}
+    for event in events:
+        key = (event.user_id, event.bug_id)
+        if event.pk <= last.get(key, 0):
+            grouped.setdefault(key, []).append(event)
+    return grouped
+
+
+def _flush(cutoff, batch_size, digests):
+    """ flush() on the current database; adds the new notifications to `digests` and returns the events merged. """
+    due = NotificationEvent.objects.values('user_id', 'bug_id').annotate(
+        first=Min('created_at'), last=Max('pk'),
+    ).filter(first__lte=cutoff).order_by('first')
+    merged = 0
+    while True:
+        groups = list(due[:batch_size])
+        if not groups:
+            return merged
+        with transaction.atomic(using=router.db_for_write(NotificationEvent)):
+            grouped = _events(groups)
+            titles = dict(Bug.objects.filter(pk__in={bug_id for _, bug_id in grouped}).values_list('pk', 'title'))
+            notifications = Notification.objects.bulk_create([
+                Notification(
+                    user_id=user_id, bug_id=bug_id, event_count=len(events),
+                    message=digest(titles[bug_id], [event.message for event in events]),
+                )
+                for (user_id, bug_id), events in grouped.items() if bug_id in titles
+            ], batch_size=batch_size)
+            ids = [event.pk for events in grouped.values() for event in events]
+            NotificationEvent.objects.filter(pk__in=ids).delete()
+        merged += len(ids)
+        for notification in notifications:
+            digests.setdefault(notification.user_id, []).append(notification)
+
+
+def flush(window=None, batch_size=None):
+    """ Merge due events into digest notifications on every database and email them.
+
+    Returns (events merged, notifications created, emails queued).
+    """
+    window = settings.NOTIFICATION_DIGEST_WINDOW if window is None else window
+    batch_size = batch_size or settings.NOTIFICATION_FLUSH_BATCH_SIZE
+    cutoff = timezone.now() - timedelta(seconds=window)
+    digests, merged = {}, 0
+    for using in sharding.databases():
+        with sharding.use_shard(using):
+            merged += _flush(cutoff, batch_size, digests)
+    emails = [
+        _email(email, digests[user_id])
+        for user_id, email in User.objects.filter(pk__in=digests, is_active=True).values_list('pk', 'email')
+    ]
+    QueuedEmail.objects.bulk_create(emails, batch_size=batch_size)
+    return merged, sum(len(notifications) for notifications in digests.values()), len(emails)
+
+
+def _email(email, notifications):
+    count = sum(notification.event_count for notification in notifications)
+    subject = f"{count} update{'s' if count != 1 else ''} to {len(notifications)} of your bugs"
+    body = '\n'.join(f"- {notification.message}" for notification in notifications)
+    return queue_email(email, subject, body)
+
+
+# --------------------------- Signal receivers --------------------------- #
+
+def _watched(bug):
+    """ The watched field values, or None when some are deferred. """
+    if not all(name in bug.__dict__ for name in WATCHED):
+        return None
+    return {name: bug.__dict__[name] for name in WATCHED}
+
+
+def remember_watched(sender, instance, **kwargs):
+    instance._notification_state = _watched(instance)
+
+
+def _labels(changes):
+    labels = {}
+    for column, model in (('sprint_id', Sprint), ('assigned_worker_id', Worker)):
+        ids = [value for value in changes.get(column, ()) if value is not None]
+        if ids:
+            labels[column] = {pk: str(obj) for pk, obj in cache.get_many(model, ids).items()}
+    return labels
+
+
+def _user_ids(worker_ids):
+    workers = cache.get_many(Worker, [pk for pk in worker_ids if pk is not None])
+    return [worker.user_id for worker in workers.values()]
+
+
+def bug_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    old, new = getattr(instance, '_notification_state', None), _watched(instance)
+    instance._notification_state = new
+    if raw or new is None:
+        return
+    changed_by = getattr(instance, 'changed_by', None)
+    if created:
+        if instance.assigned_worker_id is not None:
+            notify(
+                _user_ids([instance.assigned_worker_id]), instance, f"You were assigned \"{instance.title}\".",
+                changed_by,
+            )
+        return
+    if old is None:
+        return
+    changes = {name: (old[name], new[name]) for name in WATCHED if old[name] != new[name]}
+    if not changes:
+        return
+    watchers = [instance.reported_by_id, *_user_ids(changes.get('assigned_worker_id', [new['assigned_worker_id']]))]
+    notify(watchers, instance, describe(changes, _labels(changes)), changed_by)
+
+
+def bugs_updated_in_bulk(sender, bug_ids, changes, changed_by=None, **kwargs):
+    """ notify() for each bug of a bulk update, with one query per chunk of bugs and one insert. """
+    values = {}
+    for diff in changes.values():
+        for column, pair in diff.items():
+            values.setdefault(column, set()).update(pair)
+    labels = _labels(values)
+    size = settings.BUG_BULK_CHUNK_SIZE
+    watched, worker_ids = {}, set()
+    for start in range(0, len(bug_ids), size):
+        rows = Bug.objects.filter(pk__in=bug_ids[start:start + size])
+        for pk, reported_by_id, assigned_worker_id in rows.values_list('pk', 'reported_by_id', 'assigned_worker_id'):
+            workers = {assigned_worker_id, *changes[pk].get('assigned_worker_id', ())} - {None}
+            watched[pk] = (reported_by_id, workers)
+            worker_ids |= workers
+    users = {pk: worker.user_id for pk, worker in cache.get_many(Worker, worker_ids).items()}
+    editor = getattr(changed_by, 'pk', None)
+    events = []
+    for pk, (reported_by_id, workers) in watched.items():
+        message = describe(changes[pk], labels)
+        recipients = {reported_by_id, *(users.get(worker) for worker in workers)} - {None, editor}
+        events.extend(NotificationEvent(user_id=user_id, bug_id=pk, message=message) for user_id in sorted(recipients))
+    NotificationEvent.objects.bulk_create(events, batch_size=size)
+
+
+post_init.connect(remember_watched, sender=Bug, dispatch_uid='core-notifications-remember')
+post_save.connect(bug_saved, sender=Bug, dispatch_uid='core-notifications-bug-saved')
+bugs_bulk_updated.connect(bugs_updated_in_bulk, dispatch_uid='core-notifications-bulk')
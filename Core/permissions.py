@@ -0,0 +1,98 @@
+from django.db.models import Q
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.permissions import BasePermission
+
+from . import cache
+from .models import Project, Team, Worker
+
+# --------------------------- Project permissions --------------------------- #
+# A user reaches a project that is in their own workspace, in the workspace of
+# their worker's team, or assigned to that team; staff reach every project.
+# Resolving that walks User -> Worker -> Team -> Project -> Workspace, so the
+# reachable project ids are computed once per user with one query and kept in
+# an in-process LRU and the shared cache backend. The key includes the
+# lookup-cache versions of Project, Team and Worker (Worker's also moves when a
+# User is saved), so any change to those tables recomputes every user's set.
+# The versions are re-read at most every CORE_CACHE['VERSION_TTL'] seconds, so
+# a cache hit costs no query.
+
+ALL = None  # What staff users reach.
+
+_local = cache.LRUCache(cache.get_config()['MAXSIZE'])
+
+
+def compute_project_ids(user):
+    """ The reachable project ids of a non-staff user, straight from the database. """
+    return frozenset(
+        Project.objects.filter(
+            Q(workspace_id=user.workspace_id)
+            | Q(workspace_id__in=Team.objects.filter(workers__user_id=user.pk).values('workspace_id'))
+            | Q(assigned_team__workers__user_id=user.pk)
+        ).values_list('pk', flat=True).distinct()
+    )
+
+
+def reachable_project_ids(user):
+    """ frozenset of the ids of the projects the user may see and change, or ALL for staff. """
+    if not user.is_authenticated:
+        return frozenset()
+    if user.is_staff or user.is_superuser:
+        return ALL
+    config = cache.get_config()
+    if not config['ENABLED']:
+        return compute_project_ids(user)
+
+    versions = tuple(cache.cache_for(model).version() for model in (Project, Team, Worker))
+    key = (user.pk, *versions)
+    project_ids = _local.get(key)
+    if project_ids is not None:
+        return project_ids
+    backend = cache.caches[config['BACKEND']]
+    shared_key = "core-permissions:{}:{}:{}:{}".format(*key)
+    project_ids = backend.get(shared_key)
+    if project_ids is None:
+        project_ids = compute_project_ids(user)
+        backend.set(shared_key, project_ids, config['TIMEOUT'])
+    _local.set(key, project_ids)
+    return project_ids
+
+
+def can_access(user, project_id):
+    project_ids = reachable_project_ids(user)
+    return project_ids is ALL or project_id in project_ids
+
+
+def project_id_of(obj):
+    """ The project an object belongs to: a Project itself, anything with a project, or a bug's attachment. """
+    if isinstance(obj, Project):
+        return obj.pk
+    if hasattr(obj, 'project_id'):
+        return obj.project_id
+    return obj.bug.project_id
+
+
+def restrict(queryset, user, lookup='project'):
+    """ Only the rows of `queryset` whose `lookup` (a path to a project) the user reaches. """
+    project_ids = reachable_project_ids(user)
+    if project_ids is ALL:
+        return queryset
+    return queryset.filter(**{f"{lookup}__in": project_ids})
+
+
+class HasProjectAccess(BasePermission):
+    """ The user reaches the project in the `project_id` URL argument, if any, and that of checked objects. """
+    message = "You do not have access to this project."
+
+    def has_permission(self, request, view):
+        project_id = view.kwargs.get('project_id')
+        return project_id is None or can_access(request.user, int(project_id))
+
+    def has_object_permission(self, request, view, obj):
+        return can_access(request.user, project_id_of(obj))
+
+
+class ProjectAccessFilter(BaseFilterBackend):
+    """ Filter backend version of `restrict()`; the view's `project_lookup` (default 'project') names the path. """
+
+    def filter_queryset(self, request, queryset, view):
+        return restrict(queryset, request.user, getattr(view, 'project_lookup', 'project'))
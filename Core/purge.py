@@ -0,0 +1,191 @@
+import graphlib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, field
+
+from django.conf import settings
+from django.db import connections, models, router
+
+from . import archive, cache, sharding, tag_index
+from .attachments import remove_unreferenced_blobs
+from .models import ArchivedBug, AttachmentBlob, BugAttachment, Project, Workspace
+
+# --------------------------- Bulk workspace purge --------------------------- #
+# workspace.delete() hands everything to Django's Collector, which loads every
+# dependent object of the tenant into memory and sends signals for each one.
+# purge_workspace() walks the reverse foreign keys in the model metadata
+# instead, the way the Collector finds them, and deletes children before
+# parents with raw `DELETE ... WHERE pk IN (...)` statements of
+# PURGE_CHUNK_SIZE ids. It holds one chunk of ids per level of the tree.
+#
+# - CASCADE relations are purged recursively.
+# - SET_NULL relations become one UPDATE per chunk.
+# - DO_NOTHING relations are left alone (change log tombstones).
+# - PROTECT and RESTRICT relations stop the purge.
+#
+# Children of a model are taken in dependency order. A subtree goes first
+# when deleting another subtree would null its rows, so projects and their
+# bugs are gone before their users, workers and teams are.
+#
+# Every statement commits on its own. As children always go first, an
+# interrupted purge leaves no dangling rows and can simply be run again; the
+# workspace row is the last thing deleted. No signals are sent: the
+# receivers that matter are replayed in bulk: attachment blob references are
+# released, the tag indexes of the purged projects and the lookup caches are
+# invalidated, and the released blob files are deleted on a background thread.
+# The change log records no tombstones; the whole workspace is gone.
+
+_cleanup_pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix='purge-cleanup')
+
+
+class PurgeError(Exception):
+    """ A protected relation stops the purge. """
+
+
+@dataclass
+class PurgeResult:
+    deleted: Counter = field(default_factory=Counter)  # {model label: rows}
+    nulled: Counter = field(default_factory=Counter)  # {'label.field': rows}
+    released_blobs: set = field(default_factory=set)
+    cleanup: object = None  # Future of (blobs removed, bytes freed)
+
+
+def relations(model):
+    """ Reverse one-to-one and one-to-many relations to `model`, including auto-created m2m through tables. """
+    return [
+        f for f in model._meta.get_fields(include_hidden=True)
+        if f.auto_created and not f.concrete and (f.one_to_one or f.one_to_many)
+    ]
+
+
+def subtree(model, seen=None):
+    """ The models whose rows a CASCADE from `model` reaches, `model` included. """
+    seen = set() if seen is None else seen
+    seen.add(model)
+    for relation in relations(model):
+        if relation.on_delete is models.CASCADE and relation.related_model not in seen:
+            subtree(relation.related_model, seen)
+    return seen
+
+
+def ordered_relations(model):
+    """ relations(model), each subtree purged before the ones whose deletion would null its rows. """
+    found = relations(model)
+    trees = {relation: subtree(relation.related_model) for relation in found}
+    nulled = {
+        relation: {r.related_model for m in tree for r in relations(m) if r.on_delete is models.SET_NULL}
+        for relation, tree in trees.items()
+    }
+    sorter = graphlib.TopologicalSorter()
+    for relation in found:
+        sorter.add(relation, *(other for other in found if other is not relation and nulled[relation] & trees[other]))
+    try:
+        return list(sorter.static_order())
+    except graphlib.CycleError:
+        return found
+
+
+def plan(model=Workspace, depth=0, seen=None):
+    """ [(depth, model label, field, on_delete name)] in the order a purge of `model` visits them. """
+    seen = set() if seen is None else seen
+    seen.add(model)
+    steps = []
+    for relation in ordered_relations(model):
+        child = relation.related_model
+        steps.append((depth, child._meta.label, relation.field.name, relation.on_delete.__name__))
+        if relation.on_delete is models.CASCADE and child not in seen:
+            steps += plan(child, depth + 1, seen)
+    return steps
+
+
+class _Purge:
+    def __init__(self, chunk_size, progress):
+        self.chunk_size = chunk_size
+        self.progress = progress
+        self.result = PurgeResult()
+        self._relations = {}
+
+    def relations(self, model):
+        if model not in self._relations:
+            self._relations[model] = ordered_relations(model)
+        return self._relations[model]
+
+    def databases(self, parent, child):
+        """ A control-database row can have children on every shard. """
+        if sharding.is_sharded(child) and not sharding.is_sharded(parent):
+            return sharding.databases()
+        return [router.db_for_write(child)]
+
+    def delete(self, model, using, queryset):
+        """ Delete the rows of `queryset` from `using`, children first, one chunk of ids at a time. """
+        queryset = queryset.using(using).order_by()
+        while True:
+            ids = list(queryset.values_list('pk', flat=True)[:self.chunk_size])
+            if not ids:
+                return
+            for relation in self.relations(model):
+                self.children(model, relation, ids)
+            self.release(model, using, ids)
+            table, column = model._meta.db_table, model._meta.pk.column
+            connection = connections[using]
+            quote = connection.ops.quote_name
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    f"DELETE FROM {quote(table)} WHERE {quote(column)} IN ({', '.join(['%s'] * len(ids))})", ids,
+                )
+            self.result.deleted[model._meta.label] += len(ids)
+            if self.progress:
+                self.progress(model._meta.label, self.result.deleted[model._meta.label])
+
+    def children(self, model, relation, ids):
+        child, column = relation.related_model, relation.field.attname
+        on_delete = relation.on_delete
+        if on_delete is models.DO_NOTHING:
+            return
+        for using in self.databases(model, child):
+            rows = child._base_manager.using(using).filter(**{f'{column}__in': ids})
+            if on_delete is models.CASCADE:
+                self.delete(child, using, rows)
+            elif on_delete is models.SET_NULL:
+                updated = rows.update(**{column: None})
+                if updated:
+                    self.result.nulled[f'{child._meta.label}.{relation.field.name}'] += updated
+            elif rows.exists():
+                raise PurgeError(
+                    f"{child._meta.label}.{relation.field.name} ({on_delete.__name__}) still refers to "
+                    f"{model._meta.label} rows being purged."
+                )
+
+    def release(self, model, using, ids):
+        """ What the post_delete receivers of Core.attachments, Core.archive and Core.tag_index would do. """
+        if model is Project:
+            for project_id in ids:
+                tag_index.invalidate(project_id)
+            return
+        if model is BugAttachment:
+            references = Counter(
+                BugAttachment.objects.using(using).filter(pk__in=ids).exclude(blob=None).values_list('blob_id', flat=True)
+            )
+        elif model is ArchivedBug:
+            references = archive.blob_references(ArchivedBug.objects.using(using).filter(pk__in=ids).iterator())
+        else:
+            return
+        for sha256, count in references.items():
+            AttachmentBlob.objects.using(using).filter(pk=sha256, ref_count__gte=count).update(
+                ref_count=models.F('ref_count') - count,
+            )
+        self.result.released_blobs.update(references)
+
+
+def purge_workspace(workspace_id, chunk_size=None, progress=None):
+    """ Delete a workspace with everything that cascades from it, its users included. Returns a PurgeResult.
+
+    `progress(model label, rows deleted so far)` is called after every chunk.
+    """
+    purge = _Purge(chunk_size or settings.PURGE_CHUNK_SIZE, progress)
+    with sharding.use_shard(sharding.shard_for(workspace_id)):
+        purge.delete(Workspace, sharding.CONTROL, Workspace.objects.filter(pk=workspace_id))
+    cache.invalidate_all()
+    if purge.result.released_blobs:
+        purge.result.cleanup = _cleanup_pool.submit(remove_unreferenced_blobs, purge.result.released_blobs)
+    return purge.result
@@ -0,0 +1,345 @@
+import hashlib
+import shlex
+from dataclasses import dataclass
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import router, transaction
+from django.db.models import Q
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+
+from . import cache
+from .models import Bug, SavedFilter, Sprint, Tag, Team, Worker
+from .signals import bugs_bulk_updated
+
+# --------------------------- Saved bug filters --------------------------- #
+# A filter is a list of space-separated terms, `field:value[,value...]`, all of
+# which must hold; a leading `-` negates a term and `none` matches an empty
+# foreign key, e.g. `status:open,in_progress severity:critical tag:crash -team:none`.
+# Compiled plans (a Q object plus an equivalent Python predicate) are kept per
+# query text and version of the Tag cache, since they hold tag ids. A filter's
+# count and first page of ids are cached under a version number. Bug saves,
+# deletes and tag changes bump that version only for filters the bug matched
+# before or after the change, and only when a field the filter looks at
+# actually changed. Bumps wait for the writing transaction to commit, so
+# a concurrent reader cannot cache pre-commit results under the new version.
+
+CHOICE_FIELDS = {
+    'status': [value for value, _ in Bug.STATUS_CHOICES],
+    'severity': [value for value, _ in Bug.SEVERITY_CHOICES],
+    'priority': [value for value, _ in Bug.PRIORITY_CHOICES],
+}
+ID_FIELDS = {
+    'sprint': 'sprint_id',
+    'assignee': 'assigned_worker_id',
+    'team': 'assigned_team_id',
+}
+STATE_FIELDS = ('project_id', 'status', 'severity', 'priority', 'sprint_id', 'assigned_worker_id', 'assigned_team_id')
+STATE_NAMES = {name.removesuffix('_id') for name in STATE_FIELDS}
+UNKNOWN = object()
+
+
+@dataclass(frozen=True)
+class Clause:
+    field: str
+    values: frozenset
+    negate: bool = False
+
+    def q(self):
+        if self.field == 'tags':
+            links = Bug.tags.through.objects.filter(tag_id__in=self.values).values('bug_id')
+            q = Q(pk__in=links)
+        else:
+            present = [value for value in self.values if value is not None]
+            q = Q(**{f"{self.field}__in": present})
+            if None in self.values:
+                q |= Q(**{f"{self.field}__isnull": True})
+        return ~q if self.negate else q
+
+    def matches(self, state):
+        value = state[self.field]
+        hit = bool(value & self.values) if self.field == 'tags' else value in self.values
+        return hit != self.negate
+
+
+class FilterPlan:
+    """ A validated filter: a Q object for the database and `matches()` for one bug's field values. """
+
+    def __init__(self, clauses):
+        self.clauses = tuple(clauses)
+        self.fields = frozenset(clause.field for clause in self.clauses)
+        self.tag_ids = frozenset().union(*(c.values for c in self.clauses if c.field == 'tags'))
+        q = Q()
+        for clause in self.clauses:
+            q &= clause.q()
+        self.q = q
+
+    def queryset(self, project_id):
+        return Bug.objects.filter(self.q, project_id=project_id)
+
+    def matches(self, state, field_filter=None):
+        """ Whether a bug with these field values is in the result; `field_filter` limits the clauses checked. """
+        return all(
+            clause.matches(state) for clause in self.clauses
+            if field_filter is None or clause.field in field_filter
+        )
+
+
+def parse(query):
+    """ Split a query into (negate, field, values) terms, checking field names and choice values. """
+    try:
+        terms = shlex.split(query)
+    except ValueError as exc:
+        raise ValidationError(f"Could not parse the filter: {exc}.")
+    if not terms:
+        raise ValidationError("The filter is empty.")
+    parsed = []
+    for term in terms:
+        negate = term.startswith('-')
+        field, sep, raw = term.lstrip('-').partition(':')
+        values = [value.strip() for value in raw.split(',') if value.strip()]
+        if not sep or not values:
+            raise ValidationError(f"'{term}' is not of the form field:value[,value...].")
+        if field in CHOICE_FIELDS:
+            unknown = [value for value in values if value not in CHOICE_FIELDS[field]]
+            if unknown:
+                raise ValidationError(
+                    f"Unknown {field} {', '.join(unknown)}; expected one of {', '.join(CHOICE_FIELDS[field])}."
+                )
+        elif field in ID_FIELDS:
+            if not all(value == 'none' or value.isdigit() for value in values):
+                raise ValidationError(f"{field} takes ids or 'none'.")
+        elif field != 'tag':
+            fields = ', '.join(['tag', *CHOICE_FIELDS, *ID_FIELDS])
+            raise ValidationError(f"Unknown filter field '{field}'; expected one of {fields}.")
+        parsed.append((negate, field, values))
+    return parsed
+
+
+_plans = cache.LRUCache(512)
+
+
+def _tag_version():
+    return cache.cache_for(Tag).version()
+
+
+def compile_query(query):
+    """ The FilterPlan for a query text, compiled once per process; raises ValidationError.
+
+    Plans hold tag ids, so they are kept per version of the Tag cache, which every tag save or delete bumps.
+    """
+    key = (_tag_version(), query)
+    plan = _plans.get(key)
+    if plan is not None:
+        return plan
+    terms = parse(query)
+    names = {value for _, field, values in terms if field == 'tag' for value in values}
+    tag_ids = dict(Tag.objects.filter(name__in=names).values_list('name', 'pk')) if names else {}
+    missing = names - tag_ids.keys()
+    if missing:
+        raise ValidationError(f"Unknown tag {', '.join(sorted(missing))}.")
+
+    clauses = []
+    for negate, field, values in terms:
+        if field == 'tag':
+            clauses.append(Clause('tags', frozenset(tag_ids[value] for value in values), negate))
+        elif field in ID_FIELDS:
+            ids = frozenset(None if value == 'none' else int(value) for value in values)
+            clauses.append(Clause(ID_FIELDS[field], ids, negate))
+        else:
+            clauses.append(Clause(field, frozenset(values), negate))
+    plan = FilterPlan(clauses)
+    _plans.set(key, plan)
+    return plan
+
+
+# --------------------------- Cached results --------------------------- #
+
+def _backend():
+    return cache.cache_for(SavedFilter).backend
+
+
+def _version_key(filter_id):
+    return f"saved-filter:{filter_id}:version"
+
+
+GENERATION_KEY = 'saved-filter:generation'
+
+
+def _incr(key):
+    try:
+        _backend().incr(key)
+    except ValueError:
+        _backend().set(key, 2, None)
+
+
+def bump(filter_ids, using=None):
+    """ Orphan the cached results of these filters when the current transaction on `using` commits. """
+    filter_ids = list(filter_ids)
+    if filter_ids:
+        transaction.on_commit(
+            lambda: [_incr(_version_key(filter_id)) for filter_id in filter_ids],
+            using=using or router.db_for_write(Bug),
+        )
+
+
+def bump_all(using=None, **kwargs):
+    """ Orphan every filter's cached results, for changes that bypass Bug signals (SET_NULL cascades). """
+    transaction.on_commit(lambda: _incr(GENERATION_KEY), using=using or router.db_for_write(Bug))
+
+
+def results(saved_filter):
+    """ {'count', 'ids', 'cached'} for a saved filter; ids are the first page, newest first. """
+    backend = _backend()
+    versions = backend.get_many([_version_key(saved_filter.pk), GENERATION_KEY])
+    digest = hashlib.blake2b(saved_filter.query.encode(), digest_size=8).hexdigest()
+    key = (
+        f"saved-filter:{saved_filter.pk}:{versions.get(GENERATION_KEY, 1)}:"
+        f"{versions.get(_version_key(saved_filter.pk), 1)}:{digest}"
+    )
+    cached = backend.get(key)
+    if cached is not None:
+        return {**cached, 'cached': True}
+
+    queryset = compile_query(saved_filter.query).queryset(saved_filter.project_id)
+    page_size = settings.SAVED_FILTER_PAGE_SIZE
+    data = {
+        'count': queryset.count(),
+        'ids': list(queryset.order_by('-created_at', '-pk').values_list('pk', flat=True)[:page_size]),
+    }
+    backend.set(key, data, settings.SAVED_FILTER_CACHE_TIMEOUT)
+    return {**data, 'cached': False}
+
+
+# --------------------------- Invalidation --------------------------- #
+
+_project_plans = cache.LRUCache(1024)
+
+
+def project_plans(project_id):
+    """ [(filter id, plan)] of the project's filters, refreshed whenever any SavedFilter or Tag changes. """
+    key = (cache.cache_for(SavedFilter).version(), _tag_version(), project_id)
+    plans = _project_plans.get(key)
+    if plans is None:
+        plans = []
+        for filter_id, query in SavedFilter.objects.filter(project_id=project_id).values_list('pk', 'query'):
+            try:
+                plans.append((filter_id, compile_query(query)))
+            except ValidationError:
+                # A tag it names was deleted; the filter matches nothing until it is edited.
+                continue
+        _project_plans.set(key, plans)
+    return plans
+
+
+def bug_state(bug):
+    """ Filterable field values of a bug, without loading deferred fields. """
+    return {name: bug.__dict__.get(name, UNKNOWN) for name in STATE_FIELDS}
+
+
+def remember_state(sender, instance, **kwargs):
+    instance._saved_filter_state = bug_state(instance)
+
+
+def _tag_ids(bug_id):
+    return frozenset(Bug.tags.through.objects.filter(bug_id=bug_id).values_list('tag_id', flat=True))
+
+
+def bug_saved(sender, instance, created, raw=False, update_fields=None, using=None, **kwargs):
+    if raw or update_fields is not None and not {f.removesuffix('_id') for f in update_fields} & STATE_NAMES:
+        return
+    new = bug_state(instance)
+    old = None if created else getattr(instance, '_saved_filter_state', None)
+    instance._saved_filter_state = new
+    unknown = old is not None and UNKNOWN in old.values()
+    projects = {new['project_id']} | ({old['project_id']} if old and not unknown else set())
+
+    stale, tags = [], None
+    for project_id in projects:
+        for filter_id, plan in project_plans(project_id):
+            if unknown:
+                stale.append(filter_id)
+                continue
+            fields = plan.fields - {'tags'}
+            if old is not None and old['project_id'] == new['project_id'] and all(old[f] == new[f] for f in fields):
+                continue
+            candidates = [
+                state for state in (old, new)
+                if state is not None and state['project_id'] == project_id and plan.matches(state, fields)
+            ]
+            if candidates and plan.tag_ids:
+                # Saving a bug never changes its tags, so one lookup serves the old and new state.
+                tags = _tag_ids(instance.pk) if tags is None else tags
+                candidates = [state for state in candidates if plan.matches({**state, 'tags': tags})]
+            if candidates:
+                stale.append(filter_id)
+    bump(stale, using)
+
+
+def bug_deleted(sender, instance, using=None, **kwargs):
+    # Tag links are already gone by now, so tag clauses are not checked.
+    state = bug_state(instance)
+    bump((
+        filter_id for filter_id, plan in project_plans(instance.project_id)
+        if UNKNOWN in state.values() or plan.matches(state, plan.fields - {'tags'})
+    ), using)
+
+
+def bug_tags_changed(sender, instance, action, reverse, pk_set, using=None, **kwargs):
+    if action == 'pre_clear':
+        # pk_set is None for clears; remember what is about to go.
+        field = 'bug_id' if reverse else 'tag_id'
+        owner = {'tag_id': instance.pk} if reverse else {'bug_id': instance.pk}
+        instance._saved_filter_cleared = set(sender.objects.filter(**owner).values_list(field, flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    changed = getattr(instance, '_saved_filter_cleared', set()) if action == 'post_clear' else pk_set
+    if not changed:
+        return
+
+    if not reverse:
+        state = bug_state(instance)
+        stale = []
+        for filter_id, plan in project_plans(instance.project_id):
+            if not plan.tag_ids & changed:
+                continue
+            if UNKNOWN in state.values() or plan.matches(state, plan.fields - {'tags'}):
+                stale.append(filter_id)
+        bump(stale, using)
+    else:
+        projects = set(Bug.objects.filter(pk__in=changed).values_list('project_id', flat=True))
+        bump((
+            filter_id for project_id in projects for filter_id, plan in project_plans(project_id)
+            if instance.pk in plan.tag_ids
+        ), using)
+
+
+def bump_projects(project_ids, fields=None, using=None):
+    """ bump() the projects' filters that look at any of `fields` (all of them when None), e.g. after an import. """
+    bump((
+        filter_id for project_id in project_ids for filter_id, plan in project_plans(project_id)
+        if fields is None or plan.fields & fields
+    ), using)
+
+
+def bugs_updated_in_bulk(sender, project_ids, fields, **kwargs):
+    # No old values to compare against; bump every filter that looks at a changed field.
+    bump_projects(project_ids, fields)
+
+
+def tag_saved(sender, instance, created, raw=False, using=None, **kwargs):
+    # A renamed tag no longer answers to the name filters use (plans recompile on their own).
+    if not created and not raw:
+        bump_all(using)
+
+
+post_init.connect(remember_state, sender=Bug, dispatch_uid='core-saved-filters-remember')
+post_save.connect(bug_saved, sender=Bug, dispatch_uid='core-saved-filters-bug-saved')
+post_delete.connect(bug_deleted, sender=Bug, dispatch_uid='core-saved-filters-bug-deleted')
+m2m_changed.connect(bug_tags_changed, sender=Bug.tags.through, dispatch_uid='core-saved-filters-tags')
+bugs_bulk_updated.connect(bugs_updated_in_bulk, dispatch_uid='core-saved-filters-bulk')
+post_save.connect(tag_saved, sender=Tag, dispatch_uid='core-saved-filters-tag-saved')
+for _model in (Tag, Sprint, Worker, Team):
+    # Deleting these updates bugs with SET_NULL (or drops tag links) without sending Bug signals.
+    post_delete.connect(bump_all, sender=_model, dispatch_uid=f'core-saved-filters-{_model._meta.model_name}')
@@ -0,0 +1,195 @@
+from django.conf import settings
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.urls import reverse
+from rest_framework import serializers
+from Auth.models import User
+from . import cache
+from .fieldsets import SparseFieldsetMixin
+from .models import Bug, BugAttachment, Project, SavedFilter, Sprint, Team, Worker
+from .saved_filters import compile_query
+from .triage import OPEN
+
+
+class CachedPrimaryKeyRelatedField(serializers.PrimaryKeyRelatedField):
+    """ PrimaryKeyRelatedField that looks the instance up through the lookup cache instead of a query. """
+
+    def to_internal_value(self, data):
+        if self.pk_field is not None:
+            data = self.pk_field.to_internal_value(data)
+        if isinstance(data, bool) or not isinstance(data, (int, str)):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        try:
+            obj = cache.get(self.get_queryset().model, data)
+        except (TypeError, ValueError, DjangoValidationError):
+            self.fail('incorrect_type', data_type=type(data).__name__)
+        if obj is None:
+            self.fail('does_not_exist', pk_value=data)
+        return obj
+
+
+class BugAttachmentSerializer(serializers.ModelSerializer):
+    sha256 = serializers.CharField(source='blob_id', read_only=True)
+    download_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = BugAttachment
+        fields = ['id', 'bug', 'name', 'size', 'mime_type', 'sha256', 'uploaded_at', 'download_url']
+        read_only_fields = fields
+
+    def get_download_url(self, obj):
+        url = reverse('attachment-download', kwargs={'pk': obj.pk})
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class LogSearchSerializer(serializers.Serializer):
+    q = serializers.CharField(max_length=500, trim_whitespace=False)
+    regex = serializers.BooleanField(default=False)
+    ignore_case = serializers.BooleanField(default=False)
+    limit = serializers.IntegerField(min_value=1, max_value=1000, default=100)
+
+
+class DuplicateCheckSerializer(serializers.Serializer):
+    title = serializers.CharField(max_length=255)
+    description = serializers.CharField(required=False, allow_blank=True, default='')
+    exclude = serializers.IntegerField(required=False, help_text="Bug to leave out, e.g. the one being edited.")
+    limit = serializers.IntegerField(min_value=1, max_value=50, default=10)
+
+
+class SavedFilterSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = SavedFilter
+        fields = ['id', 'project', 'owner', 'name', 'query', 'created_at', 'updated_at']
+        read_only_fields = ['project', 'owner', 'created_at', 'updated_at']
+
+    def validate_query(self, value):
+        try:
+            compile_query(value)
+        except DjangoValidationError as exc:
+            raise serializers.ValidationError(exc.messages)
+        return value
+
+
+class TagIdListField(serializers.CharField):
+    """ Comma-separated tag ids, e.g. `3,17`. """
+
+    def to_internal_value(self, data):
+        value = super().to_internal_value(data)
+        parts = [part.strip() for part in value.split(',') if part.strip()]
+        if not all(part.isdigit() for part in parts):
+            raise serializers.ValidationError("Expected comma-separated tag ids.")
+        return [int(part) for part in parts]
+
+
+class TagQuerySerializer(serializers.Serializer):
+    all = TagIdListField(required=False, default=list, help_text="Bugs must carry every one of these tags.")
+    any = TagIdListField(required=False, default=list, help_text="Bugs must carry at least one of these tags.")
+    none = TagIdListField(required=False, default=list, help_text="Bugs must carry none of these tags.")
+    before = serializers.IntegerField(required=False, min_value=1, help_text="Only bugs with a lower id (next page).")
+    limit = serializers.IntegerField(min_value=1, max_value=500, default=50)
+
+
+class BugSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Bug
+        fields = ['id', 'title', 'status', 'severity', 'priority', 'created_at']
+        read_only_fields = fields
+
+
+class ProjectRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Project
+        fields = ['id', 'name']
+
+
+class SprintRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Sprint
+        fields = ['id', 'name', 'is_active']
+
+
+class TeamRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Team
+        fields = ['id', 'name']
+
+
+class WorkerRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Worker
+        fields = ['id', 'user', 'team', 'role']
+
+
+class UserRefSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = User
+        fields = ['id', 'email', 'first_name', 'last_name']
+
+
+class BugListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
+    """ Bugs for list and detail pages; `?fields=` and `?expand=` pick what is rendered (see Core.fieldsets). """
+
+    class Meta:
+        model = Bug
+        fields = [
+            'id', 'project', 'title', 'description', 'status', 'severity', 'priority', 'tags', 'sprint',
+            'assigned_team', 'assigned_worker', 'reported_by', 'github_issue_url', 'github_issue_number',
+            'created_at', 'updated_at', 'resolved_at', 'version',
+        ]
+        read_only_fields = fields
+        expandable = {
+            'project': ProjectRefSerializer,
+            'sprint': SprintRefSerializer,
+            'assigned_team': TeamRefSerializer,
+            'assigned_worker': WorkerRefSerializer,
+            'reported_by': UserRefSerializer,
+        }
+
+
+class BugListQuerySerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Bug.STATUS_CHOICES, required=False)
+    before = serializers.IntegerField(required=False, min_value=1, help_text="Only bugs with a lower id (next page).")
+    limit = serializers.IntegerField(min_value=1, max_value=settings.BUG_LIST_MAX_PAGE_SIZE, default=100)
+
+
+class TriageQuerySerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=[(s, label) for s, label in Bug.STATUS_CHOICES if s in OPEN], required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.BUG_LIST_MAX_PAGE_SIZE, default=20)
+
+
+class BugPatchSerializer(serializers.Serializer):
+    status = serializers.ChoiceField(choices=Bug.STATUS_CHOICES, required=False)
+    severity = serializers.ChoiceField(choices=Bug.SEVERITY_CHOICES, required=False)
+    priority = serializers.ChoiceField(choices=Bug.PRIORITY_CHOICES, required=False)
+    sprint = serializers.PrimaryKeyRelatedField(queryset=Sprint.objects.all(), allow_null=True, required=False)
+    assigned_team = CachedPrimaryKeyRelatedField(queryset=Team.objects.all(), allow_null=True, required=False)
+    assigned_worker = CachedPrimaryKeyRelatedField(queryset=Worker.objects.all(), allow_null=True, required=False)
+
+    def validate(self, attrs):
+        if not attrs:
+            raise serializers.ValidationError("Give at least one field to change.")
+        return attrs
+
+
+class BugEditSerializer(BugPatchSerializer):
+    version = serializers.IntegerField(min_value=1, help_text="The `version` of the bug the edit was made on.")
+    title = serializers.CharField(max_length=255, required=False)
+    description = serializers.CharField(required=False)
+
+    def validate(self, attrs):
+        if len(attrs) == 1:
+            raise serializers.ValidationError("Give at least one field to change.")
+        return attrs
+
+
+class BugBulkUpdateSerializer(serializers.Serializer):
+    ids = serializers.ListField(
+        child=serializers.IntegerField(min_value=1), allow_empty=False, max_length=settings.BUG_BULK_MAX_IDS,
+    )
+    changes = BugPatchSerializer()
+    dry_run = serializers.BooleanField(default=False, help_text="Report what would change without writing.")
+
+
+class ChangesSerializer(serializers.Serializer):
+    since = serializers.IntegerField(min_value=0, default=0, help_text="The `next` of the previous response.")
+    limit = serializers.IntegerField(min_value=1, max_value=5000, default=settings.CHANGELOG_PAGE_SIZE)
@@ -0,0 +1,443 @@
+import time
+from collections import Counter
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.core.exceptions import ImproperlyConfigured
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.db.models.signals import post_migrate, pre_delete
+from django.utils import timezone
+from rest_framework.exceptions import APIException
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+from Auth.models import User
+from . import archive, cache
+from .models import (
+    ActivityLog, ArchivedBug, AttachmentBlob, Bug, BugAttachment, BugLSHBand, BugSignature, GitHubSyncState, LogIndex,
+    Notification, NotificationEvent, Project, SavedFilter, Sprint, Tag, Team, TimeTracking, Worker, Workspace,
+    WorkspaceShard,
+)
+
+# --------------------------- Workspace sharding --------------------------- #
+# The control database ('default') keeps users, workspaces and the shard map
+# (WorkspaceShard); every other Core table can also live on the databases named
+# in settings.WORKSPACE_SHARDS, each holding the workspaces mapped to it.
+# Workspaces without a map row stay on 'default'. WorkspaceRouter sends Core
+# queries to the shard set with use_shard() / use_workspace(). For API requests
+# ShardedJWTAuthentication sets the shard of the user DRF has just loaded, and
+# WorkspaceShardMiddleware confines that to the request; rows loaded from a
+# shard are saved back to it. Outside of that, Core queries go to 'default' as
+# before.
+#
+# Each database hands out ids from its own range of ID_RANGE, so an id names
+# one row across all shards: caches keyed by id need no alias, and a delta-sync
+# cursor from another shard is recognised as such. move_workspace() copies a
+# workspace to another shard with new ids, switches the map and deletes the
+# old copy.
+#
+# While a workspace moves, WorkspaceRouter refuses (WorkspaceMoving) every
+# write to its source database, whatever makes it: API views, the admin,
+# commands. Only writes made for another, known workspace (API requests, and
+# code under use_workspace()) go through; the router cannot tell which
+# workspace any other write belongs to. Each process reads the moving flags
+# from the control database at most every MOVING_TTL seconds, and
+# move_workspace() waits that long before copying, so no process relies on a
+# shared cache to see them.
+
+CONTROL = 'default'
+CONTROL_MODELS = {'workspace', 'workspaceshard'}
+ID_RANGE = 10 ** 12
+MOVING_TTL = 1.0
+
+_shard = ContextVar('workspace_shard', default=None)
+_workspace = ContextVar('workspace', default=None)
+_moving = {'checked_at': None, 'sources': {}}
+
+
+def shards():
+    return list(getattr(settings, 'WORKSPACE_SHARDS', ()))
+
+
+def databases():
+    """ Every database that can hold Core data, control first. """
+    return [CONTROL, *shards()]
+
+
+def is_sharded(model):
+    return model._meta.app_label == 'Core' and model._meta.model_name not in CONTROL_MODELS
+
+
+def id_range(alias):
+    """ (low, high): the ids the database hands out; 'default' counts up from 1. """
+    names = databases()
+    index = names.index(alias) if alias in names else 0
+    return index * ID_RANGE, (index + 1) * ID_RANGE
+
+
+def shard_for(workspace_id):
+    entry = cache.get(WorkspaceShard, workspace_id) if workspace_id is not None else None
+    return entry.alias if entry is not None else CONTROL
+
+
+@contextmanager
+def use_shard(alias, workspace_id=None):
+    token, workspace_token = _shard.set(alias), _workspace.set(workspace_id)
+    try:
+        yield alias
+    finally:
+        _shard.reset(token)
+        _workspace.reset(workspace_token)
+
+
+def use_workspace(workspace_id):
+    return use_shard(shard_for(workspace_id), workspace_id)
+
+
+def moving_sources():
+    """ {workspace id: database it is moving from}, re-read from the control database every MOVING_TTL seconds. """
+    now = time.monotonic()
+    if _moving['checked_at'] is None or now - _moving['checked_at'] > MOVING_TTL:
+        _moving['sources'] = dict(
+            WorkspaceShard.objects.using(CONTROL).filter(moving=True).values_list('workspace_id', 'alias')
+        )
+        _moving['checked_at'] = now
+    return _moving['sources']
+
+
+class WorkspaceRouter:
+    def _route(self, model, **hints):
+        instance = hints.get('instance')
+        from_shard = instance is not None and is_sharded(type(instance)) and instance._state.db
+        if not is_sharded(model):
+            # Django would otherwise follow a shard row's user or workspace to the shard.
+            return CONTROL if from_shard else None
+        return from_shard or _shard.get()
+
+    db_for_read = _route
+
+    def db_for_write(self, model, **hints):
+        alias = self._route(model, **hints)
+        if is_sharded(model) and shards():
+            sources, workspace_id = moving_sources(), _workspace.get()
+            if workspace_id is not None:
+                moving = workspace_id in sources
+            else:
+                moving = (alias or CONTROL) in sources.values()
+            if moving:
+                raise WorkspaceMoving()
+        return alias
+
+    def allow_relation(self, obj1, obj2, **hints):
+        sharded = is_sharded(type(obj1)), is_sharded(type(obj2))
+        if not any(sharded):
+            return None
+        if all(sharded):
+            return obj1._state.db == obj2._state.db
+        return True  # Core rows on any shard point at users and workspaces on the control database.
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db not in shards():
+            return None
+        if app_label != 'Core':
+            return False
+        model = hints.get('model')
+        if model is None and model_name is not None:
+            try:
+                model = apps.get_model(app_label, model_name)
+            except LookupError:
+                return True
+        return model is None or is_sharded(model)
+
+
+class WorkspaceMoving(APIException):
+    status_code = 503
+    default_detail = "This workspace is being moved to another database; try again shortly."
+    wait = 30  # Sent as Retry-After.
+
+
+class WorkspaceShardMiddleware:
+    """ Scope for requests under settings.WORKSPACE_SHARD_PATHS, in which authentication may pick a shard. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = tuple(getattr(settings, 'WORKSPACE_SHARD_PATHS', ('/api/',)))
+
+    def __call__(self, request):
+        if not request.path.startswith(self.paths):
+            return self.get_response(request)
+        request.workspace_shard_scope = True
+        with use_shard(None):  # Undoes whatever authentication sets.
+            return self.get_response(request)
+
+
+class ShardedJWTAuthentication(JWTAuthentication):
+    """ JWT authentication that also sends the rest of the request to the shard of the user's workspace.
+
+    Deciding here, once DRF has loaded the user, costs no second token decode
+    or user query. Writes to a workspace that is being moved are refused (503).
+    """
+
+    def authenticate(self, request):
+        result = super().authenticate(request)
+        if result is None or not getattr(request, 'workspace_shard_scope', False):
+            return result
+        workspace_id = result[0].workspace_id
+        entry = cache.get(WorkspaceShard, workspace_id) if workspace_id is not None else None
+        if entry is not None:
+            if entry.moving and request.method not in SAFE_METHODS:
+                raise WorkspaceMoving()
+            _shard.set(entry.alias)
+        _workspace.set(workspace_id)
+        return result
+
+
+# --------------------------- Id ranges --------------------------- #
+
+def reserve_id_range(sender, using, **kwargs):
+    """ Start the auto-increment counters of a shard's Core tables at the bottom of its id range. """
+    if using not in shards():
+        return
+    low, _ = id_range(using)
+    connection = connections[using]
+    with connection.cursor() as cursor:
+        for model in sender.get_models(include_auto_created=True):
+            if not is_sharded(model) or not model._meta.pk.get_internal_type().endswith('AutoField'):
+                continue
+            table, column = model._meta.db_table, model._meta.pk.column
+            if connection.vendor == 'sqlite':
+                cursor.execute("SELECT seq FROM sqlite_sequence WHERE name = %s", [table])
+                row = cursor.fetchone()
+                if row is None:
+                    cursor.execute("INSERT INTO sqlite_sequence (name, seq) VALUES (%s, %s)", [table, low])
+                elif row[0] < low:
+                    cursor.execute("UPDATE sqlite_sequence SET seq = %s WHERE name = %s", [low, table])
+            elif connection.vendor == 'postgresql':
+                cursor.execute(
+                    "SELECT setval(pg_get_serial_sequence(%s, %s), GREATEST(nextval(pg_get_serial_sequence(%s, %s)), %s))",
+                    [table, column, table, column, low],
+                )
+            else:
+                raise ImproperlyConfigured(
+                    f"The workspace shard {using!r} uses {connection.vendor}, which cannot reserve id ranges "
+                    f"(see check Core.E001)."
+                )
+
+
+@checks.register()
+def check_shard_backends(app_configs, **kwargs):
+    """ reserve_id_range() only knows how to move SQLite and PostgreSQL id counters. """
+    return [
+        checks.Error(
+            f"The workspace shard {alias!r} uses {connections[alias].vendor}, which cannot reserve id ranges.",
+            hint="Use SQLite or PostgreSQL databases for WORKSPACE_SHARDS.",
+            id='Core.E001',
+        )
+        for alias in shards() if connections[alias].vendor not in ('sqlite', 'postgresql')
+    ]
+
+
+# --------------------------- Moving a workspace --------------------------- #
+
+class _Copy:
+    """ Copies rows from one database to another, giving them new ids and rewriting foreign keys to match. """
+
+    def __init__(self, source, target, batch_size):
+        self.source, self.target, self.batch_size = source, target, batch_size
+        self.ids = {}  # {model: {old id: new id}}
+        self.counts = {}
+        self.skipped = {}
+
+    def copy(self, model, queryset, remap=()):
+        """ Copy `queryset`'s rows; `remap` names the foreign key columns (or the pk) pointing at copied models.
+
+        A row whose non-null foreign key points outside the copy (say, a worker of
+        another workspace) is skipped; a nullable one is cleared.
+        """
+        remap = dict(remap)
+        pk = model._meta.pk.attname
+        auto_pk = pk not in remap
+        ids = self.ids.setdefault(model, {})
+        batch, old_ids = [], []
+        for row in queryset.using(self.source).order_by('pk').values().iterator(chunk_size=self.batch_size):
+            if not self._rewrite(model, row, remap):
+                self.skipped[model] = self.skipped.get(model, 0) + 1
+                continue
+            if auto_pk:
+                old_ids.append(row.pop(pk))
+            batch.append(model(**row))
+            if len(batch) == self.batch_size:
+                self._insert(model, batch, old_ids, ids)
+                batch, old_ids = [], []
+        self._insert(model, batch, old_ids, ids)
+
+    def _rewrite(self, model, row, remap):
+        for column, related in remap.items():
+            if row[column] is None:
+                continue
+            new = self.ids[related].get(row[column])
+            if new is None:
+                if not model._meta.get_field(column.removesuffix('_id')).null:
+                    return False
+            row[column] = new
+        return True
+
+    def _insert(self, model, batch, old_ids, ids):
+        if not batch:
+            return
+        model.objects.using(self.target).bulk_create(batch, batch_size=self.batch_size)
+        ids.update(zip(old_ids, (obj.pk for obj in batch)))
+        self.counts[model] = self.counts.get(model, 0) + len(batch)
+
+    def archived(self, queryset):
+        """ Copy archived bugs, rewriting the ids inside their blobs to the copied objects. """
+        batch = []
+        for row in queryset.order_by('pk').iterator(chunk_size=self.batch_size):
+            row.pk = None
+            row.project_id = self.ids[Project][row.project_id]
+            row.data = archive.pack(archive.remap(archive.unpack(row), self.ids))
+            batch.append(row)
+            if len(batch) == self.batch_size:
+                self._insert(ArchivedBug, batch, [], {})
+                batch = []
+        self._insert(ArchivedBug, batch, [], {})
+
+    def tags(self, tag_ids):
+        """ Tags are matched by name: reuse the target's tag of the same name, or create it. """
+        names = dict(Tag.objects.using(self.source).filter(pk__in=tag_ids).values_list('pk', 'name'))
+        existing = dict(Tag.objects.using(self.target).filter(name__in=names.values()).values_list('name', 'pk'))
+        created = Tag.objects.using(self.target).bulk_create(
+            [Tag(name=name) for name in names.values() if name not in existing], batch_size=self.batch_size,
+        )
+        existing.update((tag.name, tag.pk) for tag in created)
+        self.ids[Tag] = {pk: existing[name] for pk, name in names.items()}
+        self.counts[Tag] = len(created)
+
+    def blobs(self, references):
+        """ Give the target's blob rows the copied references, {sha256: count} (the files are shared). """
+        existing = set(AttachmentBlob.objects.using(self.target).filter(pk__in=references).values_list('pk', flat=True))
+        missing = list(AttachmentBlob.objects.using(self.source).filter(pk__in=references.keys() - existing))
+        for blob in missing:
+            blob.ref_count = 0
+        AttachmentBlob.objects.using(self.target).bulk_create(missing, batch_size=self.batch_size)
+        LogIndex.objects.using(self.target).bulk_create(
+            list(LogIndex.objects.using(self.source).filter(blob__in=[blob.pk for blob in missing])),
+            batch_size=self.batch_size,
+        )
+        for sha256, count in references.items():
+            AttachmentBlob.objects.using(self.target).filter(pk=sha256).update(ref_count=F('ref_count') + count)
+        self.counts[AttachmentBlob] = len(missing)
+
+
+def _workers(workspace_id, user_ids):
+    """ Workers go with their team; those without one go with their user's workspace. """
+    return Q(team__workspace_id=workspace_id) | Q(team__isnull=True, user_id__in=user_ids)
+
+
+def _delete_workspace_data(alias, workspace_id, user_ids):
+    """ Delete a workspace's Core rows from one database, with the usual cascades and signals. """
+    with use_shard(alias), transaction.atomic(using=alias):
+        Project.objects.using(alias).filter(workspace_id=workspace_id).delete()
+        Worker.objects.using(alias).filter(_workers(workspace_id, user_ids)).delete()
+        Team.objects.using(alias).filter(workspace_id=workspace_id).delete()
+        Notification.objects.using(alias).filter(user_id__in=user_ids).delete()
+        NotificationEvent.objects.using(alias).filter(user_id__in=user_ids).delete()
+
+
+def move_workspace(workspace_id, target, batch_size=1000):
+    """ Move a workspace's Core data to the `target` database; returns the _Copy with its counts.
+
+    Writes to the workspace are refused (503) while it moves. Objects get new
+    ids on the target, and delta-sync clients are told to fetch everything again.
+    """
+    entry, _ = WorkspaceShard.objects.get_or_create(workspace_id=workspace_id, defaults={'alias': CONTROL})
+    source = entry.alias
+    entry.moving = True
+    entry.save()
+    _moving['checked_at'] = None
+    try:
+        # Let every process see the flag: the router re-reads it this often, cached lookups (the 503 of
+        # ShardedJWTAuthentication) when the cache version is re-checked.
+        time.sleep(max(MOVING_TTL, cache.get_config()['VERSION_TTL']))
+        user_ids = list(User.objects.filter(workspace_id=workspace_id).values_list('pk', flat=True))
+        copy = _Copy(source, target, batch_size)
+        bugs = Bug.objects.filter(project__workspace_id=workspace_id)
+        with use_shard(target), transaction.atomic(using=target):
+            _delete_workspace_data(target, workspace_id, user_ids)  # What an interrupted earlier move left.
+            copy.copy(Team, Team.objects.filter(workspace_id=workspace_id))
+            copy.copy(
+                Worker, Worker.objects.filter(_workers(workspace_id, user_ids)),
+                {'team_id': Team},
+            )
+            copy.copy(Project, Project.objects.filter(workspace_id=workspace_id), {'assigned_team_id': Team})
+            copy.copy(Sprint, Sprint.objects.filter(project__workspace_id=workspace_id), {'project_id': Project})
+            copy.tags(set(Bug.tags.through.objects.using(source).filter(bug__in=bugs).values_list('tag_id', flat=True)))
+            copy.copy(Bug, bugs, {
+                'project_id': Project, 'sprint_id': Sprint, 'assigned_team_id': Team, 'assigned_worker_id': Worker,
+            })
+            copy.copy(Bug.tags.through, Bug.tags.through.objects.filter(bug__in=bugs), {'bug_id': Bug, 'tag_id': Tag})
+            copy.copy(
+                Bug.dependencies.through, Bug.dependencies.through.objects.filter(from_bug__in=bugs, to_bug__in=bugs),
+                {'from_bug_id': Bug, 'to_bug_id': Bug},
+            )
+            copy.copy(SavedFilter, SavedFilter.objects.filter(project__workspace_id=workspace_id), {'project_id': Project})
+            copy.copy(
+                GitHubSyncState, GitHubSyncState.objects.filter(project__workspace_id=workspace_id), {'project_id': Project},
+            )
+            copy.copy(BugSignature, BugSignature.objects.filter(bug__in=bugs), {'bug_id': Bug, 'project_id': Project})
+            copy.copy(BugLSHBand, BugLSHBand.objects.filter(bug__in=bugs), {'bug_id': Bug, 'project_id': Project})
+            attachments = BugAttachment.objects.filter(bug__in=bugs)
+            archived = ArchivedBug.objects.using(source).filter(project__workspace_id=workspace_id)
+            references = Counter(attachments.using(source).exclude(blob=None).values_list('blob_id', flat=True))
+            copy.blobs(references + archive.blob_references(archived.iterator(chunk_size=batch_size)))
+            copy.copy(BugAttachment, attachments, {'bug_id': Bug})
+            copy.archived(archived)
+            copy.copy(
+                ActivityLog, ActivityLog.objects.filter(project__workspace_id=workspace_id),
+                {'project_id': Project, 'bug_id': Bug, 'worker_id': Worker},
+            )
+            copy.copy(TimeTracking, TimeTracking.objects.filter(bug__in=bugs), {'bug_id': Bug, 'worker_id': Worker})
+            copy.copy(Notification, Notification.objects.filter(user_id__in=user_ids), {'bug_id': Bug})
+            copy.copy(NotificationEvent, NotificationEvent.objects.filter(user_id__in=user_ids), {'bug_id': Bug})
+
+        entry.alias = target
+        entry.moved_at = timezone.now()
+    finally:
+        entry.moving = False
+        entry.save()
+        _moving['checked_at'] = None
+    # Cached permission sets hold the old project ids.
+    cache.cache_for(Project).invalidate()
+    _delete_workspace_data(source, workspace_id, user_ids)
+    return copy
+
+
+# --------------------------- Signal receivers --------------------------- #
+# Deletes do not cascade from the control database to the shards by themselves.
+
+def workspace_deleting(sender, instance, using, **kwargs):
+    alias = shard_for(instance.pk)
+    if alias != using:
+        user_ids = list(User.objects.using(using).filter(workspace=instance).values_list('pk', flat=True))
+        _delete_workspace_data(alias, instance.pk, user_ids)
+
+
+def user_deleting(sender, instance, using, **kwargs):
+    for alias in shards():
+        if alias == using:
+            continue
+        with transaction.atomic(using=alias):
+            Worker.objects.using(alias).filter(user_id=instance.pk).delete()
+            Notification.objects.using(alias).filter(user_id=instance.pk).delete()
+            NotificationEvent.objects.using(alias).filter(user_id=instance.pk).delete()
+            Bug.objects.using(alias).filter(reported_by_id=instance.pk).update(reported_by=None)
+            SavedFilter.objects.using(alias).filter(owner_id=instance.pk).update(owner=None)
+
+
+pre_delete.connect(workspace_deleting, sender=Workspace, dispatch_uid='core-sharding-workspace-deleting')
+pre_delete.connect(user_deleting, sender=User, dispatch_uid='core-sharding-user-deleting')
+post_migrate.connect(reserve_id_range, sender=apps.get_app_config('Core'), dispatch_uid='core-sharding-id-range')
@@ -0,0 +1,9 @@
+from django.dispatch import Signal
+
+# Sent by queryset-level bug writes that bypass Bug's model signals (see
+# Core/bulk.py), inside the writing transaction, with keyword arguments
+# `bug_ids`, `project_ids`, `fields` (the set of changed column names, e.g.
+# {'status', 'sprint_id'}), `changes` ({bug id: {column: [old, new]}}) and
+# `changed_by` (the user who made them). Receivers that keep derived data
+# current listen to it alongside post_save.
+bugs_bulk_updated = Signal()
@@ -0,0 +1,278 @@
+import threading
+import time
+from array import array
+from bisect import bisect_left
+
+from django.db import connections, router, transaction
+from django.db.models.signals import m2m_changed, post_delete, post_init, post_save
+
+from . import cache
+from .models import Bug
+
+# --------------------------- Tag bitmap index --------------------------- #
+# For each project, bugs get consecutive positions in id order and every tag a
+# bitmap (a Python int) with the positions of the bugs carrying it. "tags A and
+# B but not C" becomes `alive & A & B & ~C`, which runs in C over machine words
+# instead of joining the through table once per tag. A project's index is
+# built in one pass the first time it is queried and then updated in place by
+# Bug and m2m_changed signals. Other processes learn about changes through a
+# version counter in the shared cache and rebuild when theirs falls behind.
+
+_indexes = {}
+_lock = threading.Lock()
+
+
+def _backend():
+    return cache.caches[cache.get_config()['BACKEND']]
+
+
+def _version_key(project_id):
+    return f"tag-index:{project_id}:version"
+
+
+class ProjectTagIndex:
+    """ Tag bitmaps of one project's bugs. Bit i stands for the bug with id `self.ids[i]`. """
+
+    def __init__(self, project_id):
+        self.project_id = project_id
+        self.ids = array('q')
+        self.alive = 0
+        self.tags = {}
+        self.version = None
+        self.checked_at = 0.0
+        self.provisional = None
+        self.using = None
+        self.lock = threading.Lock()
+
+    def build(self):
+        """ Read the project's bug ids and tag links once, in bug id order. """
+        version = _backend().get(_version_key(self.project_id), 1)
+        ids = array('q', Bug.objects.filter(project_id=self.project_id).order_by('pk').values_list('pk', flat=True))
+        size = (len(ids) + 7) // 8
+        bits = {}
+        links = (
+            Bug.tags.through.objects.filter(bug__project_id=self.project_id)
+            .order_by('bug_id').values_list('bug_id', 'tag_id')
+        )
+        position, count = 0, len(ids)
+        for bug_id, tag_id in links.iterator(chunk_size=10000):
+            # Both sides are sorted by bug id, so this walks `ids` once.
+            while position < count and ids[position] < bug_id:
+                position += 1
+            if position == count or ids[position] != bug_id:
+                continue  # Bug created after `ids` was read; the version bump will trigger a rebuild.
+            tag_bits = bits.get(tag_id)
+            if tag_bits is None:
+                tag_bits = bits[tag_id] = bytearray(size)
+            tag_bits[position >> 3] |= 1 << (position & 7)
+        with self.lock:
+            self.ids = ids
+            self.alive = (1 << len(ids)) - 1
+            self.tags = {tag_id: int.from_bytes(data, 'little') for tag_id, data in bits.items()}
+            self.version = version
+            self.checked_at = time.monotonic()
+        using = router.db_for_read(Bug)
+        if connections[using].in_atomic_block:
+            # Built from rows that may yet be rolled back: only trust it inside
+            # this transaction, or after it commits.
+            def settle():
+                self.provisional = None
+            self.provisional = settle
+            self.using = using
+            transaction.on_commit(settle, using=using)
+        return self
+
+    def usable(self):
+        """ False for an index built in a transaction that has since been rolled back (or in another thread's). """
+        if self.provisional is None:
+            return True
+        # Django drops on_commit callbacks on rollback, so ours is only there while the transaction is open.
+        return any(entry[1] is self.provisional for entry in connections[self.using].run_on_commit)
+
+    def position(self, bug_id):
+        position = bisect_left(self.ids, bug_id)
+        return position if position < len(self.ids) and self.ids[position] == bug_id else None
+
+    # --------------------------- Updates --------------------------- #
+
+    def add_bug(self, bug_id):
+        """ Give a new bug a position; False if it cannot go at the end and the index must be rebuilt. """
+        with self.lock:
+            if self.ids and bug_id <= self.ids[-1]:
+                return self.position(bug_id) is not None
+            self.ids.append(bug_id)
+            self.alive |= 1 << (len(self.ids) - 1)
+            return True
+
+    def remove_bug(self, bug_id):
+        with self.lock:
+            position = self.position(bug_id)
+            if position is not None:
+                self.alive &= ~(1 << position)
+            return True
+
+    def set_tags(self, bug_id, tag_ids, present):
+        with self.lock:
+            position = self.position(bug_id)
+            if position is None:
+                return False
+            bit = 1 << position
+            for tag_id in tag_ids:
+                if present:
+                    self.tags[tag_id] = self.tags.get(tag_id, 0) | bit
+                elif tag_id in self.tags:
+                    self.tags[tag_id] &= ~bit
+            return True
+
+    # --------------------------- Queries --------------------------- #
+
+    def match(self, all_tags=(), any_tags=(), no_tags=()):
+        """ Bitmap of bugs that carry every tag in `all_tags`, at least one of `any_tags` and none of `no_tags`. """
+        tags = self.tags
+        result = self.alive
+        for tag_id in all_tags:
+            result &= tags.get(tag_id, 0)
+        if any_tags:
+            either = 0
+            for tag_id in any_tags:
+                either |= tags.get(tag_id, 0)
+            result &= either
+        for tag_id in no_tags:
+            result &= ~tags.get(tag_id, 0)
+        return result
+
+    def page(self, bits, limit, before=None):
+        """ Up to `limit` bug ids from the bitmap, highest id first, all below `before` if given. """
+        if before is not None:
+            bits &= (1 << bisect_left(self.ids, before)) - 1
+        found = []
+        while bits and len(found) < limit:
+            position = bits.bit_length() - 1
+            found.append(self.ids[position])
+            bits ^= 1 << position
+        return found
+
+
+def _bump(project_id, index=None):
+    """ Tell other processes the project changed; keep `index` current if no one else did. """
+    key = _version_key(project_id)
+    backend = _backend()
+    try:
+        version = backend.incr(key)
+    except ValueError:
+        backend.add(key, 1, None)
+        version = backend.incr(key)
+    if index is not None:
+        index.version = version if index.version == version - 1 else None
+
+
+def get_index(project_id):
+    """ The project's index, built or rebuilt when missing or behind the shared version. """
+    index = _indexes.get(project_id)
+    if index is not None and not index.usable():
+        index = None
+    ttl = cache.get_config()['VERSION_TTL']
+    if index is not None and time.monotonic() - index.checked_at <= ttl and index.version is not None:
+        return index
+    if index is not None and index.version is not None:
+        if _backend().get(_version_key(project_id), 1) == index.version:
+            index.checked_at = time.monotonic()
+            return index
+    with _lock:
+        current = _indexes.get(project_id)
+        if current is not None and current is not index and current.version is not None and current.usable():
+            return current  # Another thread rebuilt it while this one waited.
+        index = ProjectTagIndex(project_id).build()
+        _indexes[project_id] = index
+    return index
+
+
+def invalidate(project_id):
+    """ Make every process rebuild the project's index once the current transaction commits.
+
+    For bulk writes that send no signals, such as `bulk_create` of tag links.
+    """
+    _apply(project_id, lambda index: False)
+
+
+def query(project_id, all_tags=(), any_tags=(), no_tags=(), limit=50, before=None):
+    """ (matching bug count, ids of the first `limit` matches, newest first) """
+    index = get_index(project_id)
+    bits = index.match(all_tags, any_tags, no_tags)
+    return bits.bit_count(), index.page(bits, limit, before)
+
+
+# --------------------------- Signal receivers --------------------------- #
+# Changes reach a shared index only once their transaction commits, so a
+# rollback cannot leave bits behind; until then the transaction itself reads
+# the index as it was. An index built inside the transaction is thrown away on
+# rollback, so it takes changes right away. Every change is idempotent.
+
+def _apply(project_id, change):
+    """ Run `change(index)` on the loaded index (False means rebuild) and bump the version after commit. """
+    def apply():
+        index = _indexes.get(project_id)
+        if index is not None and change(index) is False:
+            _indexes.pop(project_id, None)
+            index = None
+        _bump(project_id, index)
+
+    index = _indexes.get(project_id)
+    if index is not None and index.provisional is not None and index.usable() and change(index) is False:
+        _indexes.pop(project_id, None)
+    transaction.on_commit(apply, using=router.db_for_write(Bug))
+
+
+def bug_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if raw or update_fields is not None and 'project' not in update_fields and 'project_id' not in update_fields:
+        return
+    if created:
+        _apply(instance.project_id, lambda index: index.add_bug(instance.pk))
+        return
+    previous = getattr(instance, '_tag_index_project_id', instance.project_id)
+    if previous != instance.project_id:
+        # Moving a bug between projects is rare; rebuild both sides. None means
+        # the project was not loaded, so only the current side is known.
+        for project_id in {previous, instance.project_id} - {None}:
+            _apply(project_id, lambda index: False)
+    instance._tag_index_project_id = instance.project_id
+
+
+def bug_deleted(sender, instance, **kwargs):
+    bug_id = instance.pk  # The collector clears it before an outer transaction commits.
+    _apply(instance.project_id, lambda index: index.remove_bug(bug_id))
+
+
+def bug_tags_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == 'pre_clear':
+        owner = {'tag_id': instance.pk} if reverse else {'bug_id': instance.pk}
+        field = 'bug_id' if reverse else 'tag_id'
+        instance._tag_index_cleared = set(sender.objects.filter(**owner).values_list(field, flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    changed = instance.__dict__.pop('_tag_index_cleared', set()) if action == 'post_clear' else set(pk_set)
+    if not changed:
+        return
+    present = action == 'post_add'
+
+    if not reverse:
+        _apply(instance.project_id, lambda index: index.set_tags(instance.pk, changed, present))
+        return
+    by_project = {}
+    for bug_id, project_id in Bug.objects.filter(pk__in=changed).values_list('pk', 'project_id'):
+        by_project.setdefault(project_id, []).append(bug_id)
+    for project_id, bug_ids in by_project.items():
+        _apply(project_id, lambda index, bug_ids=bug_ids: all(
+            [index.set_tags(bug_id, [instance.pk], present) for bug_id in bug_ids]
+        ))
+
+
+def remember_project(sender, instance, **kwargs):
+    instance._tag_index_project_id = instance.__dict__.get('project_id')
+
+
+post_init.connect(remember_project, sender=Bug, dispatch_uid='core-tag-index-remember')
+post_save.connect(bug_saved, sender=Bug, dispatch_uid='core-tag-index-bug-saved')
+post_delete.connect(bug_deleted, sender=Bug, dispatch_uid='core-tag-index-bug-deleted')
+m2m_changed.connect(bug_tags_changed, sender=Bug.tags.through, dispatch_uid='core-tag-index-tags')
@@ -1,3 +1,1514 @@
-from django.test import TestCase
+import importlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from collections import Counter
+from concurrent.futures import Future
+from datetime import date, datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock, skipUnless
 
-# Create your tests here.
+from asgiref.sync import sync_to_async
+from django.apps import apps
+from django.conf import settings
+from django.contrib.auth.models import update_last_login
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured, MiddlewareNotUsed
+from django.core.exceptions import ValidationError
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.db import connection, connections, transaction
+from django.db.models.signals import post_delete
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.permissions import IsAuthenticated
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient, APIRequestFactory, force_authenticate
+from rest_framework.views import APIView
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from Auth.models import User
+from Server import profiling, renderers, routers
+from Server.backends.sqlite3.base import DatabaseWrapper as TunedSQLiteWrapper
+from . import (
+    archive, attachments, bulk, cache, changelog, dedup, logindex, notifications, permissions, purge, saved_filters,
+    sharding, tag_index, triage,
+)
+from .admin_performance import EstimatedCountPaginator, estimate_row_count
+from .benchmarks import harness
+from .github.client import GitHubClient
+from .github.fake import FakeGitHub
+from .github.sync import ProjectSync, async_sync_projects, repo_slug
+from .models import (
+    ActivityLog, ArchivedBug, AttachmentBlob, Bug, BugAttachment, BugLSHBand, BugSignature, ChangeLog, GitHubSyncState,
+    Notification, NotificationEvent, Project, SavedFilter, Sprint, Tag, Team, TimeTracking, Worker, Workspace,
+    WorkspaceShard,
+)
+from .serializers import BugListSerializer, BugPatchSerializer
+from .versioning import VersionConflict
+
+
+def make_user(email, **extra_fields):
+    return User.objects.create_user(email, "Test", "User", "password", is_verified=True, **extra_fields)
+
+
+def reset_caches():
+    """ Empty the lookup, permission and filter caches, in this process and in the shared backend. """
+    caches[cache.get_config()['BACKEND']].clear()
+    for model_cache in cache._registry.values():
+        model_cache.local.clear()
+        model_cache._version = None
+    permissions._local.clear()
+    saved_filters._plans.clear()
+    saved_filters._project_plans.clear()
+    tag_index._indexes.clear()
+    sharding._moving['checked_at'] = None
+
+
+@override_settings(PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'])
+class CoreTestCase(TestCase):
+    """ A workspace with one project and one user in it; every test starts with empty caches. """
+    databases = {*sharding.databases()}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.workspace = Workspace.objects.create(name="Acme")
+        cls.user = make_user("dev@example.com", workspace=cls.workspace)
+        cls.project = Project.objects.create(workspace=cls.workspace, name="Tracker")
+
+    def setUp(self):
+        reset_caches()
+
+    def use_temp_media_root(self):
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        self.enterContext(override_settings(MEDIA_ROOT=media_root.name))
+
+    def make_bugs(self, count, **fields):
+        return [
+            Bug.objects.create(project=self.project, title=f"Crash number {i}", description="Steps", **fields)
+            for i in range(count)
+        ]
+
+
+# --------------------------- Lookup cache --------------------------- #
+
+class LookupCacheTests(CoreTestCase):
+    def test_second_lookup_is_served_from_memory(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(cache.get(Project, self.project.pk).name, "Tracker")
+        with self.assertNumQueries(0):
+            self.assertEqual(cache.get(Project, self.project.pk).name, "Tracker")
+
+    def test_save_invalidates_when_the_transaction_commits(self):
+        cache.get(Project, self.project.pk)
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.project.name = "Renamed"
+            self.project.save()
+            self.assertEqual(cache.get(Project, self.project.pk).name, "Tracker")
+        for callback in callbacks:
+            callback()
+        self.assertEqual(cache.get(Project, self.project.pk).name, "Renamed")
+
+    def test_login_does_not_invalidate_workers(self):
+        Worker.objects.create(user=self.user)
+        workers = cache.cache_for(Worker)
+        version = workers.version()
+        with self.captureOnCommitCallbacks(execute=True):
+            update_last_login(None, self.user)
+        self.assertEqual(workers.version(), version)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.email = "lead@example.com"
+            self.user.save(update_fields=['email'])
+        self.assertNotEqual(workers.version(), version)
+
+    def test_patch_targets_are_validated_through_the_cache(self):
+        team = Team.objects.create(workspace=self.workspace, name="QA")
+        worker = Worker.objects.create(user=self.user, team=team)
+        data = {'assigned_team': team.pk, 'assigned_worker': worker.pk}
+        self.assertTrue(BugPatchSerializer(data=data).is_valid())
+        with self.assertNumQueries(0):
+            serializer = BugPatchSerializer(data=data)
+            self.assertTrue(serializer.is_valid())
+        self.assertEqual(serializer.validated_data, {'assigned_team': team, 'assigned_worker': worker})
+        serializer = BugPatchSerializer(data={'assigned_team': team.pk + 100, 'assigned_worker': 'x'})
+        self.assertFalse(serializer.is_valid())
+        self.assertEqual(set(serializer.errors), {'assigned_team', 'assigned_worker'})
+
+
+# --------------------------- Admin changelists --------------------------- #
+
+class AdminChangelistTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser("admin@example.com", "Ada", "Admin", "password"))
+
+    def test_unfiltered_count_is_estimated_above_the_threshold(self):
+        self.make_bugs(3)
+        paginator = EstimatedCountPaginator(Bug.objects.order_by('-pk'), 2)
+        paginator.exact_count_threshold = 1
+        with self.assertNumQueries(1):
+            self.assertGreaterEqual(paginator.count, 3)
+        paginator = EstimatedCountPaginator(Bug.objects.filter(status='open').order_by('-pk'), 2)
+        paginator.filtered_count_cap = 2
+        self.assertEqual(paginator.count, 2)
+
+    def test_cursor_pages_by_descending_id(self):
+        bugs = self.make_bugs(5)
+        response = self.client.get('/admin/Core/bug/', {'cursor': bugs[3].pk})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bug.pk for bug in response.context['cl'].result_list], [bug.pk for bug in bugs[2::-1]])
+
+    def test_cursor_follows_the_changelist_ordering(self):
+        bugs = self.make_bugs(5)
+        now = timezone.now()
+        for bug, minutes in zip(bugs, (4, 3, 2, 2, 0)):
+            Bug.objects.filter(pk=bug.pk).update(created_at=now + timedelta(minutes=minutes))
+        # BugAdmin orders by -created_at with -pk breaking the tie between bugs[2] and bugs[3].
+        response = self.client.get('/admin/Core/bug/', {'cursor': bugs[3].pk})
+        self.assertEqual([bug.pk for bug in response.context['cl'].result_list], [bugs[2].pk, bugs[4].pk])
+        title = response.context['cl'].list_display.index('title')
+        response = self.client.get('/admin/Core/bug/', {'cursor': bugs[1].pk, 'o': title})
+        self.assertEqual([bug.pk for bug in response.context['cl'].result_list], [bug.pk for bug in bugs[2:]])
+
+
+# --------------------------- Tuned SQLite backend --------------------------- #
+
+class TunedSQLiteBackendTests(SimpleTestCase):
+    def test_pragmas_are_applied_to_new_connections(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            settings_dict = connections.configure_settings({'default': {
+                'ENGINE': 'Server.backends.sqlite3', 'NAME': os.path.join(tmp, 'tuned.sqlite3'),
+                'OPTIONS': {'transaction_mode': 'IMMEDIATE', 'pragmas': {'busy_timeout': 1234}},
+            }})['default']
+            wrapper = TunedSQLiteWrapper(settings_dict, alias='tuned')
+            try:
+                with wrapper.cursor() as cursor:
+                    self.assertEqual(cursor.execute("PRAGMA journal_mode").fetchone()[0], 'wal')
+                    self.assertEqual(cursor.execute("PRAGMA busy_timeout").fetchone()[0], 1234)
+                    self.assertEqual(cursor.execute("PRAGMA synchronous").fetchone()[0], 1)  # NORMAL
+            finally:
+                wrapper.close()
+
+
+# --------------------------- DATABASE_URL deployments --------------------------- #
+
+class ReplicaRoutingTests(SimpleTestCase):
+    def test_reads_use_the_replica_only_when_asked(self):
+        router = routers.ReplicaRouter()
+        with mock.patch.dict(settings.DATABASES, replica={}):
+            self.assertIsNone(router.db_for_read(Bug))
+            with routers.read_from_replica():
+                self.assertEqual(router.db_for_read(Bug), 'replica')
+                self.assertEqual(router.db_for_write(Bug), 'default')
+        with routers.read_from_replica():
+            self.assertIsNone(router.db_for_read(Bug))
+
+    @override_settings(REPLICA_READ_PATHS=['/api/core/'])
+    def test_middleware_routes_safe_requests_under_the_read_paths(self):
+        seen = []
+        middleware = routers.ReplicaRoutingMiddleware(lambda request: seen.append(routers._use_replica.get()))
+        with mock.patch.dict(settings.DATABASES, replica={}):
+            for method, path in (('get', '/api/core/changes/'), ('post', '/api/core/bugs/bulk/'),
+                                 ('get', '/api/v1/auth/profile/')):
+                middleware(getattr(RequestFactory(), method)(path))
+        self.assertEqual(seen, [True, False, False])
+
+
+@skipUnless(connection.vendor == 'postgresql', "Needs DATABASE_URL pointing at Postgres (docker-compose.postgres.yml).")
+class PostgresDeploymentTests(SimpleTestCase):
+    databases = {'default'}
+
+    def test_connection_outlives_the_request(self):
+        if not connection.settings_dict['CONN_MAX_AGE']:
+            self.skipTest("DB_POOL hands connections back to the pool instead.")
+        connection.ensure_connection()
+        raw = connection.connection
+        connection.close_if_unusable_or_obsolete()
+        self.assertIs(connection.connection, raw)
+
+    def test_row_estimate_comes_from_planner_statistics(self):
+        self.assertIsInstance(estimate_row_count(Bug, 'default'), int)
+
+
+# --------------------------- Benchmark suite --------------------------- #
+
+class BenchmarkSuiteTests(TestCase):
+    def test_compare_flags_slower_runs_and_extra_queries(self):
+        baseline = {'list': {'median_ms': 10.0, 'queries': 2}, 'detail': {'median_ms': 4.0, 'queries': 1}}
+        current = {'list': {'median_ms': 10.5, 'queries': 3}, 'detail': {'median_ms': 5.0, 'queries': 1},
+                   'new': {'median_ms': 1.0, 'queries': 1}}
+        rows = {name: regressed for name, _, _, _, regressed in harness.compare(baseline, current, 0.10)}
+        self.assertEqual(rows, {'list': True, 'detail': True})
+
+    def test_run_writes_results_and_rolls_the_seed_back(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, 'results.json')
+            call_command('run_benchmarks', scale='tiny', repeat=1, output=path, stdout=io.StringIO())
+            with open(path) as fh:
+                results = json.load(fh)['results']
+            call_command('run_benchmarks', scale='tiny', repeat=1, compare=path, stdout=io.StringIO())
+        self.assertEqual({result['group'] for result in results.values()}, {'orm', 'request', 'admin'})
+        self.assertFalse(Bug.objects.exists())
+
+
+# --------------------------- Attachment store --------------------------- #
+
+class AttachmentStoreTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        [self.bug] = self.make_bugs(1)
+
+    def upload(self, content=b"stack trace", name="crash.bin"):
+        return SimpleUploadedFile(name, content, content_type='application/octet-stream')
+
+    def test_identical_content_is_stored_once(self):
+        first = attachments.attach(self.bug, self.upload(name="a.bin"))
+        second = attachments.attach(self.bug, self.upload(name="b.bin"))
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 2)
+        with open(attachments.blob_path(first.blob_id), 'rb') as fh:
+            self.assertEqual(fh.read(), b"stack trace")
+
+    def test_failed_insert_does_not_keep_a_reference(self):
+        attachments.attach(self.bug, self.upload())
+        with mock.patch.object(BugAttachment.objects, 'create', side_effect=RuntimeError):
+            with self.assertRaises(RuntimeError):
+                attachments.attach(self.bug, self.upload())
+            with self.assertRaises(RuntimeError):
+                attachments.attach(self.bug, self.upload(b"other content"))
+        self.assertEqual(list(AttachmentBlob.objects.values_list('ref_count', flat=True)), [1])
+
+    def test_unreferenced_blobs_are_collected(self):
+        attachment = attachments.attach(self.bug, self.upload())
+        path = attachments.blob_path(attachment.blob_id)
+        attachment.delete()
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 0)
+        removed, orphans, freed = attachments.collect_garbage(grace_seconds=-1)
+        self.assertEqual((removed, orphans, freed), (1, 0, len(b"stack trace")))
+        self.assertFalse(AttachmentBlob.objects.exists())
+        self.assertFalse(os.path.exists(path))
+
+    def test_upload_and_ranged_download(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f'/api/core/bugs/{self.bug.pk}/attachments/', {'file': self.upload()})
+        self.assertEqual(response.status_code, 201)
+        url = f"/api/core/attachments/{response.json()[0]['id']}/download/"
+        response = client.get(url, HTTP_RANGE='bytes=6-')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(b''.join(response.streaming_content), b"trace")
+        response = client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, 304)
+
+
+# --------------------------- Log index --------------------------- #
+
+@override_settings(LOGINDEX_BLOCK_SIZE=64 * 1024)
+class LogIndexTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        [self.bug] = self.make_bugs(1)
+        lines = [f"INFO request {i} served in {i % 97} ms" for i in range(20000)]
+        lines[15000] = "ERROR DiskQuotaExceeded while writing segment 7"
+        self.log = ("\n".join(lines) + "\n").encode()
+
+    def attach_log(self, codec):
+        with override_settings(LOGINDEX_CODEC=codec), self.captureOnCommitCallbacks(execute=True):
+            attachment = attachments.attach(self.bug, SimpleUploadedFile("server.log", self.log))
+        return attachment
+
+    def test_literal_search_reads_only_candidate_blocks(self):
+        for codec in ('gzip', 'zstd') if logindex.zstandard else ('gzip',):
+            with self.subTest(codec=codec):
+                attachment = self.attach_log(codec)
+                index = attachment.blob.log_index
+                self.assertEqual((index.codec, index.line_count), (codec, 20000))
+                self.assertGreater(index.block_count, 3)
+                found = logindex.search_project_logs(self.project.pk, "DiskQuotaExceeded")
+                self.assertEqual([(r['line'], r['attachment']) for r in found['results']], [(15001, attachment.pk)])
+                self.assertEqual(found['blocks_scanned'], 1)
+                attachment.blob.log_index.delete()
+                attachment.delete()
+
+    def test_regex_and_case_insensitive_search(self):
+        self.attach_log('gzip')
+        found = logindex.search_project_logs(self.project.pk, r"segment \d+$", regex=True)
+        self.assertEqual([r['line'] for r in found['results']], [15001])
+        found = logindex.search_project_logs(self.project.pk, "diskquota", ignore_case=True)
+        self.assertEqual(len(found['results']), 1)
+        found = logindex.search_project_logs(self.project.pk, "request", limit=5)
+        self.assertEqual((len(found['results']), found['truncated']), (5, True))
+        with self.assertRaises(logindex.SearchError):
+            logindex.search_project_logs(self.project.pk, "(", regex=True)
+
+    def test_a_rebuilt_index_is_reloaded(self):
+        attachment = self.attach_log('gzip')
+        sha256 = attachment.blob_id
+        blocks = len(logindex.load_table(sha256)['blocks'])
+        # Rebuilt elsewhere: this process cleared nothing, the replaced .idx file is what changed.
+        index = logindex.index_blob(attachment.blob, block_size=16 * 1024)
+        self.assertGreater(index.block_count, blocks)
+        self.assertEqual(len(logindex.load_table(sha256)['blocks']), index.block_count)
+        found = logindex.search_project_logs(self.project.pk, "DiskQuotaExceeded")
+        self.assertEqual([r['line'] for r in found['results']], [15001])
+
+
+# --------------------------- Duplicate detection --------------------------- #
+
+class DuplicateDetectionTests(CoreTestCase):
+    LOGIN = "Login page crashes with a null pointer exception after submitting the password form"
+
+    def create(self, title, description=""):
+        return Bug.objects.create(project=self.project, title=title, description=description)
+
+    def test_bugs_without_latin_words_can_be_saved(self):
+        for title in ("The", "", "Ошибка входа", "ログインできない"):
+            with self.subTest(title=title):
+                bug = self.create(title)
+                self.assertTrue(BugSignature.objects.filter(bug=bug).exists())
+        self.assertEqual(dedup.find_duplicates(self.project.pk, "The", ""), [])
+        self.assertFalse(BugLSHBand.objects.filter(bug__title__in=["The", ""]).exists())
+
+    def test_similar_text_is_found_and_unrelated_text_is_not(self):
+        original = self.create(self.LOGIN)
+        self.create("Export to CSV drops the last column of the report")
+        matches = dedup.find_duplicates(self.project.pk, self.LOGIN.replace("crashes", "crashed"), "")
+        self.assertEqual([bug_id for _, bug_id in matches], [original.pk])
+        self.assertEqual(dedup.find_duplicates(self.project.pk, self.LOGIN, "", exclude=original.pk), [])
+
+    def test_non_latin_duplicates_are_found(self):
+        original = self.create("Ошибка входа в систему после смены пароля пользователя через мобильное приложение")
+        matches = dedup.find_duplicates(
+            self.project.pk, "Ошибка входа в систему после смены пароля пользователя через веб приложение", "",
+        )
+        self.assertEqual([bug_id for _, bug_id in matches], [original.pk])
+
+    def test_editing_the_text_re_signs_the_bug(self):
+        bug = self.create("Export to CSV drops the last column of the report")
+        bug.title = self.LOGIN
+        bug.save()
+        self.assertEqual([bug_id for _, bug_id in dedup.find_duplicates(self.project.pk, self.LOGIN, "")], [bug.pk])
+
+    def test_clusters_group_duplicates(self):
+        first, second = self.create(self.LOGIN), self.create(self.LOGIN + " twice")
+        self.create("Export to CSV drops the last column of the report")
+        self.assertEqual(dedup.cluster_project(self.project.pk), [[first.pk, second.pk]])
+
+    def test_duplicates_endpoint(self):
+        original = self.create(self.LOGIN)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/core/projects/{self.project.pk}/bugs/duplicates/'
+        response = client.post(url, {'title': self.LOGIN, 'description': ''}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([match['id'] for match in response.json()], [original.pk])
+        response = client.post(url, {'title': "Ошибка", 'description': ''}, format='json')
+        self.assertEqual((response.status_code, response.json()), (200, []))
+
+
+# --------------------------- GitHub sync --------------------------- #
+
+class GitHubSyncTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.github = self.enterContext(FakeGitHub(seed=1))
+        self.issues = self.github.add_repo('acme/tracker', 25, pull_requests=3)
+        self.project.github_repo = "https://github.com/acme/tracker"
+        self.project.save()
+
+    async def sync(self, full=False):
+        [result] = await async_sync_projects([self.project], full, base_url=self.github.url, per_page=10, token='')
+        return result
+
+    def test_repo_slug(self):
+        self.assertEqual(repo_slug("https://github.com/acme/tracker.git"), "acme/tracker")
+        self.assertEqual(repo_slug("git@github.com:acme/tracker"), "acme/tracker")
+        self.assertIsNone(repo_slug("https://gitlab.com/acme/tracker"))
+
+    async def test_first_sync_fetches_every_page(self):
+        result = await self.sync()
+        self.assertEqual((result.pages, result.issues), (3, 25))
+        numbers = {issue['number'] for issue in self.issues if 'pull_request' not in issue}
+        bugs = {bug.github_issue_number: bug async for bug in Bug.objects.filter(project=self.project)}
+        self.assertEqual(bugs.keys(), numbers)
+        for issue in self.issues:
+            if issue['number'] in bugs:
+                self.assertEqual(bugs[issue['number']].status, 'closed' if issue['state'] == 'closed' else 'open')
+
+    async def test_incremental_sync_fetches_only_changes(self):
+        await self.sync()
+        requests = self.github.requests
+        result = await self.sync()
+        self.assertEqual((result.pages, result.issues), (1, 0))
+        self.assertEqual(self.github.requests, requests + 1)
+
+        numbers = set(self.github.touch('acme/tracker', 2, close=True)) - {
+            issue['number'] for issue in self.issues if 'pull_request' in issue
+        }
+        result = await self.sync()
+        self.assertEqual(result.issues, len(numbers))
+        closed = Bug.objects.filter(project=self.project, github_issue_number__in=numbers, status='closed')
+        self.assertEqual(await closed.acount(), len(numbers))
+        state = await GitHubSyncState.objects.aget(project=self.project)
+        self.assertEqual(state.issues_synced, 25 + len(numbers))
+
+    async def test_imported_issues_are_ranked_with_local_bugs(self):
+        [local] = await sync_to_async(self.make_bugs)(1, severity='critical', priority='urgent')
+        self.github.repos['acme/tracker'] = self.issues[:5]
+        await self.sync()
+        imported = [pk async for pk in Bug.objects.exclude(pk=local.pk).values_list('pk', flat=True)]
+        self.assertEqual(await sync_to_async(triage.rescore)(Bug.objects.all()), 0)
+        top = await sync_to_async(triage.top)(self.project.pk, 3)
+        self.assertEqual(top[0], local.pk)
+        self.assertTrue(set(top[1:]) <= set(imported))
+
+    async def test_synced_changes_make_earlier_copies_stale(self):
+        issues = [issue for issue in self.issues if 'pull_request' not in issue and issue['state'] == 'open'][:3]
+        self.github.repos['acme/tracker'] = issues
+        await self.sync()
+        bugs = {bug.github_issue_number: bug async for bug in Bug.objects.filter(project=self.project)}
+        edited, closed, untouched = issues
+        edited['title'] = "Renamed on GitHub"
+        closed['state'], closed['closed_at'] = 'closed', datetime.now(dt_timezone.utc)
+        for issue in issues:
+            issue['updated_at'] = datetime.now(dt_timezone.utc)
+        await self.sync()
+        versions = dict([row async for row in Bug.objects.values_list('github_issue_number', 'version')])
+        self.assertEqual([versions[issue['number']] for issue in issues], [2, 2, 1])
+        stale = bugs[edited['number']]
+        stale.severity = 'critical'
+        with self.assertRaises(VersionConflict):
+            await sync_to_async(stale.save)()
+
+    def test_imported_issues_invalidate_saved_filters(self):
+        saved_filter = SavedFilter.objects.create(project=self.project, owner=self.user, name="Open", query="status:open")
+        self.assertEqual(saved_filters.results(saved_filter)['count'], 0)
+        issues = [issue for issue in self.issues if 'pull_request' not in issue and issue['state'] == 'open']
+        with self.captureOnCommitCallbacks(execute=True):
+            ProjectSync(self.project, client=None).upsert(issues)
+        self.assertEqual(saved_filters.results(saved_filter), {
+            'count': len(issues), 'ids': mock.ANY, 'cached': False,
+        })
+
+    async def test_pages_are_fetched_in_order_so_shifted_entries_are_not_lost(self):
+        await self.sync()
+        later = datetime.now(dt_timezone.utc) + timedelta(minutes=1)
+        for issue in self.issues[1:]:
+            issue['title'], issue['updated_at'] = f"{issue['title']} (edited)", later
+        fetched, stores = [], 0
+        fetch, upsert = GitHubClient.issues_page, ProjectSync.upsert
+
+        async def issues_page(client, repo, page, *args, **kwargs):
+            fetched.append(('start', page))
+            result = await fetch(client, repo, page, *args, **kwargs)
+            fetched.append(('end', page))
+            return result
+
+        def shifting_upsert(sync, issues):
+            nonlocal stores
+            stores += 1
+            if stores == 2:
+                # The oldest issue joins the listing while page 2 is stored, pushing every entry down one place.
+                self.issues[0]['title'], self.issues[0]['updated_at'] = "Edited mid-sync", later
+            return upsert(sync, issues)
+
+        with mock.patch.object(GitHubClient, 'issues_page', issues_page), \
+                mock.patch.object(ProjectSync, 'upsert', shifting_upsert):
+            await self.sync()
+        starts = [page for event, page in fetched if event == 'start']
+        self.assertEqual(starts, sorted(starts))
+        self.assertEqual(fetched, [(event, page) for page in starts for event in ('start', 'end')])
+        titles = dict([row async for row in Bug.objects.values_list('github_issue_number', 'title')])
+        for issue in self.issues[1:]:
+            if 'pull_request' not in issue:
+                self.assertEqual(titles[issue['number']], issue['title'])
+
+    async def test_unchanged_single_page_listing_is_not_modified(self):
+        self.github.repos['acme/tracker'] = self.issues[:5]
+        await self.sync()
+        await self.sync()  # Stores the ETag of the (empty) incremental listing.
+        result = await self.sync()
+        self.assertTrue(result.not_modified)
+        self.assertEqual(self.github.not_modified, 1)
+
+
+# --------------------------- Saved filters --------------------------- #
+
+class SavedFilterTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.crash = Tag.objects.create(name="crash")
+        self.saved_filter = SavedFilter.objects.create(
+            project=self.project, owner=self.user, name="Open crashes", query="status:open tag:crash",
+        )
+
+    def test_parse_errors(self):
+        for query, message in (
+            ("", "empty"),
+            ("status", "field:value"),
+            ("status:done", "Unknown status"),
+            ("sprint:next", "ids or 'none'"),
+            ("colour:red", "Unknown filter field"),
+            ("tag:missing", "Unknown tag"),
+        ):
+            with self.subTest(query=query), self.assertRaisesMessage(ValidationError, message):
+                saved_filters.compile_query(query)
+
+    def test_plan_matches_what_the_query_selects(self):
+        bug, other = self.make_bugs(2)
+        bug.tags.add(self.crash)
+        plan = saved_filters.compile_query("status:open tag:crash -team:none")
+        self.assertFalse(plan.queryset(self.project.pk).exists())
+        plan = saved_filters.compile_query("status:open tag:crash")
+        self.assertEqual(list(plan.queryset(self.project.pk)), [bug])
+        state = {**saved_filters.bug_state(bug), 'tags': frozenset([self.crash.pk])}
+        self.assertTrue(plan.matches(state))
+        self.assertFalse(plan.matches({**state, 'status': 'closed'}))
+
+    def test_results_are_cached_until_a_matching_bug_changes(self):
+        [bug] = self.make_bugs(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            bug.tags.add(self.crash)
+        self.assertEqual(saved_filters.results(self.saved_filter), {'count': 1, 'ids': [bug.pk], 'cached': False})
+        self.assertTrue(saved_filters.results(self.saved_filter)['cached'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Bug.objects.create(project=self.project, title="Untagged", description="")
+        self.assertTrue(saved_filters.results(self.saved_filter)['cached'])
+
+        with self.captureOnCommitCallbacks() as callbacks:
+            bug.status = 'closed'
+            bug.save()
+            # Until the commit, readers keep getting (and caching) the old results.
+            self.assertTrue(saved_filters.results(self.saved_filter)['cached'])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(saved_filters.results(self.saved_filter), {'count': 0, 'ids': [], 'cached': False})
+
+    def test_plans_follow_tags_that_are_renamed_or_recreated(self):
+        [bug] = self.make_bugs(1)
+        with self.captureOnCommitCallbacks(execute=True):
+            bug.tags.add(self.crash)
+        self.assertEqual(saved_filters.results(self.saved_filter)['count'], 1)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.crash.delete()
+            bug.tags.add(Tag.objects.create(name="crash"))
+        self.assertEqual(saved_filters.results(self.saved_filter), {'count': 1, 'ids': [bug.pk], 'cached': False})
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.filter(name="crash").update(name="crasher")  # Sends no signal; a save does.
+            Tag.objects.get(name="crasher").save()
+        with self.assertRaisesMessage(ValidationError, "Unknown tag crash"):
+            saved_filters.compile_query("tag:crash")
+        self.assertEqual(saved_filters.compile_query("tag:crasher").tag_ids, {bug.tags.get().pk})
+
+    def test_bulk_updates_invalidate_on_commit(self):
+        bugs = self.make_bugs(2)
+        with self.captureOnCommitCallbacks(execute=True):
+            for bug in bugs:
+                bug.tags.add(self.crash)
+        self.assertEqual(saved_filters.results(self.saved_filter)['count'], 2)
+        with self.captureOnCommitCallbacks() as callbacks:
+            bulk.update_bugs(self.user, [bug.pk for bug in bugs], {'status': 'closed'})
+        self.assertTrue(saved_filters.results(self.saved_filter)['cached'])
+        for callback in callbacks:
+            callback()
+        self.assertEqual(saved_filters.results(self.saved_filter)['count'], 0)
+
+    def test_deleting_a_tag_invalidates_every_filter(self):
+        [bug] = self.make_bugs(1)
+        bug.tags.add(self.crash)
+        saved_filters.results(self.saved_filter)
+        with self.captureOnCommitCallbacks(execute=True):
+            Tag.objects.create(name="ui").delete()
+        self.assertFalse(saved_filters.results(self.saved_filter)['cached'])
+
+    def test_endpoints(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/core/projects/{self.project.pk}/filters/'
+        response = client.post(url, {'name': "Bad", 'query': "status:done"}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('query', response.json())
+        response = client.post(url, {'name': "Critical", 'query': "severity:critical"}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.make_bugs(2, severity='critical')
+        response = client.get(f"/api/core/filters/{response.json()['id']}/results/")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual((response.json()['count'], response.json()['cached']), (2, False))
+
+
+# --------------------------- Tag bitmap index --------------------------- #
+
+class TagIndexTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.bugs = self.make_bugs(6)
+        self.a, self.b, self.c = (Tag.objects.create(name=name) for name in "abc")
+        for i, bug in enumerate(self.bugs):
+            tags = [tag for tag, every in ((self.a, 1), (self.b, 2), (self.c, 3)) if i % every == 0]
+            bug.tags.add(*tags)
+
+    def expected(self, all_tags=(), any_tags=(), no_tags=()):
+        bugs = Bug.objects.filter(project=self.project)
+        for tag in all_tags:
+            bugs = bugs.filter(tags=tag)
+        if any_tags:
+            bugs = bugs.filter(tags__in=any_tags)
+        bugs = bugs.exclude(tags__in=no_tags).distinct().order_by('-pk')
+        return list(bugs.values_list('pk', flat=True))
+
+    def settled_index(self):
+        # Built outside of a test transaction, the index would not be provisional.
+        with self.captureOnCommitCallbacks(execute=True):
+            return tag_index.get_index(self.project.pk)
+
+    def test_boolean_queries_match_the_database(self):
+        a, b, c = (tag.pk for tag in (self.a, self.b, self.c))
+        for all_tags, any_tags, no_tags in (
+            ([a], [], []), ([a, b], [], []), ([a], [], [c]), ([], [b, c], []), ([a], [b, c], [b]), ([], [], [c]),
+        ):
+            with self.subTest(all=all_tags, any=any_tags, none=no_tags):
+                ids = self.expected(all_tags, any_tags, no_tags)
+                self.assertEqual(tag_index.query(self.project.pk, all_tags, any_tags, no_tags), (len(ids), ids))
+
+    def test_paging_with_before(self):
+        ids = self.expected([self.a.pk])
+        count, first = tag_index.query(self.project.pk, [self.a.pk], limit=2)
+        self.assertEqual((count, first), (len(ids), ids[:2]))
+        _, rest = tag_index.query(self.project.pk, [self.a.pk], limit=10, before=first[-1])
+        self.assertEqual(rest, ids[2:])
+
+    def test_changes_apply_in_place_once_committed(self):
+        index = self.settled_index()
+        bug, deleted = self.bugs[1], self.bugs[3].pk
+        with self.captureOnCommitCallbacks() as callbacks:
+            bug.tags.add(self.c)
+            new = Bug.objects.create(project=self.project, title="New", description="")
+            new.tags.add(self.c)
+            self.bugs[3].delete()
+            self.assertEqual(tag_index.query(self.project.pk, [self.c.pk])[1], [deleted, self.bugs[0].pk])
+        for callback in callbacks:
+            callback()
+        with self.assertNumQueries(0):
+            self.assertEqual(tag_index.query(self.project.pk, [self.c.pk])[1], [new.pk, bug.pk, self.bugs[0].pk])
+        self.assertIs(tag_index.get_index(self.project.pk), index)
+
+    def test_other_processes_changes_trigger_a_rebuild(self):
+        index = self.settled_index()
+        tag_index._bump(self.project.pk)
+        with override_settings(CORE_CACHE={**settings.CORE_CACHE, 'VERSION_TTL': 0}):
+            self.assertIsNot(tag_index.get_index(self.project.pk), index)
+
+    def test_index_built_in_a_rolled_back_transaction_is_dropped(self):
+        try:
+            with transaction.atomic():
+                Bug.objects.create(project=self.project, title="Gone", description="").tags.add(self.a)
+                index = tag_index.get_index(self.project.pk)
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertFalse(index.usable())
+        self.assertEqual(tag_index.query(self.project.pk, [self.a.pk])[1], self.expected([self.a.pk]))
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        url = f'/api/core/projects/{self.project.pk}/bugs/by-tags/'
+        response = client.get(url, {'all': f'{self.a.pk}', 'none': f'{self.c.pk}', 'limit': 1})
+        self.assertEqual(response.status_code, 200)
+        ids = self.expected([self.a.pk], no_tags=[self.c.pk])
+        self.assertEqual(response.json()['count'], len(ids))
+        self.assertEqual([bug['id'] for bug in response.json()['results']], ids[:1])
+        self.assertEqual(response.json()['next_before'], ids[0])
+        self.assertEqual(client.get(url, {'all': 'x'}).status_code, 400)
+
+
+# --------------------------- Bulk updates --------------------------- #
+
+class BulkUpdateTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.assignee = Worker.objects.create(user=make_user("qa@example.com", workspace=self.workspace))
+        self.bugs = self.make_bugs(3, assigned_worker=self.assignee)
+        self.ids = [bug.pk for bug in self.bugs]
+
+    def test_changes_are_written_logged_and_queued_for_the_digests(self):
+        sprint = Sprint.objects.create(
+            project=self.project, name="Sprint 3", start_date=date.today(), end_date=date.today() + timedelta(days=14),
+        )
+        result = bulk.update_bugs(self.user, self.ids, {'status': 'resolved', 'sprint': sprint})
+        self.assertEqual((result.matched, result.updated), (3, 3))
+        self.assertEqual(result.changes[self.ids[0]], {'status': ['open', 'resolved'], 'sprint_id': [None, sprint.pk]})
+        for bug in Bug.objects.filter(pk__in=self.ids):
+            self.assertEqual((bug.status, bug.sprint_id, bug.version), ('resolved', sprint.pk, 2))
+            self.assertIsNotNone(bug.resolved_at)  # As auto_close_resolved_bugs would have set it.
+        log = ActivityLog.objects.get(bug=self.bugs[0])
+        self.assertIn("status open → resolved, sprint none → Tracker - Sprint 3", log.message)
+        self.assertFalse(Notification.objects.exists())
+        events = NotificationEvent.objects.filter(user=self.assignee.user).exclude(message__startswith="You were")
+        self.assertEqual(sorted(event.bug_id for event in events), self.ids)
+        self.assertEqual(events[0].message, "status open → resolved, sprint none → Tracker - Sprint 3")
+
+    def test_dry_run_and_unchanged_bugs_write_nothing(self):
+        result = bulk.update_bugs(self.user, self.ids, {'status': 'closed'}, dry_run=True)
+        self.assertEqual((result.updated, result.dry_run), (3, True))
+        # The savepoint, its release and one SELECT; project access is cached by now.
+        with self.assertNumQueries(3):
+            result = bulk.update_bugs(self.user, self.ids, {'status': 'open'})
+        self.assertEqual((result.matched, result.updated), (3, 0))
+        self.assertFalse(Bug.objects.exclude(status='open').exists())
+        self.assertFalse(ActivityLog.objects.exists())
+
+    def test_missing_forbidden_and_foreign_targets_reject_the_whole_request(self):
+        other = Project.objects.create(workspace=Workspace.objects.create(name="Other"), name="Elsewhere")
+        outside = Bug.objects.create(project=other, title="Outside", description="")
+        sprint = Sprint.objects.create(project=other, name="S", start_date=date.today(), end_date=date.today())
+        for ids, changes, status_code, bad in (
+            ([*self.ids, 999999], {'status': 'closed'}, 404, [999999]),
+            ([*self.ids, outside.pk], {'status': 'closed'}, 403, [outside.pk]),
+            (self.ids, {'sprint': sprint}, 400, self.ids),
+        ):
+            with self.subTest(status=status_code), self.assertRaises(bulk.BulkUpdateError) as raised:
+                bulk.update_bugs(self.user, ids, changes)
+            self.assertEqual((raised.exception.status, raised.exception.bug_ids), (status_code, bad))
+        self.assertFalse(Bug.objects.exclude(status='open').exists())
+
+    def test_endpoint(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post('/api/core/bugs/bulk/', {'ids': self.ids, 'changes': {'priority': 'high'}}, format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['updated'], 3)
+        self.assertEqual(response.json()['changes'][str(self.ids[0])], {'priority': ['medium', 'high']})
+        response = client.post('/api/core/bugs/bulk/', {'ids': [999999], 'changes': {'priority': 'low'}}, format='json')
+        self.assertEqual((response.status_code, response.json()['bugs']), (404, [999999]))
+
+
+# --------------------------- Project permissions --------------------------- #
+
+class PermissionCacheTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.other = Workspace.objects.create(name="Other")
+        self.team = Team.objects.create(workspace=self.other, name="Contractors")
+        self.team_project = Project.objects.create(workspace=self.other, name="Shared", assigned_team=self.team)
+        self.hidden = Project.objects.create(workspace=self.other, name="Hidden")
+
+    def test_reachable_projects(self):
+        self.assertEqual(permissions.compute_project_ids(self.user), {self.project.pk})
+        with self.captureOnCommitCallbacks(execute=True):
+            Worker.objects.create(user=self.user, team=self.team)
+        # A team member reaches the team's whole workspace.
+        self.assertEqual(
+            permissions.reachable_project_ids(self.user), {self.project.pk, self.team_project.pk, self.hidden.pk},
+        )
+        self.assertIs(permissions.reachable_project_ids(make_user("root@example.com", is_staff=True)), permissions.ALL)
+
+    def test_cache_hits_cost_no_queries_until_a_project_changes(self):
+        self.assertEqual(permissions.reachable_project_ids(self.user), {self.project.pk})
+        with self.assertNumQueries(0):
+            self.assertTrue(permissions.can_access(self.user, self.project.pk))
+            self.assertFalse(permissions.can_access(self.user, self.hidden.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            moved = Project.objects.create(workspace=self.workspace, name="Moved in")
+        self.assertTrue(permissions.can_access(self.user, moved.pk))
+
+    def test_restrict_and_endpoints(self):
+        for project in (self.project, self.hidden):
+            Bug.objects.create(project=project, title=f"Bug in {project.name}", description="")
+        self.assertEqual(
+            list(permissions.restrict(Bug.objects.all(), self.user).values_list('project_id', flat=True)),
+            [self.project.pk],
+        )
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get(f'/api/core/projects/{self.project.pk}/bugs/by-tags/').status_code, 200)
+        self.assertEqual(client.get(f'/api/core/projects/{self.hidden.pk}/bugs/by-tags/').status_code, 403)
+        saved_filter = SavedFilter.objects.create(project=self.hidden, name="Open", query="status:open")
+        self.assertEqual(client.get(f'/api/core/filters/{saved_filter.pk}/results/').status_code, 403)
+
+    def test_deploy_check_refuses_a_process_local_backend(self):
+        redis = {'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://cache'}}
+        locmem = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+        with override_settings(CACHES=locmem):
+            self.assertEqual([error.id for error in cache.check_shared_backend(None)], ['Core.E002'])
+            with override_settings(CORE_CACHE={**settings.CORE_CACHE, 'ENABLED': False}):
+                self.assertEqual(cache.check_shared_backend(None), [])
+        with override_settings(CACHES=redis):
+            self.assertEqual(cache.check_shared_backend(None), [])
+
+
+# --------------------------- Server profiles --------------------------- #
+
+class ServerProfileTests(SimpleTestCase):
+    # Settings are read once per process, so each profile is loaded in a fresh interpreter.
+    CHILD = """
+import json, sys, django
+django.setup()
+from django.conf import settings
+from django.urls import Resolver404, resolve
+
+def routed(path):
+    try:
+        resolve(path)
+    except Resolver404:
+        return False
+    return True
+
+print(json.dumps({
+    'apps': settings.INSTALLED_APPS, 'middleware': settings.MIDDLEWARE,
+    'admin': routed('/admin/'), 'api': routed('/api/core/bugs/bulk/'), 'google': 'google.auth' in sys.modules,
+}))
+"""
+
+    def load(self, profile):
+        result = subprocess.run(
+            [sys.executable, '-c', self.CHILD], cwd=settings.BASE_DIR, capture_output=True, text=True, check=True,
+            env={**os.environ, 'SERVER_PROFILE': profile, 'DJANGO_SETTINGS_MODULE': 'Server.settings'},
+        )
+        return json.loads(result.stdout.strip().splitlines()[-1])
+
+    def test_each_profile_loads_only_what_it_serves(self):
+        api, admin = self.load('api'), self.load('admin')
+        self.assertEqual((api['api'], api['admin']), (True, False))
+        self.assertEqual((admin['api'], admin['admin']), (False, True))
+        self.assertNotIn('django.contrib.admin', api['apps'])
+        self.assertNotIn('django.contrib.sessions.middleware.SessionMiddleware', api['middleware'])
+        self.assertNotIn('corsheaders.middleware.CorsMiddleware', admin['middleware'])
+        self.assertFalse(api['google'])
+
+    def test_unknown_profile_is_rejected(self):
+        with self.assertRaises(subprocess.CalledProcessError) as raised:
+            self.load('worker')
+        self.assertIn("SERVER_PROFILE must be", raised.exception.stderr)
+
+    def test_bench_startup_reports_each_profile(self):
+        out = io.StringIO()
+        call_command('bench_startup', profile=['api'], samples=1, requests=5, stdout=out)
+        header, row = out.getvalue().splitlines()
+        self.assertTrue(header.startswith('profile'))
+        self.assertEqual(row.split()[0], 'api')
+        self.assertEqual(row.split()[-1], 'lazy')
+
+
+# --------------------------- Delta sync --------------------------- #
+
+@override_settings(CHANGELOG_SETTLE_SECONDS=0)
+class ChangeLogTests(CoreTestCase):
+    def sync(self, since=0, limit=100):
+        return changelog.changes_since(self.user, since, limit)
+
+    def test_changes_are_logged_when_the_transaction_commits(self):
+        start = self.sync()['next']
+        with self.captureOnCommitCallbacks(execute=True):
+            bug, gone = self.make_bugs(2)
+            bug.tags.add(Tag.objects.create(name="crash"))
+            self.assertFalse(ChangeLog.objects.filter(seq__gt=start).exists())
+        gone_id = gone.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            gone.delete()
+        result = self.sync(start)
+        self.assertEqual([row['id'] for row in result['changes']['bug']], [bug.pk])
+        self.assertEqual(result['changes']['bug'][0]['tags'], [Tag.objects.get().pk])
+        self.assertEqual(result['deleted'], {'bug': [gone_id]})
+        self.assertEqual(self.sync(result['next']), {'next': result['next'], 'has_more': False, 'changes': {}, 'deleted': {}})
+
+    def test_rolled_back_changes_leave_nothing(self):
+        before = ChangeLog.objects.count()
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.make_bugs(1)
+                    raise ValueError
+            except ValueError:
+                pass
+        self.assertEqual(ChangeLog.objects.count(), before)
+
+    def test_paging_and_other_workspaces(self):
+        other = Project.objects.create(workspace=Workspace.objects.create(name="Other"), name="Elsewhere")
+        with self.captureOnCommitCallbacks(execute=True):
+            bugs = self.make_bugs(3)
+            Bug.objects.create(project=other, title="Hidden", description="")
+        first = self.sync(limit=2)
+        self.assertTrue(first['has_more'])
+        second = self.sync(first['next'], limit=10)
+        self.assertFalse(second['has_more'])
+        seen = [row['id'] for page in (first, second) for row in page['changes'].get('bug', [])]
+        self.assertEqual(seen, [bug.pk for bug in bugs])
+
+    def test_pruned_history_is_gone(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.make_bugs(3)
+        first = ChangeLog.objects.order_by('seq').first().seq
+        self.assertEqual(changelog.prune(timezone.now() + timedelta(seconds=1)), 2)  # The newest one stays.
+        with self.assertRaises(changelog.ChangeLogGone):
+            self.sync(first)
+        client = APIClient()
+        client.force_authenticate(self.user)
+        self.assertEqual(client.get('/api/core/changes/', {'since': first}).status_code, 410)
+        self.assertEqual(client.get('/api/core/changes/', {'since': self.sync()['next']}).status_code, 200)
+
+
+# --------------------------- Workspace sharding --------------------------- #
+
+class ShardProbeView(APIView):
+    authentication_classes = [sharding.ShardedJWTAuthentication]
+    permission_classes = [IsAuthenticated]
+
+    def get(self, request):
+        return Response({'shard': sharding._shard.get()})
+
+    post = get
+
+
+class WorkspaceShardRoutingTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.entry = WorkspaceShard.objects.create(workspace=self.workspace, alias='default')
+        self.middleware = sharding.WorkspaceShardMiddleware(ShardProbeView.as_view())
+        token = RefreshToken.for_user(self.user).access_token
+        self.factory = RequestFactory(headers={'Authorization': f"Bearer {token}"})
+
+    def test_shard_is_picked_after_authentication_without_extra_queries(self):
+        cache.get(WorkspaceShard, self.workspace.pk)
+        with self.assertNumQueries(1):  # The user, loaded by DRF.
+            response = self.middleware(self.factory.get('/api/core/probe/'))
+        self.assertEqual(response.data, {'shard': 'default'})
+        self.assertIsNone(sharding._shard.get())
+
+    def test_only_requests_under_the_shard_paths_are_routed(self):
+        response = self.middleware(self.factory.get('/admin/probe/'))
+        self.assertEqual(response.data, {'shard': None})
+
+    def test_writes_to_a_moving_workspace_are_refused(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.entry.moving = True
+            self.entry.save()
+        self.assertEqual(self.middleware(self.factory.get('/api/core/probe/')).status_code, 200)
+        response = self.middleware(self.factory.post('/api/core/probe/'))
+        response.render()
+        self.assertEqual((response.status_code, response['Retry-After']), (503, '30'))
+
+    def test_shards_must_support_id_ranges(self):
+        vendors = {'fast': mock.Mock(vendor='postgresql'), 'legacy': mock.Mock(vendor='mysql')}
+        with override_settings(WORKSPACE_SHARDS=['fast', 'legacy']), mock.patch.object(sharding, 'connections', vendors):
+            errors = sharding.check_shard_backends(None)
+        self.assertEqual([(error.id, error.msg.split("'")[1]) for error in errors], [('Core.E001', 'legacy')])
+        with override_settings(WORKSPACE_SHARDS=['legacy']), \
+                mock.patch.object(sharding, 'connections', {'legacy': mock.MagicMock(vendor='mysql')}), \
+                self.assertRaisesMessage(ImproperlyConfigured, "Core.E001"):
+            sharding.reserve_id_range(apps.get_app_config('Core'), 'legacy')
+
+
+@skipUnless(sharding.shards(), "Needs WORKSPACE_SHARDS (the sharded CI job sets it).")
+@override_settings(CORE_CACHE={**settings.CORE_CACHE, 'VERSION_TTL': 0})
+class MoveWorkspaceTests(CoreTestCase):
+    def test_move_copies_with_new_ids_and_requests_follow(self):
+        target = sharding.shards()[0]
+        bugs = self.make_bugs(3)
+        bugs[0].tags.add(Tag.objects.create(name="crash"))
+        out = io.StringIO()
+        call_command('move_workspace', self.workspace.pk, target, stdout=out)
+        self.assertIn(f"to '{target}'", out.getvalue())
+
+        self.assertFalse(Bug.objects.using('default').filter(project__workspace=self.workspace).exists())
+        moved = Bug.objects.using(target).filter(project__workspace_id=self.workspace.pk).order_by('pk')
+        low, high = sharding.id_range(target)
+        self.assertEqual([bug.title for bug in moved], [bug.title for bug in bugs])
+        self.assertTrue(all(low <= bug.pk < high for bug in moved))
+        self.assertEqual(list(moved[0].tags.values_list('name', flat=True)), ["crash"])
+
+        client = APIClient()
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {RefreshToken.for_user(self.user).access_token}")
+        project = moved[0].project_id
+        response = client.get(f'/api/core/projects/{project}/bugs/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['results']), 3)
+
+    def test_writes_to_the_source_outside_the_api_are_refused_while_it_moves(self):
+        [bug] = self.make_bugs(1)
+        other = Workspace.objects.create(name="Other")
+        other_project = Project.objects.create(workspace=other, name="Elsewhere")
+        outcomes = []
+
+        def during_the_copy(seconds):
+            bug.title = "Edited during the move"
+            for label, write in (
+                ('save', bug.save),
+                ('update', lambda: Bug.objects.filter(pk=bug.pk).update(priority='urgent')),
+                ('bulk', lambda: bulk.update_bugs(self.user, [bug.pk], {'status': 'closed'})),
+            ):
+                try:
+                    write()
+                    outcomes.append((label, 'written'))
+                except sharding.WorkspaceMoving:
+                    outcomes.append((label, 'refused'))
+            with sharding.use_workspace(other.pk):
+                Bug.objects.create(project=other_project, title="Other workspace", description="")
+
+        with mock.patch.object(sharding.time, 'sleep', during_the_copy):
+            sharding.move_workspace(self.workspace.pk, sharding.shards()[0])
+        self.assertEqual(outcomes, [('save', 'refused'), ('update', 'refused'), ('bulk', 'refused')])
+        moved = Bug.objects.using(sharding.shards()[0]).get(project__workspace_id=self.workspace.pk)
+        self.assertEqual((moved.title, moved.priority, moved.status), ("Crash number 0", 'medium', 'open'))
+        self.assertTrue(Bug.objects.filter(project=other_project).exists())
+
+
+# --------------------------- JSON rendering and sparse fieldsets --------------------------- #
+
+class FastJSONRendererTests(SimpleTestCase):
+    DATA = {
+        'when': timezone.now(), 'day': date(2026, 1, 2), 'amount': Decimal('1.50'), 'id': uuid.uuid4(),
+        'text': "line\u2028separator", 'nested': [{'n': 1}, None, True], 7: 'int key',
+    }
+
+    def test_output_matches_the_stdlib_renderer(self):
+        self.assertEqual(
+            json.loads(renderers.FastJSONRenderer().render(self.DATA)), json.loads(JSONRenderer().render(self.DATA)),
+        )
+        self.assertIn(b'\\u2028', renderers.FastJSONRenderer().render(self.DATA))
+        self.assertEqual(renderers.FastJSONRenderer().render(None), b'')
+
+    def test_indented_requests_use_the_stdlib_renderer(self):
+        rendered = renderers.FastJSONRenderer().render({'a': 1}, 'application/json; indent=2', {})
+        self.assertEqual(rendered, b'{\n  "a": 1\n}')
+
+    @skipUnless(renderers.orjson, "orjson is not installed")
+    def test_orjson_is_used_when_installed(self):
+        with mock.patch.object(renderers.orjson, 'dumps', wraps=renderers.orjson.dumps) as dumps:
+            renderers.FastJSONRenderer().render(self.DATA)
+        dumps.assert_called_once()
+
+
+class SparseFieldsetTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.make_bugs(3)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f'/api/core/projects/{self.project.pk}/bugs/'
+
+    def test_fields_pick_the_rendered_keys_and_the_selected_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,title'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['results'][0].keys(), {'id', 'title'})
+        [select] = [query['sql'] for query in queries if 'FROM "Core_bug"' in query['sql']]
+        self.assertNotIn('"description"', select)
+
+    def test_expand_nests_the_relation_in_one_query(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(self.url, {'fields': 'id,tags', 'expand': 'project'})
+        row = response.json()['results'][0]
+        self.assertEqual(row, {'id': row['id'], 'tags': [], 'project': {'id': self.project.pk, 'name': "Tracker"}})
+        [select] = [query['sql'] for query in queries if 'FROM "Core_bug"' in query['sql']]
+        self.assertIn('JOIN "Core_project"', select)
+
+    def test_unknown_names_are_rejected(self):
+        response = self.client.get(self.url, {'fields': 'id,colour', 'expand': 'tags'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json().keys(), {'fields', 'expand'})
+
+    def test_all_fields_by_default(self):
+        response = self.client.get(self.url, {'limit': 2})
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(response.json()['results'][0].keys(), set(BugListSerializer.Meta.fields))
+        self.assertEqual(response.json()['next_before'], response.json()['results'][-1]['id'])
+
+
+# --------------------------- Sampling profiler --------------------------- #
+
+def busy_view(request):
+    request.resolver_match = mock.Mock(view_name='busy')
+    deadline = time.perf_counter() + 0.05
+    while time.perf_counter() < deadline:
+        pass
+    return HttpResponse()
+
+
+@override_settings(
+    PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0, PROFILING_HEADER='X-Profile', PROFILING_INTERVAL_MS=1.0,
+)
+class ProfilerTests(SimpleTestCase):
+    def setUp(self):
+        profiling.profiles.clear()
+        self.addCleanup(profiling.profiles.clear)
+
+    def test_disabled_middleware_is_not_installed(self):
+        with override_settings(PROFILING_ENABLED=False), self.assertRaises(MiddlewareNotUsed):
+            profiling.ProfilingMiddleware(busy_view)
+
+    def test_requests_with_the_header_are_sampled_per_view(self):
+        middleware = profiling.ProfilingMiddleware(busy_view)
+        middleware(RequestFactory().get('/'))
+        self.assertEqual(profiling.profiles.summary(), [])
+        middleware(RequestFactory(headers={'X-Profile': '1'}).get('/'))
+        [row] = profiling.profiles.summary()
+        self.assertEqual((row['view'], row['requests']), ('busy', 1))
+        self.assertGreater(row['samples'], 0)
+        self.assertTrue(any(
+            stack.endswith('Core.tests.busy_view') for stack in profiling.profiles.stacks('busy')
+        ))
+
+    def test_one_request_in_the_sample_rate_is_profiled(self):
+        with override_settings(PROFILING_SAMPLE_RATE=3):
+            middleware = profiling.ProfilingMiddleware(busy_view)
+        for _ in range(6):
+            middleware(RequestFactory().get('/'))
+        self.assertEqual(profiling.profiles.summary()[0]['requests'], 2)
+
+    def test_exports(self):
+        profiles = profiling.Profiles(max_stacks=2)
+        profiles.add('view', 0.1, Counter({'a;b': 3, 'a;c': 1}))
+        profiles.add('view', 0.1, Counter({'a;d': 2}))
+        stacks = profiles.stacks('view')
+        self.assertEqual(profiling.collapsed(stacks), f"a;b 3\n{profiling.TRUNCATED} 2\na;c 1\n")
+        document = profiling.speedscope('view', stacks, 0.005)
+        frames = [frame['name'] for frame in document['shared']['frames']]
+        [profile] = document['profiles']
+        self.assertEqual([[frames[i] for i in sample] for sample in profile['samples']][0], ['a', 'b'])
+        self.assertEqual(profile['weights'], [15.0, 10.0, 5.0])
+
+    def test_endpoint_is_staff_only(self):
+        profiling.profiles.add('busy', 0.1, Counter({'a;b': 1}))
+        view = profiling.ProfileView.as_view()
+        factory = APIRequestFactory()
+        request = factory.get('/api/profiling/')
+        force_authenticate(request, User(email='dev@example.com'))
+        self.assertEqual(view(request).status_code, 403)
+        staff = User(email='root@example.com', is_staff=True)
+        for query, content_type in (({}, 'application/json'), ({'view': 'busy'}, 'text/plain')):
+            request = factory.get('/api/profiling/', query)
+            force_authenticate(request, staff)
+            response = view(request)
+            if hasattr(response, 'render'):
+                response.render()
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response['Content-Type'].startswith(content_type))
+        request = factory.get('/api/profiling/', {'view': 'busy', 'output': 'speedscope'})
+        force_authenticate(request, staff)
+        self.assertIn('speedscope.json', view(request)['Content-Disposition'])
+
+
+# --------------------------- Archival --------------------------- #
+
+class ArchiveTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        self.worker = Worker.objects.create(user=self.user)
+        self.bug, self.blocker, self.recent = self.make_bugs(3, status='closed', reported_by=self.user)
+        self.bug.tags.add(Tag.objects.create(name="crash"))
+        self.bug.dependencies.add(self.blocker)
+        ActivityLog.objects.create(project=self.project, bug=self.bug, worker=self.worker, message="Closed")
+        TimeTracking.objects.create(bug=self.bug, worker=self.worker, time_spent=timedelta(hours=2))
+        self.attachment = attachments.attach(self.bug, SimpleUploadedFile("trace.txt", b"stack trace"))
+        self.closed_at = timezone.now() - timedelta(days=400)
+        Bug.objects.filter(pk__in=[self.bug.pk, self.blocker.pk]).update(updated_at=self.closed_at)
+        self.created_at = Bug.objects.get(pk=self.bug.pk).created_at
+
+    def archive(self):
+        return archive.archive_closed_bugs(timezone.now() - timedelta(days=30), batch_size=1)
+
+    def test_old_closed_bugs_move_to_the_archive(self):
+        self.assertEqual(self.archive(), 2)
+        self.assertEqual(list(Bug.objects.values_list('pk', flat=True)), [self.recent.pk])
+        self.assertFalse(ActivityLog.objects.filter(bug_id=self.bug.pk).exists())
+        archived = ArchivedBug.objects.get(bug_id=self.bug.pk)
+        self.assertEqual((archived.title, archived.closed_at), (self.bug.title, self.closed_at))
+        data = archive.unpack(archived)
+        self.assertEqual(data['dependencies'], [self.blocker.pk])
+        self.assertEqual((len(data['activity_logs']), len(data['time_tracking']), len(data['attachments'])), (1, 1, 1))
+        # The archive keeps the attachment's reference, so the file survives garbage collection.
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 1)
+        self.assertEqual(attachments.collect_garbage(grace_seconds=-1)[0], 0)
+
+    def test_blob_references_never_drop_to_zero_while_archiving(self):
+        counts = []
+
+        def released(sender, instance, **kwargs):
+            counts.append(AttachmentBlob.objects.get(pk=instance.blob_id).ref_count)
+
+        post_delete.connect(released, sender=BugAttachment, dispatch_uid='test-archive-released')
+        self.addCleanup(post_delete.disconnect, sender=BugAttachment, dispatch_uid='test-archive-released')
+        self.archive()
+        self.assertEqual(counts, [1])
+
+    def test_detail_endpoint_falls_back_to_the_archive(self):
+        self.archive()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/core/bugs/{self.bug.pk}/', {'fields': 'id,title,tags'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['title'], self.bug.title)
+        self.assertEqual(response.json()['tags'], [Tag.objects.get(name="crash").pk])
+        self.assertIn('archived_at', response.json())
+
+    def test_restore_brings_the_bug_back_with_its_children(self):
+        self.archive()
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.post(f'/api/core/bugs/{self.blocker.pk}/restore/')
+        self.assertEqual(response.status_code, 201)
+        response = client.post(f'/api/core/bugs/{self.bug.pk}/restore/')
+        self.assertEqual((response.status_code, response.json()['id']), (201, self.bug.pk))
+
+        bug = Bug.objects.get(pk=self.bug.pk)
+        self.assertEqual(bug.created_at, self.created_at)
+        self.assertEqual([tag.name for tag in bug.tags.all()], ["crash"])
+        self.assertEqual(list(bug.dependencies.all()), [self.blocker])
+        self.assertEqual(bug.activity_logs.get().worker, self.worker)
+        self.assertEqual(bug.time_tracking.get().time_spent, timedelta(hours=2))
+        self.assertEqual(bug.attachments.get().blob_id, self.attachment.blob_id)
+        self.assertEqual(AttachmentBlob.objects.get().ref_count, 1)
+        self.assertFalse(ArchivedBug.objects.exists())
+        self.assertEqual(client.post(f'/api/core/bugs/{self.bug.pk}/restore/').status_code, 404)
+
+    def test_links_to_deleted_objects_are_dropped_on_restore(self):
+        self.archive()
+        ArchivedBug.objects.get(bug_id=self.blocker.pk).delete()
+        self.worker.delete()
+        bug = archive.restore_bug(ArchivedBug.objects.get(bug_id=self.bug.pk))
+        self.assertFalse(bug.dependencies.exists())
+        self.assertIsNone(bug.activity_logs.get().worker)
+        self.assertFalse(bug.time_tracking.exists())
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('archive_closed_bugs', '--days', '30', '--dry-run', stdout=out)
+        self.assertIn("Would archive 2 bugs.", out.getvalue())
+        call_command('archive_closed_bugs', '--days', '30', stdout=out)
+        self.assertEqual(ArchivedBug.objects.count(), 2)
+
+
+# --------------------------- Workspace purge --------------------------- #
+
+class InlinePool:
+    """ Runs purge cleanups right away, on the test's own connection. """
+
+    def submit(self, func, *args):
+        future = Future()
+        future.set_result(func(*args))
+        return future
+
+
+@override_settings(ATTACHMENT_GC_GRACE_SECONDS=-1)
+class PurgeTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.use_temp_media_root()
+        self.enterContext(mock.patch.object(purge, '_cleanup_pool', InlinePool()))
+        team = Team.objects.create(workspace=self.workspace, name="QA")
+        worker = Worker.objects.create(user=self.user, team=team)
+        bugs = self.make_bugs(5, assigned_worker=worker, assigned_team=team, reported_by=self.user)
+        bugs[0].tags.add(Tag.objects.create(name="crash"))
+        bugs[0].dependencies.add(bugs[1])
+        ActivityLog.objects.create(project=self.project, bug=bugs[0], worker=worker, message="Opened")
+        self.attachment = attachments.attach(bugs[0], SimpleUploadedFile("trace.txt", b"stack trace"))
+        self.shared = attachments.attach(bugs[1], SimpleUploadedFile("same.txt", b"kept elsewhere"))
+        self.other = Project.objects.create(workspace=Workspace.objects.create(name="Other"), name="Elsewhere")
+        keeper = Bug.objects.create(project=self.other, title="Keeper", description="")
+        attachments.attach(keeper, SimpleUploadedFile("same.txt", b"kept elsewhere"))
+
+    def test_everything_under_the_workspace_goes_in_chunks(self):
+        progress = []
+        result = purge.purge_workspace(self.workspace.pk, chunk_size=2, progress=lambda *row: progress.append(row))
+        self.assertFalse(Workspace.objects.filter(pk=self.workspace.pk).exists())
+        self.assertFalse(User.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(list(Bug.objects.values_list('title', flat=True)), ["Keeper"])
+        self.assertEqual(list(Project.objects.all()), [self.other])
+        self.assertFalse(Team.objects.exists() or Worker.objects.exists() or ActivityLog.objects.exists())
+        self.assertEqual(result.deleted['Core.Bug'], 5)
+        self.assertEqual([count for label, count in progress if label == 'Core.Bug'], [2, 4, 5])
+
+        self.assertEqual(result.cleanup.result()[0], 1)
+        self.assertFalse(os.path.exists(attachments.blob_path(self.attachment.blob_id)))
+        self.assertEqual(AttachmentBlob.objects.get(pk=self.shared.blob_id).ref_count, 1)
+        self.assertTrue(os.path.exists(attachments.blob_path(self.shared.blob_id)))
+
+    def test_plan_purges_projects_before_the_users_and_teams_they_point_at(self):
+        steps = [label for _, label, _, _ in purge.plan()]
+        self.assertLess(steps.index('Core.Project'), steps.index('Auth.User'))
+        self.assertLess(steps.index('Core.Project'), steps.index('Core.Team'))
+
+    def test_command(self):
+        out = io.StringIO()
+        call_command('purge_workspace', self.workspace.pk, '--dry-run', stdout=out)
+        self.assertIn("Core.Project.workspace CASCADE", out.getvalue())
+        self.assertTrue(Workspace.objects.filter(pk=self.workspace.pk).exists())
+        call_command('purge_workspace', self.workspace.pk, stdout=out)
+        self.assertIn("Removed 1 attachment blobs", out.getvalue())
+        self.assertFalse(Workspace.objects.filter(pk=self.workspace.pk).exists())
+
+
+# --------------------------- Notification digests --------------------------- #
+
+class NotificationDigestTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        self.reporter = make_user("reporter@example.com", workspace=self.workspace)
+        self.assignee = Worker.objects.create(user=make_user("qa@example.com", workspace=self.workspace))
+        self.editor = Worker.objects.create(user=self.user)
+        self.bug = Bug.objects.create(
+            project=self.project, title="Crash", description="Steps", reported_by=self.reporter,
+            assigned_worker=self.assignee,
+        )
+        NotificationEvent.objects.all().delete()
+
+    def recipients(self):
+        return sorted(NotificationEvent.objects.values_list('user__email', flat=True))
+
+    def test_the_editor_is_not_notified_of_their_own_change(self):
+        self.bug.reported_by = self.user
+        self.bug.save()
+        NotificationEvent.objects.all().delete()
+        self.bug.status = 'in_progress'
+        self.bug.changed_by = self.user
+        self.bug.save()
+        self.assertEqual(self.recipients(), ["qa@example.com"])
+
+        client = APIClient()
+        client.force_authenticate(self.assignee.user)
+        response = client.patch(
+            f'/api/core/bugs/{self.bug.pk}/', {'version': self.bug.version, 'status': 'resolved'}, format='json',
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.recipients(), ["dev@example.com", "qa@example.com"])
+
+    def test_bulk_updates_go_through_the_same_digests(self):
+        self.bug.status = 'in_progress'
+        self.bug.save()
+        bulk.update_bugs(self.user, [self.bug.pk], {'status': 'resolved', 'assigned_worker': self.editor})
+        # The previous assignee and the reporter; the new assignee made the change.
+        self.assertEqual(self.recipients(), [
+            "qa@example.com", "qa@example.com", "reporter@example.com", "reporter@example.com",
+        ])
+        merged, created, emails = notifications.flush(window=0)
+        self.assertEqual((merged, created, emails), (4, 2, 2))
+        notification = Notification.objects.get(user=self.reporter)
+        self.assertEqual(notification.event_count, 2)
+        self.assertEqual(notification.message, (
+            "2 updates to \"Crash\": status open → in_progress; "
+            "status in_progress → resolved, assigned worker qa@example.com → dev@example.com."
+        ))
+        self.assertFalse(NotificationEvent.objects.exists())
+
+
+# --------------------------- Triage score --------------------------- #
+
+class TriageScoreTests(CoreTestCase):
+    def scores(self):
+        return dict(Bug.objects.values_list('pk', 'triage_score'))
+
+    def expected(self, bug, blocks=0):
+        bug.refresh_from_db()
+        return triage.score(bug.severity, bug.priority, blocks, bug.created_at)
+
+    def test_a_new_bug_is_scored_as_rescore_would(self):
+        bug = Bug.objects.create(project=self.project, title="Crash", description="", severity='critical')
+        self.assertEqual(self.scores()[bug.pk], self.expected(bug))
+        self.assertEqual(triage.rescore([bug.pk]), 0)
+
+    def test_dependencies_and_bulk_updates_rescore(self):
+        blocker, blocked = self.make_bugs(2)
+        blocked.dependencies.add(blocker)
+        self.assertEqual(self.scores()[blocker.pk], self.expected(blocker, blocks=1))
+        bulk.update_bugs(self.user, [blocker.pk, blocked.pk], {'priority': 'urgent'})
+        self.assertEqual(self.scores(), {blocker.pk: self.expected(blocker, 1), blocked.pk: self.expected(blocked)})
+        self.assertEqual(triage.top(self.project.pk, 1), [blocker.pk])
+
+    def test_endpoint_lists_the_queue_best_first(self):
+        low, high, middle = self.make_bugs(3)
+        Bug.objects.filter(pk=high.pk).update(severity='critical')
+        Bug.objects.filter(pk=middle.pk).update(severity='high')
+        triage.rescore(Bug.objects.all())
+        client = APIClient()
+        client.force_authenticate(self.user)
+        response = client.get(f'/api/core/projects/{self.project.pk}/triage/', {'limit': 3, 'fields': 'id'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([row['id'] for row in response.json()['results']], [high.pk, middle.pk, low.pk])
+
+    @override_settings(TRIAGE_RESCORE_BATCH_SIZE=2)
+    def test_migration_backfills_existing_bugs_in_batches(self):
+        bugs = self.make_bugs(5)
+        bugs[1].dependencies.add(bugs[0])
+        Bug.objects.update(triage_score=0)
+        migration = importlib.import_module('Core.migrations.0014_triage_score_backfill')
+        with CaptureQueriesContext(connection) as queries:
+            migration.backfill_triage_scores(apps, SimpleNamespace(connection=connection))
+        self.assertEqual(self.scores(), {
+            bug.pk: self.expected(bug, blocks=1 if bug == bugs[0] else 0) for bug in bugs
+        })
+        batches = [query for query in queries if 'LIMIT 2' in query['sql']]
+        self.assertEqual(len(batches), 4)  # Three batches and the empty one that ends the loop.
+
+
+# --------------------------- Optimistic concurrency --------------------------- #
+
+class StaleSaveView(APIView):
+    """ Saves two copies of a bug loaded at the same version, as two racing writers would. """
+
+    def post(self, request, pk):
+        first, second = Bug.objects.get(pk=pk), Bug.objects.get(pk=pk)
+        with transaction.atomic():
+            first.status = 'in_progress'
+            first.save()
+            second.priority = 'urgent'
+            second.save()
+        return Response({'version': second.version})
+
+
+class VersionConflictTests(CoreTestCase):
+    def setUp(self):
+        super().setUp()
+        [self.bug] = self.make_bugs(1)
+
+    def test_of_two_saves_from_the_same_version_exactly_one_fails(self):
+        first, second = Bug.objects.get(pk=self.bug.pk), Bug.objects.get(pk=self.bug.pk)
+        first.status = 'in_progress'
+        first.save()
+        second.priority = 'urgent'
+        with self.assertRaises(VersionConflict) as raised, transaction.atomic():
+            second.save()
+        self.assertEqual(raised.exception.current_version, 2)
+        self.assertEqual(Bug.objects.values_list('status', 'priority', 'version').get(), ('in_progress', 'medium', 2))
+
+    def test_two_stale_patches_get_exactly_one_409(self):
+        client = APIClient()
+        client.force_authenticate(self.user)
+        responses = [
+            client.patch(f'/api/core/bugs/{self.bug.pk}/', {'version': 1, 'status': status}, format='json')
+            for status in ('in_progress', 'resolved')
+        ]
+        self.assertEqual([response.status_code for response in responses], [200, 409])
+        self.assertEqual(responses[1].json()['current']['status'], 'in_progress')
+
+    def test_bulk_and_derived_writes_never_conflict_but_bulk_edits_make_copies_stale(self):
+        stale = Bug.objects.get(pk=self.bug.pk)
+        triage.rescore(Bug.objects.all())
+        bulk.update_bugs(self.user, [self.bug.pk], {'status': 'resolved'})
+        bulk.update_bugs(self.user, [self.bug.pk], {'priority': 'high'})
+        self.assertEqual(Bug.objects.values_list('version', flat=True).get(), 3)
+        stale.severity = 'critical'
+        with self.assertRaises(VersionConflict), transaction.atomic():
+            stale.save()
+
+    def test_a_stale_save_in_any_api_view_is_a_409_and_rolled_back(self):
+        request = APIRequestFactory().post('/')
+        force_authenticate(request, self.user)
+        response = StaleSaveView.as_view()(request, pk=self.bug.pk)
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.data['detail'].code, 'version_conflict')
+        self.assertEqual(Bug.objects.values_list('status', 'version').get(), ('open', 1))
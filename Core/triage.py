@@ -0,0 +1,152 @@
+import heapq
+from collections import Counter
+
+from django.conf import settings
+from django.db.models import Count
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_delete, pre_save
+from django.utils import timezone
+
+from .models import Bug
+from .signals import bugs_bulk_updated
+
+# --------------------------- Triage score --------------------------- #
+# "What to fix next" ranks open bugs by severity, priority, age and how many
+# bugs each one blocks (bugs listing it in their `dependencies`, i.e. its
+# `blocked_by`). Bug.triage_score stores that score, and the index on
+# (project, status, -triage_score, -id) makes the top N of each open status
+# one index range scan; top() merges them. (A partial index over open bugs
+# would need the statuses inlined in the SQL for SQLite to use it.)
+#
+# The age term, TRIAGE_AGE_WEIGHT per day since the bug was created, grows by
+# the same amount for every bug as time passes, so it never changes the order.
+# The column therefore counts age up to the epoch rather than up to now (a
+# negative term that never goes stale), and current() adds the days since the
+# epoch back when a score is shown.
+#
+# Scores are set when a bug is saved, and recomputed for the bugs whose
+# blocking count changes when dependencies are added, removed or deleted, and
+# for bulk severity or priority updates. A new bug's created_at is set when the
+# instance is made, not at INSERT, so its first score has the same age term
+# rescore() gives it. `manage.py rescore_bugs` recomputes every bug, e.g. after
+# the weights change; migration 0014 backfilled the bugs that predate the column.
+
+SEVERITY = {'low': 1, 'medium': 3, 'high': 6, 'critical': 10}
+PRIORITY = {'low': 1, 'medium': 3, 'high': 6, 'urgent': 10}
+OPEN = ('open', 'in_progress')
+INPUTS = {'severity', 'priority', 'created_at'}
+
+
+def _days(moment):
+    return moment.timestamp() / 86400
+
+
+def score(severity, priority, blocks, created_at):
+    """ The stored score of a bug (see above). """
+    return (
+        SEVERITY.get(severity, 0) * settings.TRIAGE_SEVERITY_WEIGHT
+        + PRIORITY.get(priority, 0) * settings.TRIAGE_PRIORITY_WEIGHT
+        + blocks * settings.TRIAGE_BLOCKS_WEIGHT
+        - _days(created_at) * settings.TRIAGE_AGE_WEIGHT
+    )
+
+
+def current(stored, now=None):
+    """ A stored score with the age term measured from now. """
+    return round(stored + _days(now or timezone.now()) * settings.TRIAGE_AGE_WEIGHT, 2)
+
+
+def blocks(bug_ids, model=Bug, using=None):
+    """ {bug id: number of bugs it blocks} """
+    return Counter(dict(
+        model.dependencies.through.objects.using(using).filter(to_bug_id__in=bug_ids)
+        .values_list('to_bug_id').annotate(count=Count('pk')).order_by()
+    ))
+
+
+def rescore(bugs, batch_size=None):
+    """ Recompute the stored score of `bugs` (a queryset or ids), in id order; returns how many changed.
+
+    The queryset may be of the historical Bug model of a data migration, on an explicit database.
+    """
+    batch_size = batch_size or settings.TRIAGE_RESCORE_BATCH_SIZE
+    queryset = bugs if hasattr(bugs, 'model') else Bug.objects.filter(pk__in=list(bugs))
+    model, using = queryset.model, queryset._db
+    queryset = queryset.order_by('pk').only('severity', 'priority', 'created_at', 'triage_score')
+    changed, last_pk = 0, 0
+    while True:
+        batch = list(queryset.filter(pk__gt=last_pk)[:batch_size])
+        if not batch:
+            return changed
+        last_pk = batch[-1].pk
+        counts = blocks([bug.pk for bug in batch], model, using)
+        stale = []
+        for bug in batch:
+            new = score(bug.severity, bug.priority, counts[bug.pk], bug.created_at)
+            if bug.triage_score != new:
+                bug.triage_score = new
+                stale.append(bug)
+        model.objects.using(using).bulk_update(stale, ['triage_score'], batch_size=batch_size)
+        changed += len(stale)
+
+
+def top(project_id, limit, status=None):
+    """ Ids of the project's `limit` highest-scored open bugs (or those with `status`), best first. """
+    ranked = [
+        Bug.objects.filter(project_id=project_id, status=name).order_by('-triage_score', '-pk')
+        .values_list('triage_score', 'pk')[:limit]
+        for name in ([status] if status else OPEN)
+    ]
+    return [pk for _, pk in heapq.merge(*ranked, reverse=True)][:limit]
+
+
+# --------------------------- Signal receivers --------------------------- #
+
+def bug_saving(sender, instance, raw=False, update_fields=None, **kwargs):
+    # A full save writes triage_score too, so it must not write back a value loaded before dependencies changed.
+    if raw or update_fields is not None and 'triage_score' not in update_fields:
+        return
+    count = 0 if instance._state.adding else blocks([instance.pk])[instance.pk]
+    instance.triage_score = score(instance.severity, instance.priority, count, instance.created_at or timezone.now())
+
+
+def bug_saved(sender, instance, created, raw=False, update_fields=None, **kwargs):
+    if not raw and update_fields is not None and 'triage_score' not in update_fields and INPUTS & set(update_fields):
+        rescore([instance.pk])
+
+
+def dependencies_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    # Forward, `instance` depends on the bugs in pk_set; reverse, the bugs in pk_set depend on `instance`.
+    if action == 'pre_clear' and not reverse:
+        cleared = sender.objects.filter(from_bug_id=instance.pk).values_list('to_bug_id', flat=True)
+        instance._triage_cleared = set(cleared)
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        rescore([instance.pk])
+    elif action == 'post_clear':
+        rescore(instance.__dict__.pop('_triage_cleared', set()))
+    elif pk_set:
+        rescore(pk_set)
+
+
+def bug_deleting(sender, instance, **kwargs):
+    instance._triage_blocked = list(instance.dependencies.values_list('pk', flat=True))
+
+
+def bug_deleted(sender, instance, **kwargs):
+    if getattr(instance, '_triage_blocked', None):
+        rescore(instance._triage_blocked)
+
+
+def bugs_updated_in_bulk(sender, bug_ids, fields, **kwargs):
+    if INPUTS & fields:
+        rescore(bug_ids)
+
+
+pre_save.connect(bug_saving, sender=Bug, dispatch_uid='core-triage-bug-saving')
+post_save.connect(bug_saved, sender=Bug, dispatch_uid='core-triage-bug-saved')
+m2m_changed.connect(dependencies_changed, sender=Bug.dependencies.through, dispatch_uid='core-triage-dependencies')
+pre_delete.connect(bug_deleting, sender=Bug, dispatch_uid='core-triage-bug-deleting')
+post_delete.connect(bug_deleted, sender=Bug, dispatch_uid='core-triage-bug-deleted')
+bugs_bulk_updated.connect(bugs_updated_in_bulk, dispatch_uid='core-triage-bulk')
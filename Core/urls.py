@@ -1,5 +1,22 @@
 from django.urls import path
+from .views import (
+    BugAttachmentUploadView, BugAttachmentDownloadView, ProjectLogSearchView, BugDuplicateCheckView,
+    SavedFilterListCreateView, SavedFilterResultsView, BugsByTagsView, BugBulkUpdateView,
+    ChangesView, BugListView, BugDetailView, BugRestoreView, TriageView,
+)
 
 urlpatterns = [
-    
+    path('bugs/<int:bug_id>/attachments/', BugAttachmentUploadView.as_view(), name='bug-attachments'),
+    path('attachments/<int:pk>/download/', BugAttachmentDownloadView.as_view(), name='attachment-download'),
+    path('projects/<int:project_id>/logs/search/', ProjectLogSearchView.as_view(), name='project-log-search'),
+    path('projects/<int:project_id>/bugs/duplicates/', BugDuplicateCheckView.as_view(), name='bug-duplicates'),
+    path('projects/<int:project_id>/filters/', SavedFilterListCreateView.as_view(), name='saved-filters'),
+    path('filters/<int:pk>/results/', SavedFilterResultsView.as_view(), name='saved-filter-results'),
+    path('projects/<int:project_id>/bugs/', BugListView.as_view(), name='bug-list'),
+    path('projects/<int:project_id>/triage/', TriageView.as_view(), name='bug-triage'),
+    path('projects/<int:project_id>/bugs/by-tags/', BugsByTagsView.as_view(), name='bugs-by-tags'),
+    path('bugs/<int:pk>/', BugDetailView.as_view(), name='bug-detail'),
+    path('bugs/<int:pk>/restore/', BugRestoreView.as_view(), name='bug-restore'),
+    path('bugs/bulk/', BugBulkUpdateView.as_view(), name='bug-bulk-update'),
+    path('changes/', ChangesView.as_view(), name='changes'),
 ]
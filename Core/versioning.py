@@ -0,0 +1,99 @@
+from django.db import models
+from django.db.models import DEFERRED
+from rest_framework.exceptions import APIException
+
+# --------------------------- Optimistic concurrency --------------------------- #
+# Bug, Sprint and Project carry a `version` that every save increments. The
+# save is `UPDATE ... SET ..., version = version + 1 WHERE id = %s AND
+# version = %s` with the version the instance was loaded at, so an edit made
+# from a stale copy (another tab, the admin, an API client) fails with
+# VersionConflict instead of silently overwriting the change it never saw.
+# Nothing is locked while the user edits, and writers only hold the database's
+# write lock for the UPDATE itself.
+#
+# A save also writes only the fields that differ from the values the row was
+# loaded with (or that pre_save receivers and auto_now changed), plus the
+# version. Queryset updates of derived columns (triage score, SET_NULL
+# cascades) leave the version alone; user-facing bulk edits bump it.
+#
+# VersionConflict is an APIException, so a stale save anywhere under a DRF
+# view (not only the PATCH endpoint, which adds the current bug to the body)
+# answers 409 and rolls the request back instead of failing with a 500.
+# Code that carries on after a conflict must save in its own atomic block:
+# Django marks the enclosing transaction broken when a save fails.
+
+
+class VersionConflict(APIException):
+    """ The row was changed or deleted since the instance was loaded. """
+    status_code = 409
+    default_code = 'version_conflict'
+
+    def __init__(self, instance, current_version):
+        state = "was deleted" if current_version is None else f"is at version {current_version}"
+        super().__init__(f"{instance._meta.verbose_name.capitalize()} {instance.pk} {state}, not {instance.version}.")
+        self.instance = instance
+        self.current_version = current_version
+
+
+class VersionedModel(models.Model):
+    version = models.PositiveIntegerField(default=1, editable=False)
+
+    class Meta:
+        abstract = True
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._loaded_values = {name: value for name, value in zip(field_names, values) if value is not DEFERRED}
+        return instance
+
+    def refresh_from_db(self, using=None, fields=None, from_queryset=None):
+        super().refresh_from_db(using, fields, from_queryset)
+        # Loading a deferred field must not make unsaved edits of other fields look unchanged.
+        names = {self._meta.get_field(name).attname for name in fields} if fields else None
+        self._remember(names)
+
+    def _remember(self, names=None):
+        loaded = getattr(self, '_loaded_values', {})
+        for field in self._meta.concrete_fields:
+            if field.attname in self.__dict__ and (names is None or field.attname in names):
+                loaded[field.attname] = self.__dict__[field.attname]
+        self._loaded_values = loaded
+
+    def changed_fields(self):
+        """ Names of the loaded fields whose value differs from the database's, as far as this instance knows. """
+        loaded = getattr(self, '_loaded_values', None)
+        if loaded is None:
+            return None
+        return {
+            field.name for field in self._meta.concrete_fields
+            if not field.primary_key and field.attname in self.__dict__
+            and (field.attname not in loaded or loaded[field.attname] != self.__dict__[field.attname])
+        }
+
+    def _save_table(self, raw=False, cls=None, force_insert=False, force_update=False, using=None,
+                    update_fields=None):
+        # Runs after pre_save receivers and before auto_now, so both are part of the diff.
+        if not raw and not self._state.adding:
+            if update_fields is None:
+                changed = self.changed_fields()
+                if changed is not None:
+                    auto_now = {f.name for f in self._meta.concrete_fields if getattr(f, 'auto_now', False)}
+                    update_fields = changed | auto_now
+            if update_fields is not None:
+                update_fields = {*update_fields, 'version'}
+        updated = super()._save_table(raw, cls, force_insert, force_update, using, update_fields)
+        self._remember()
+        return updated
+
+    def _do_update(self, base_qs, using, pk_val, values, update_fields, forced_update):
+        if self._state.adding:
+            # A new instance given an explicit pk (fixtures, copies): Django's update-or-insert.
+            return super()._do_update(base_qs, using, pk_val, values, update_fields, forced_update)
+        version = self._meta.get_field('version')
+        values = [(field, model, value) for field, model, value in values if field is not version]
+        values.append((version, None, self.version + 1))
+        if base_qs.filter(pk=pk_val, version=self.version)._update(values) == 0:
+            raise VersionConflict(self, base_qs.filter(pk=pk_val).values_list('version', flat=True).first())
+        self.version += 1
+        return True
@@ -1,3 +1,316 @@
-from django.shortcuts import render
+from django.http import Http404
+from django.db import router, transaction
+from django.db.models import F
+from django.shortcuts import get_object_or_404
+from django.utils import timezone
+from rest_framework.generics import GenericAPIView
+from rest_framework.response import Response
+from rest_framework.permissions import IsAuthenticated
+from rest_framework import status
+from .archive import archived_bug, restore_bug
+from .attachments import HashingUploadHandler, attach, serve_attachment
+from .bulk import BulkUpdateError, check_targets, update_bugs
+from .changelog import ChangeLogGone, changes_since
+from . import cache, tag_index, triage
+from .dedup import find_duplicates
+from .logindex import SearchError, search_project_logs
+from .permissions import HasProjectAccess, restrict
+from .models import ArchivedBug, Bug, BugAttachment, Project, SavedFilter
+from .saved_filters import results as saved_filter_results
+from .versioning import VersionConflict
+from .serializers import (
+    BugAttachmentSerializer, BugBulkUpdateSerializer, BugEditSerializer, BugListQuerySerializer, BugListSerializer,
+    BugSummarySerializer, ChangesSerializer, DuplicateCheckSerializer, LogSearchSerializer, SavedFilterSerializer,
+    TagQuerySerializer, TriageQuerySerializer,
+)
 
-# Create your views here.
+
+def get_project_or_404(project_id):
+    """ The project through the lookup cache; callers have already checked access. """
+    project = cache.get(Project, project_id)
+    if project is None:
+        raise Http404("No Project matches the given query.")
+    return project
+
+
+class BugAttachmentUploadView(GenericAPIView):
+    serializer_class = BugAttachmentSerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def initialize_request(self, request, *args, **kwargs):
+        # Must be in place before the multipart body is parsed.
+        request.upload_handlers = [HashingUploadHandler(request)]
+        return super().initialize_request(request, *args, **kwargs)
+
+    def get(self, request, bug_id):
+        attachments = restrict(BugAttachment.objects.filter(bug_id=bug_id), request.user, 'bug__project')
+        attachments = attachments.order_by('-uploaded_at')
+        serializer = self.serializer_class(attachments, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def post(self, request, bug_id):
+        bug = get_object_or_404(Bug, pk=bug_id)
+        self.check_object_permissions(request, bug)
+        uploaded = request.FILES.getlist('file')
+        if not uploaded:
+            return Response(
+                {'file': ["No file was uploaded, or it is larger than the attachment size limit."]},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        attachments = [attach(bug, file) for file in uploaded]
+        serializer = self.serializer_class(attachments, many=True, context={'request': request})
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class BugAttachmentDownloadView(GenericAPIView):
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, pk):
+        attachment = get_object_or_404(BugAttachment.objects.select_related('bug'), pk=pk)
+        self.check_object_permissions(request, attachment)
+        return serve_attachment(request, attachment)
+
+
+class ProjectLogSearchView(GenericAPIView):
+    """ grep across the indexed text attachments of a project's bugs. """
+    serializer_class = LogSearchSerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, project_id):
+        project = get_project_or_404(project_id)
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        try:
+            result = search_project_logs(
+                project.pk, params['q'], regex=params['regex'],
+                ignore_case=params['ignore_case'], limit=params['limit'],
+            )
+        except SearchError as exc:
+            return Response({'q': [str(exc)]}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(result, status=status.HTTP_200_OK)
+
+
+class BugDuplicateCheckView(GenericAPIView):
+    """ Suggest existing bugs that look like the one about to be filed. """
+    serializer_class = DuplicateCheckSerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def post(self, request, project_id):
+        project = get_project_or_404(project_id)
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        matches = find_duplicates(
+            project.pk, data['title'], data['description'], exclude=data.get('exclude'), limit=data['limit'],
+        )
+        bugs = Bug.objects.in_bulk([bug_id for _, bug_id in matches])
+        return Response([
+            {
+                'id': bug_id,
+                'title': bugs[bug_id].title,
+                'status': bugs[bug_id].status,
+                'similarity': round(score, 3),
+            }
+            for score, bug_id in matches if bug_id in bugs
+        ], status=status.HTTP_200_OK)
+
+
+class SavedFilterListCreateView(GenericAPIView):
+    serializer_class = SavedFilterSerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, project_id):
+        filters = SavedFilter.objects.filter(project_id=project_id).order_by('name')
+        serializer = self.serializer_class(filters, many=True)
+        return Response(serializer.data, status=status.HTTP_200_OK)
+
+    def post(self, request, project_id):
+        project = get_project_or_404(project_id)
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        serializer.save(project=project, owner=request.user)
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+
+class SavedFilterResultsView(GenericAPIView):
+    """ Count and first page of bug ids for a saved filter, served from cache while nothing it covers changed. """
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, pk):
+        saved_filter = cache.get(SavedFilter, pk)
+        if saved_filter is None:
+            return Response({'detail': "Not found."}, status=status.HTTP_404_NOT_FOUND)
+        self.check_object_permissions(request, saved_filter)
+        return Response({
+            'id': saved_filter.pk,
+            'name': saved_filter.name,
+            'query': saved_filter.query,
+            **saved_filter_results(saved_filter),
+        }, status=status.HTTP_200_OK)
+
+
+class BugListView(GenericAPIView):
+    """ A project's bugs, newest first, with `?fields=` / `?expand=` sparse fieldsets. """
+    serializer_class = BugListQuerySerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, project_id):
+        project = get_project_or_404(project_id)
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        fields, expand = BugListSerializer.fieldset(request.query_params)
+        bugs = Bug.objects.filter(project_id=project.pk).order_by('-pk')
+        if 'status' in params:
+            bugs = bugs.filter(status=params['status'])
+        if 'before' in params:
+            bugs = bugs.filter(pk__lt=params['before'])
+        page = list(BugListSerializer.optimize(bugs, fields, expand)[:params['limit']])
+        return Response({
+            'results': BugListSerializer(page, many=True, fields=fields, expand=expand).data,
+            'next_before': page[-1].pk if len(page) == params['limit'] else None,
+        }, status=status.HTTP_200_OK)
+
+
+class TriageView(GenericAPIView):
+    """ What to fix next: a project's open bugs by triage score, with `?fields=` / `?expand=`. """
+    serializer_class = TriageQuerySerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, project_id):
+        project = get_project_or_404(project_id)
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        fields, expand = BugListSerializer.fieldset(request.query_params)
+        ids = triage.top(project.pk, params['limit'], params.get('status'))
+        # Annotated, as the fieldset's .only() would defer the column.
+        bugs = Bug.objects.filter(pk__in=ids).annotate(score=F('triage_score'))
+        position = {pk: index for index, pk in enumerate(ids)}
+        page = sorted(BugListSerializer.optimize(bugs, fields, expand), key=lambda bug: position[bug.pk])
+        data = BugListSerializer(page, many=True, fields=fields, expand=expand).data
+        now = timezone.now()
+        return Response({
+            'results': [{**row, 'triage_score': triage.current(bug.score, now)} for bug, row in zip(page, data)],
+        }, status=status.HTTP_200_OK)
+
+
+class BugDetailView(GenericAPIView):
+    """ One bug, with `?fields=` / `?expand=`; archived bugs are served from the archive with `archived_at`.
+
+    PATCH edits it with optimistic concurrency (see Core.versioning).
+    """
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, pk):
+        fields, expand = BugListSerializer.fieldset(request.query_params)
+        bug = BugListSerializer.optimize(Bug.objects.filter(pk=pk), fields, expand).first()
+        if bug is not None:
+            self.check_object_permissions(request, bug)
+            return Response(BugListSerializer(bug, fields=fields, expand=expand).data, status=status.HTTP_200_OK)
+        archived = get_object_or_404(ArchivedBug, bug_id=pk)
+        self.check_object_permissions(request, archived)
+        data = BugListSerializer(archived_bug(archived), fields=fields, expand=expand).data
+        return Response({**data, 'archived_at': archived.archived_at}, status=status.HTTP_200_OK)
+
+    def patch(self, request, pk):
+        """ Edit a bug made at `version`; 409 with the current bug when someone else saved it since. """
+        serializer = BugEditSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        changes = dict(serializer.validated_data)
+        bug = get_object_or_404(Bug.objects.select_related('project'), pk=pk)
+        self.check_object_permissions(request, bug)
+        try:
+            row = {'project_id': bug.project_id, 'project__workspace_id': bug.project.workspace_id}
+            check_targets({bug.pk: row}, changes)
+        except BulkUpdateError as exc:
+            return Response({'detail': str(exc)}, status=exc.status)
+        bug.version = changes.pop('version')
+        for name, value in changes.items():
+            setattr(bug, name, value)
+        bug.changed_by = request.user
+        try:
+            # A savepoint, so the enclosing transaction (if any) can still read the current bug.
+            with transaction.atomic(using=router.db_for_write(Bug)):
+                bug.save()
+        except VersionConflict as exc:
+            current = Bug.objects.filter(pk=pk).first()
+            return Response({
+                'detail': str(exc), 'current': BugListSerializer(current).data if current else None,
+            }, status=status.HTTP_409_CONFLICT)
+        return Response(BugListSerializer(bug).data, status=status.HTTP_200_OK)
+
+
+class BugRestoreView(GenericAPIView):
+    """ Move an archived bug back into the live tables. """
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def post(self, request, pk):
+        archived = get_object_or_404(ArchivedBug, bug_id=pk)
+        self.check_object_permissions(request, archived)
+        bug = restore_bug(archived)
+        return Response(BugListSerializer(bug).data, status=status.HTTP_201_CREATED)
+
+
+class BugsByTagsView(GenericAPIView):
+    """ Bugs of a project matching a boolean tag query, newest first, answered from the tag bitmap index. """
+    serializer_class = TagQuerySerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request, project_id):
+        project = get_project_or_404(project_id)
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        count, ids = tag_index.query(
+            project.pk, params['all'], params['any'], params['none'],
+            limit=params['limit'], before=params.get('before'),
+        )
+        bugs = Bug.objects.in_bulk(ids)
+        page = [bugs[bug_id] for bug_id in ids if bug_id in bugs]
+        return Response({
+            'count': count,
+            'results': BugSummarySerializer(page, many=True).data,
+            'next_before': ids[-1] if len(ids) == params['limit'] else None,
+        }, status=status.HTTP_200_OK)
+
+
+class BugBulkUpdateView(GenericAPIView):
+    """ Change status, severity, priority, sprint or assignment of many bugs at once. """
+    serializer_class = BugBulkUpdateSerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def post(self, request):
+        serializer = self.serializer_class(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        data = serializer.validated_data
+        try:
+            result = update_bugs(request.user, data['ids'], data['changes'], dry_run=data['dry_run'])
+        except BulkUpdateError as exc:
+            return Response({'detail': str(exc), 'bugs': exc.bug_ids}, status=exc.status)
+        return Response({
+            'matched': result.matched,
+            'updated': result.updated,
+            'dry_run': result.dry_run,
+            'changes': {
+                bug_id: {column.removesuffix('_id'): values for column, values in diff.items()}
+                for bug_id, diff in result.changes.items()
+            },
+        }, status=status.HTTP_200_OK)
+
+
+class ChangesView(GenericAPIView):
+    """ Bugs, sprints, projects and tags changed after a change sequence number, for delta sync. """
+    serializer_class = ChangesSerializer
+    permission_classes = [IsAuthenticated, HasProjectAccess]
+
+    def get(self, request):
+        serializer = self.serializer_class(data=request.query_params)
+        serializer.is_valid(raise_exception=True)
+        params = serializer.validated_data
+        try:
+            result = changes_since(request.user, params['since'], params['limit'])
+        except ChangeLogGone as exc:
+            return Response({'detail': str(exc)}, status=status.HTTP_410_GONE)
+        return Response(result, status=status.HTTP_200_OK)
@@ -0,0 +1,34 @@
+from django.db.backends.sqlite3 import base
+
+# --------------------------- Tuned SQLite backend --------------------------- #
+# Same as Django's SQLite backend, but runs a set of PRAGMAs on every new
+# connection. WAL lets readers proceed while a writer holds the lock, and
+# busy_timeout makes writers wait for the lock instead of failing with
+# "database is locked". Combine with OPTIONS["transaction_mode"] = "IMMEDIATE"
+# so a transaction takes the write lock up front instead of upgrading mid-way.
+
+DEFAULT_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,
+    'busy_timeout': 5000,
+    'temp_store': 'MEMORY',
+}
+
+
+def apply_pragmas(connection, pragmas):
+    for name, value in pragmas.items():
+        connection.execute(f"PRAGMA {name} = {value}")
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    def get_connection_params(self):
+        kwargs = super().get_connection_params()
+        self.pragmas = {**DEFAULT_PRAGMAS, **kwargs.pop('pragmas', {})}
+        return kwargs
+
+    def get_new_connection(self, conn_params):
+        conn = super().get_new_connection(conn_params)
+        apply_pragmas(conn, self.pragmas)
+        return conn
@@ -0,0 +1,49 @@
+import asyncio
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+
+# --------------------------- Offloading from async views --------------------------- #
+# CPU-bound work (password hashing) runs on a bounded pool so a burst of logins
+# cannot start unlimited threads; hashlib releases the GIL, so hashes do run in
+# parallel. Blocking network I/O (SMTP, Google certificate fetches) runs on
+# asgiref's shared executor so the event loop keeps serving other requests.
+#
+# Both pools' threads outlive requests, so the request_started/finished handlers
+# never close the database connections they open (check_password() can save a
+# rehashed password). Each call closes its thread's expired or broken
+# connections before and after it runs, as a request would.
+
+_cpu_pool = None
+
+
+def cpu_workers():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def cpu_pool():
+    global _cpu_pool
+    if _cpu_pool is None:
+        _cpu_pool = ThreadPoolExecutor(max_workers=cpu_workers(), thread_name_prefix='cpu-bound')
+    return _cpu_pool
+
+
+def _in_pool_thread(func, *args, **kwargs):
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_cpu_bound(func, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(cpu_pool(), functools.partial(_in_pool_thread, func, *args, **kwargs))
+
+
+async def run_blocking_io(func, *args, **kwargs):
+    return await sync_to_async(_in_pool_thread, thread_sensitive=False)(func, *args, **kwargs)
@@ -0,0 +1,203 @@
+import itertools
+import sys
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from rest_framework import status
+from rest_framework.authentication import SessionAuthentication
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+from rest_framework_simplejwt.authentication import JWTAuthentication
+
+# --------------------------- Sampling request profiler --------------------------- #
+# With PROFILING_ENABLED, ProfilingMiddleware profiles one request in
+# PROFILING_SAMPLE_RATE, and every request carrying the PROFILING_HEADER header.
+# While a profiled request runs, one background thread reads its Python stack
+# every PROFILING_INTERVAL_MS through sys._current_frames(); nothing is traced,
+# so the request itself runs at full speed and the sampler sleeps when no
+# request is profiled. Stacks are counted per view name (e.g. 'login' or
+# 'admin:Core_bug_changelist') in this process's memory, at most
+# PROFILING_MAX_STACKS distinct stacks per view. ProfileView serves them to
+# staff as collapsed stacks (flamegraph.pl, speedscope, inferno) or as a
+# speedscope JSON file. When disabled the middleware is not installed at all.
+
+TRUNCATED = '[more stacks than PROFILING_MAX_STACKS]'
+
+
+def collapse(frame):
+    """ 'module.function;...' from the outermost frame down to `frame`. """
+    names = []
+    while frame is not None:
+        code = frame.f_code
+        names.append(f"{frame.f_globals.get('__name__', '?')}.{code.co_qualname}")
+        frame = frame.f_back
+    return ';'.join(reversed(names))
+
+
+class Sampler:
+    """ Counts the stacks of the threads registered with start() until they call stop(). """
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.active = {}
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.thread = None
+
+    def start(self):
+        stacks = Counter()
+        with self.lock:
+            self.active[threading.get_ident()] = stacks
+            if self.thread is None:
+                self.thread = threading.Thread(target=self.run, name='request-profiler', daemon=True)
+                self.thread.start()
+            self.wakeup.set()
+        return stacks
+
+    def stop(self):
+        with self.lock:
+            return self.active.pop(threading.get_ident(), Counter())
+
+    def run(self):
+        while True:
+            with self.lock:
+                if not self.active:
+                    self.wakeup.clear()
+            self.wakeup.wait()
+            time.sleep(self.interval)
+            with self.lock:
+                active = list(self.active.items())
+            frames = sys._current_frames()
+            for ident, stacks in active:
+                frame = frames.get(ident)
+                if frame is not None:
+                    stacks[collapse(frame)] += 1
+
+
+class Profiles:
+    """ Per-view request count, wall time and stack sample counts. """
+
+    def __init__(self, max_stacks):
+        self.max_stacks = max_stacks
+        self.views = {}
+        self.lock = threading.Lock()
+
+    def add(self, view, seconds, stacks):
+        with self.lock:
+            entry = self.views.setdefault(view, {'requests': 0, 'seconds': 0.0, 'stacks': Counter()})
+            entry['requests'] += 1
+            entry['seconds'] += seconds
+            for stack, count in stacks.items():
+                if stack not in entry['stacks'] and len(entry['stacks']) >= self.max_stacks:
+                    stack = TRUNCATED
+                entry['stacks'][stack] += count
+
+    def summary(self):
+        with self.lock:
+            return sorted((
+                {
+                    'view': view, 'requests': entry['requests'], 'samples': sum(entry['stacks'].values()),
+                    'seconds': round(entry['seconds'], 3),
+                }
+                for view, entry in self.views.items()
+            ), key=lambda row: -row['samples'])
+
+    def stacks(self, view):
+        with self.lock:
+            entry = self.views.get(view)
+            return Counter(entry['stacks']) if entry else None
+
+    def clear(self):
+        with self.lock:
+            self.views.clear()
+
+
+profiles = Profiles(getattr(settings, 'PROFILING_MAX_STACKS', 5000))
+
+
+def collapsed(stacks):
+    """ The collapsed-stack text format: one 'frame;frame;frame count' line per stack. """
+    return ''.join(f"{stack} {count}\n" for stack, count in stacks.most_common())
+
+
+def speedscope(view, stacks, interval):
+    """ A speedscope file (https://www.speedscope.app/file-format-schema.json) with one sampled profile. """
+    frames, index, samples, weights = [], {}, [], []
+    for stack, count in stacks.most_common():
+        sample = []
+        for name in stack.split(';'):
+            if name not in index:
+                index[name] = len(frames)
+                frames.append({'name': name})
+            sample.append(index[name])
+        samples.append(sample)
+        weights.append(count * interval * 1000)
+    return {
+        '$schema': 'https://www.speedscope.app/file-format-schema.json',
+        'name': view,
+        'exporter': 'Server.profiling',
+        'shared': {'frames': frames},
+        'profiles': [{
+            'type': 'sampled', 'name': view, 'unit': 'milliseconds',
+            'startValue': 0, 'endValue': sum(weights), 'samples': samples, 'weights': weights,
+        }],
+    }
+
+
+class ProfilingMiddleware:
+    """ Sample the stacks of one request in PROFILING_SAMPLE_RATE and of those sending PROFILING_HEADER. """
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.sampler = Sampler(settings.PROFILING_INTERVAL_MS / 1000)
+        rate = settings.PROFILING_SAMPLE_RATE
+        self.counter = itertools.count() if rate > 0 else None
+        self.rate = rate
+        self.header = settings.PROFILING_HEADER
+
+    def __call__(self, request):
+        profiled = (self.header and self.header in request.headers) or (
+            self.counter is not None and next(self.counter) % self.rate == 0
+        )
+        if not profiled:
+            return self.get_response(request)
+        started = time.perf_counter()
+        self.sampler.start()
+        try:
+            response = self.get_response(request)
+        finally:
+            stacks = self.sampler.stop()
+        match = getattr(request, 'resolver_match', None)
+        view = match.view_name if match else f"unresolved {request.method}"
+        profiles.add(view, time.perf_counter() - started, stacks)
+        return response
+
+
+class ProfileView(APIView):
+    """ Sampled stacks of this process: views by sample count, or `?view=` as `?output=collapsed|speedscope`. """
+    authentication_classes = [JWTAuthentication, SessionAuthentication]
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        view = request.query_params.get('view')
+        if not view:
+            return Response({'interval_ms': settings.PROFILING_INTERVAL_MS, 'views': profiles.summary()})
+        stacks = profiles.stacks(view)
+        if stacks is None:
+            return Response({'detail': f"No samples for {view!r}."}, status=status.HTTP_404_NOT_FOUND)
+        if request.query_params.get('output', 'collapsed') == 'speedscope':
+            response = Response(speedscope(view, stacks, settings.PROFILING_INTERVAL_MS / 1000))
+            response['Content-Disposition'] = f'attachment; filename="{view.replace(":", "-")}.speedscope.json"'
+            return response
+        return HttpResponse(collapsed(stacks), content_type='text/plain; charset=utf-8')
+
+    def delete(self, request):
+        profiles.clear()
+        return Response(status=status.HTTP_204_NO_CONTENT)
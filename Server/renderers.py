@@ -0,0 +1,35 @@
+from rest_framework.utils import encoders
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# --------------------------- Fast JSON rendering --------------------------- #
+# json.dumps with DRF's encoder class spends most of a large list response in
+# Python: the encoder walks every dict and calls default() for each datetime.
+# orjson does the walk in C. Datetimes, Decimals, lazy strings and querysets
+# still go through DRF's encoder, so they come out as JSONRenderer writes them
+# (NaN becomes null instead of an error). `; indent=` requests, ASCII-only or
+# non-compact settings, and installs without orjson use JSONRenderer itself.
+
+_OPTIONS = orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME if orjson else 0
+
+
+class FastJSONRenderer(JSONRenderer):
+    """ JSONRenderer on orjson when it is installed. """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        if (
+            orjson is None or self.ensure_ascii or not self.compact
+            or self.get_indent(accepted_media_type, renderer_context or {}) is not None
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        ret = orjson.dumps(data, default=encoders.JSONEncoder().default, option=_OPTIONS)
+        # Same escaping as JSONRenderer: keep the output a strict JavaScript subset.
+        if b'\xe2\x80\xa8' in ret or b'\xe2\x80\xa9' in ret:
+            ret = ret.replace(b'\xe2\x80\xa8', b'\\u2028').replace(b'\xe2\x80\xa9', b'\\u2029')
+        return ret
@@ -0,0 +1,57 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+
+# --------------------------- Read replica routing --------------------------- #
+# Reads go to the "replica" alias only inside read_from_replica() (or for the
+# safe-method requests ReplicaRoutingMiddleware matches); everything else, and
+# every write, stays on "default" so a request always sees its own writes.
+
+REPLICA_ALIAS = 'replica'
+
+_use_replica = ContextVar('use_replica', default=False)
+
+
+@contextmanager
+def read_from_replica():
+    token = _use_replica.set(REPLICA_ALIAS in settings.DATABASES)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _use_replica.get():
+            return REPLICA_ALIAS
+        return None
+
+    def db_for_write(self, model, **hints):
+        return 'default'
+
+    def allow_relation(self, obj1, obj2, **hints):
+        pool = {'default', REPLICA_ALIAS}
+        if obj1._state.db in pool and obj2._state.db in pool:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db == REPLICA_ALIAS:
+            return False
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    """ Serve GET/HEAD requests under settings.REPLICA_READ_PATHS from the replica. """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = tuple(getattr(settings, 'REPLICA_READ_PATHS', ()))
+
+    def __call__(self, request):
+        if request.method in ('GET', 'HEAD') and request.path.startswith(self.paths):
+            with read_from_replica():
+                return self.get_response(request)
+        return self.get_response(request)
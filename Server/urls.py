@@ -1,9 +1,25 @@
-from django.contrib import admin
+from django.conf import settings
 from django.urls import path, include
 
-urlpatterns = [
-    path('admin/', admin.site.urls),
-    path('api/v1/auth/', include('Auth.urls')),
-    path('api/v1/auth/', include('SocialAuth.urls')),
-    path('api/core', include('Core.urls')),
-]
+urlpatterns = []
+
+if settings.PROFILING_ENABLED:
+    from .profiling import ProfileView
+
+    urlpatterns += [
+        path('api/profiling/' if settings.SERVE_API else 'admin/profiling/', ProfileView.as_view(), name='profiling'),
+    ]
+
+if settings.SERVE_ADMIN:
+    from django.contrib import admin
+
+    urlpatterns += [
+        path('admin/', admin.site.urls),
+    ]
+
+if settings.SERVE_API:
+    urlpatterns += [
+        path('api/v1/auth/', include('Auth.urls')),
+        path('api/v1/auth/', include('SocialAuth.urls')),
+        path('api/core/', include('Core.urls')),
+    ]
@@ -0,0 +1,30 @@
+from django.conf import settings
+from django.http import JsonResponse
+from rest_framework import status
+from rest_framework.exceptions import AuthenticationFailed, ValidationError
+from Auth.async_views import AsyncAPIView
+from Server.executors import run_blocking_io
+from .serializers import GoogleSignInSerializer
+from .utils import Google, aregister_social_user
+
+
+class AsyncGoogleSignInView(AsyncAPIView):
+    async def post(self, request):
+        access_token = GoogleSignInSerializer().to_internal_value(self.data)['access_token']
+        # Verifying the token may fetch Google's signing certificates over HTTP.
+        google_user_data = await run_blocking_io(Google.validate, access_token)
+        try:
+            google_user_data['sub']
+        except (KeyError, TypeError):
+            raise ValidationError({'access_token': ["This token is invaild or has Expired"]})
+
+        if google_user_data['aud'] != settings.GOOGLE_CLIENT_ID:
+            raise AuthenticationFailed(detail="Could not verify user")
+
+        data = await aregister_social_user(
+            'google',
+            google_user_data['email'],
+            google_user_data['given_name'],
+            google_user_data['family_name'],
+        )
+        return JsonResponse(data, status=status.HTTP_200_OK)
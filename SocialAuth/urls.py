@@ -1,7 +1,9 @@
 from django.urls import path
 from .views import GoogleSignInView
+from .async_views import AsyncGoogleSignInView
 
 
 urlpatterns = [
     path('google/', GoogleSignInView.as_view(), name='google'),
+    path('async/google/', AsyncGoogleSignInView.as_view(), name='async-google'),
 ]
\ No newline at end of file
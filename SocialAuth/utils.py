@@ -1,8 +1,7 @@
-from google.auth.transport import requests
-from google.oauth2 import id_token
 from Auth.models import User
 from django.contrib.auth import authenticate
 from django.conf import settings
+from asgiref.sync import sync_to_async
 from rest_framework.exceptions import AuthenticationFailed
 from rest_framework_simplejwt.tokens import RefreshToken
 
@@ -10,6 +9,10 @@ from rest_framework_simplejwt.tokens import RefreshToken
 class Google():
     @staticmethod
     def validate(access_token):
+        # google-auth pulls in requests, cachetools and rsa; only sign-in needs them.
+        from google.auth.transport import requests
+        from google.oauth2 import id_token
+
         try:
             id_info = id_token.verify_oauth2_token(
                 access_token, requests.Request(), settings.GOOGLE_CLIENT_ID
@@ -57,3 +60,37 @@ def register_social_user(provider, email, first_name, last_name):
     new_user.save()
 
     return login_social_user(new_user.email)
+
+
+async def alogin_social_user(user):
+    refresh = await sync_to_async(RefreshToken.for_user)(user)
+
+    return {
+        'email': user.email,
+        'full_name': f"{user.first_name} {user.last_name}",
+        'access_token': str(refresh.access_token),
+        'refresh_token': str(refresh)
+    }
+
+
+async def aregister_social_user(provider, email, first_name, last_name):
+    user = await User.objects.filter(email=email).afirst()
+
+    if user:
+        if provider == user.auth_provider:
+            return await alogin_social_user(user)
+        else:
+            raise AuthenticationFailed(
+                detail=f'Please continue login with {user.auth_provider}'
+            )
+
+    new_user = await User.objects.acreate_user(
+        email=email,
+        first_name=first_name,
+        last_name=last_name,
+        password=settings.SOCIAL_AUTH_PASSWORD,
+        auth_provider=provider,
+        is_verified=True,
+    )
+
+    return await alogin_social_user(new_user)